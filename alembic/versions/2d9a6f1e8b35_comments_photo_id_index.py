@@ -0,0 +1,25 @@
+"""comments photo_id index
+
+Revision ID: 2d9a6f1e8b35
+Revises: 6c0e9b4d2f18
+Create Date: 2026-10-18 16:05:13.442871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '2d9a6f1e8b35'
+down_revision: Union[str, None] = '6c0e9b4d2f18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_comments_photo_id_created_at_id', 'comments', ['photo_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_comments_photo_id_created_at_id', table_name='comments')
@@ -0,0 +1,33 @@
+"""photo description full text search
+
+Revision ID: 3f6c2d8e9a41
+Revises: b1a934b907af
+Create Date: 2026-10-18 10:12:31.408215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = '3f6c2d8e9a41'
+down_revision: Union[str, None] = 'b1a934b907af'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('photos', sa.Column(
+        'description_tsv',
+        postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('simple', coalesce(description, ''))", persisted=True),
+        nullable=True,
+    ))
+    op.create_index('ix_photos_description_tsv', 'photos', ['description_tsv'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_photos_description_tsv', table_name='photos', postgresql_using='gin')
+    op.drop_column('photos', 'description_tsv')
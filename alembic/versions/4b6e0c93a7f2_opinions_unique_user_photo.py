@@ -0,0 +1,36 @@
+"""opinions unique user photo
+
+Revision ID: 4b6e0c93a7f2
+Revises: e83f5a90d217
+Create Date: 2026-10-18 14:10:52.384617
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '4b6e0c93a7f2'
+down_revision: Union[str, None] = 'e83f5a90d217'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keep only the latest opinion of each user about a photo and count the ratings again without the others.
+    op.execute(
+        "DELETE FROM opinions a USING opinions b "
+        "WHERE a.user_id = b.user_id AND a.photo_id = b.photo_id AND a.id < b.id"
+    )
+    op.execute(
+        "UPDATE photos SET rating_sum = votes.rating_sum, rating_count = votes.rating_count, "
+        "rating = votes.rating_sum::float / votes.rating_count "
+        "FROM (SELECT photo_id, sum(vote) AS rating_sum, count(*) AS rating_count FROM opinions GROUP BY photo_id) AS votes "
+        "WHERE photos.id = votes.photo_id"
+    )
+    op.create_unique_constraint('uq_opinions_user_id_photo_id', 'opinions', ['user_id', 'photo_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_opinions_user_id_photo_id', 'opinions', type_='unique')
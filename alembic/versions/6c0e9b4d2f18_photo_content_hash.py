@@ -0,0 +1,27 @@
+"""photo content hash
+
+Revision ID: 6c0e9b4d2f18
+Revises: a1f7d3c58e64
+Create Date: 2026-10-18 15:32:41.208517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '6c0e9b4d2f18'
+down_revision: Union[str, None] = 'a1f7d3c58e64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('photos', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index('ix_photos_content_hash', 'photos', ['content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_photos_content_hash', table_name='photos')
+    op.drop_column('photos', 'content_hash')
@@ -0,0 +1,31 @@
+"""photo keyset pagination indexes
+
+Revision ID: 7a2e4c1b5d90
+Revises: 3f6c2d8e9a41
+Create Date: 2026-10-18 11:03:47.129530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '7a2e4c1b5d90'
+down_revision: Union[str, None] = '3f6c2d8e9a41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keyset pagination compares (rating, id) tuples, NULL ratings would fall out of every page.
+    op.execute("UPDATE photos SET rating = 0 WHERE rating IS NULL")
+    op.alter_column('photos', 'rating', existing_type=sa.Float(), nullable=False, server_default='0')
+    op.create_index('ix_photos_created_at_id', 'photos', ['created_at', 'id'], unique=False)
+    op.create_index('ix_photos_rating_id', 'photos', ['rating', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_photos_rating_id', table_name='photos')
+    op.drop_index('ix_photos_created_at_id', table_name='photos')
+    op.alter_column('photos', 'rating', existing_type=sa.Float(), nullable=True, server_default=None)
@@ -0,0 +1,25 @@
+"""photo content type
+
+Revision ID: 8e3b1f6a2c54
+Revises: f4a82c6d1e07
+Create Date: 2026-10-18 21:14:05.671302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '8e3b1f6a2c54'
+down_revision: Union[str, None] = 'f4a82c6d1e07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('photos', sa.Column('content_type', sa.String(length=100), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('photos', 'content_type')
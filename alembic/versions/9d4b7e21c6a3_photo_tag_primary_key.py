@@ -0,0 +1,37 @@
+"""photo_tag primary key
+
+Revision ID: 9d4b7e21c6a3
+Revises: c5d81f0e2b37
+Create Date: 2026-10-18 13:02:41.518904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '9d4b7e21c6a3'
+down_revision: Union[str, None] = 'c5d81f0e2b37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The table had no key, remove the rows the primary key would reject.
+    op.execute("DELETE FROM photo_tag WHERE photo_id IS NULL OR tag_id IS NULL")
+    op.execute(
+        "DELETE FROM photo_tag a USING photo_tag b "
+        "WHERE a.photo_id = b.photo_id AND a.tag_id = b.tag_id AND a.ctid > b.ctid"
+    )
+    op.alter_column('photo_tag', 'photo_id', existing_type=sa.Integer(), nullable=False)
+    op.alter_column('photo_tag', 'tag_id', existing_type=sa.Integer(), nullable=False)
+    op.create_primary_key('photo_tag_pkey', 'photo_tag', ['photo_id', 'tag_id'])
+    op.create_index('ix_photo_tag_tag_id_photo_id', 'photo_tag', ['tag_id', 'photo_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_photo_tag_tag_id_photo_id', table_name='photo_tag')
+    op.drop_constraint('photo_tag_pkey', 'photo_tag', type_='primary')
+    op.alter_column('photo_tag', 'tag_id', existing_type=sa.Integer(), nullable=True)
+    op.alter_column('photo_tag', 'photo_id', existing_type=sa.Integer(), nullable=True)
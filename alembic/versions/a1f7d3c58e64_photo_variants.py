@@ -0,0 +1,26 @@
+"""photo variants
+
+Revision ID: a1f7d3c58e64
+Revises: 4b6e0c93a7f2
+Create Date: 2026-10-18 14:47:09.651230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = 'a1f7d3c58e64'
+down_revision: Union[str, None] = '4b6e0c93a7f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('photos', sa.Column('variants', postgresql.JSONB(astext_type=sa.Text()), server_default='[]', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('photos', 'variants')
@@ -0,0 +1,27 @@
+"""photo search filter indexes
+
+Revision ID: c5d81f0e2b37
+Revises: 7a2e4c1b5d90
+Create Date: 2026-10-18 12:26:05.771342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'c5d81f0e2b37'
+down_revision: Union[str, None] = '7a2e4c1b5d90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_photos_user_id_created_at_id', 'photos', ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_tags_name_lower', 'tags', [sa.text('lower(name)')], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tags_name_lower', table_name='tags')
+    op.drop_index('ix_photos_user_id_created_at_id', table_name='photos')
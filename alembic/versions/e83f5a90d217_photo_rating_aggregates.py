@@ -0,0 +1,33 @@
+"""photo rating aggregates
+
+Revision ID: e83f5a90d217
+Revises: 9d4b7e21c6a3
+Create Date: 2026-10-18 13:41:17.206553
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'e83f5a90d217'
+down_revision: Union[str, None] = '9d4b7e21c6a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('photos', sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('photos', sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        "UPDATE photos SET rating_sum = votes.rating_sum, rating_count = votes.rating_count, "
+        "rating = votes.rating_sum::float / votes.rating_count "
+        "FROM (SELECT photo_id, sum(vote) AS rating_sum, count(*) AS rating_count FROM opinions GROUP BY photo_id) AS votes "
+        "WHERE photos.id = votes.photo_id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('photos', 'rating_count')
+    op.drop_column('photos', 'rating_sum')
@@ -0,0 +1,37 @@
+"""photo and comment counters
+
+Revision ID: f4a82c6d1e07
+Revises: 2d9a6f1e8b35
+Create Date: 2026-10-18 16:31:52.716094
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'f4a82c6d1e07'
+down_revision: Union[str, None] = '2d9a6f1e8b35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('photo_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('photos', sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute(
+        "UPDATE users SET photo_count = counts.n "
+        "FROM (SELECT user_id, count(*) AS n FROM photos GROUP BY user_id) AS counts "
+        "WHERE users.id = counts.user_id"
+    )
+    op.execute(
+        "UPDATE photos SET comment_count = counts.n "
+        "FROM (SELECT photo_id, count(*) AS n FROM comments GROUP BY photo_id) AS counts "
+        "WHERE photos.id = counts.photo_id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('photos', 'comment_count')
+    op.drop_column('users', 'photo_count')
@@ -0,0 +1,33 @@
+"""
+Measures the cost of verifying the access token of a request, with and without the token cache.
+
+Run from the project root: python -m fastapi_app.benchmarks.auth_overhead
+"""
+import asyncio
+import timeit
+
+# repository.users has to be imported before services.auth, the same order the routes use
+from fastapi_app.src.repository import users  # noqa: F401
+from fastapi_app.src.services.auth import Auth
+
+ROUNDS = 20000
+
+
+async def main():
+    auth = Auth()
+    token = await auth.create_access_token(data={"sub": "bench@example.com"})
+
+    def uncached():
+        auth.token_cache.clear()
+        auth.decode_token(token)
+
+    def cached():
+        auth.decode_token(token)
+
+    for name, func in (("jwt.decode on every request", uncached), ("token cache", cached)):
+        seconds = min(timeit.repeat(func, number=ROUNDS, repeat=3))
+        print(f"{name:<30} {seconds / ROUNDS * 1e6:8.2f} us per request")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""
+Measures the search of photos by tag on a photo_tag table with 10M rows, before and after adding
+its primary key and the reverse (tag_id, photo_id) index.
+
+The data is generated in a separate schema of the database from DATABASE_URL, which is dropped at the end.
+
+Run from the project root: python -m fastapi_app.benchmarks.tag_search [number of photo_tag rows]
+"""
+import sys
+import time
+
+from sqlalchemy import create_engine, text
+
+from fastapi_app.src.conf.config import settings
+
+SCHEMA = "bench_tag_search"
+TAGS_PER_PHOTO = 10
+TAG_COUNT = 10000
+ROUNDS = 20
+
+SETUP = [
+    f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE",
+    f"CREATE SCHEMA {SCHEMA}",
+    f"SET search_path TO {SCHEMA}",
+    "CREATE TABLE tags (id integer PRIMARY KEY, name varchar UNIQUE)",
+    "CREATE TABLE photos (id integer PRIMARY KEY, created_at timestamp NOT NULL)",
+    "CREATE TABLE photo_tag (photo_id integer REFERENCES photos (id), tag_id integer REFERENCES tags (id))",
+    f"INSERT INTO tags SELECT g, 'tag' || g FROM generate_series(1, {TAG_COUNT}) g",
+    "INSERT INTO photos SELECT g, now() - g * interval '1 minute' FROM generate_series(1, :photos) g",
+    "CREATE INDEX ix_photos_created_at_id ON photos (created_at, id)",
+    # Every photo gets TAGS_PER_PHOTO different tags, 7919 is coprime with TAG_COUNT.
+    f"INSERT INTO photo_tag SELECT (g - 1) / {TAGS_PER_PHOTO} + 1, (g * 7919) % {TAG_COUNT} + 1 "
+    "FROM generate_series(1, :rows) g",
+    "ANALYZE",
+]
+
+INDEXES = [
+    "ALTER TABLE photo_tag ADD PRIMARY KEY (photo_id, tag_id)",
+    "CREATE INDEX ix_photo_tag_tag_id_photo_id ON photo_tag (tag_id, photo_id)",
+    "ANALYZE photo_tag",
+]
+
+# The query generated for Photo.tags.any(id=id).
+EXISTS_QUERY = text(
+    "SELECT photos.id FROM photos WHERE EXISTS ("
+    "SELECT 1 FROM photo_tag, tags WHERE photos.id = photo_tag.photo_id AND tags.id = photo_tag.tag_id AND tags.id = :tag_id"
+    ") ORDER BY photos.created_at DESC, photos.id DESC LIMIT 21"
+)
+
+# The query generated by build_photo_search_query for one tag.
+JOIN_QUERY = text(
+    "SELECT photos.id FROM photos "
+    "JOIN photo_tag AS photo_tag_1 ON photo_tag_1.photo_id = photos.id AND photo_tag_1.tag_id = :tag_id "
+    "ORDER BY photos.created_at DESC, photos.id DESC LIMIT 21"
+)
+
+
+def measure(conn, query) -> float:
+    timings = []
+    for i in range(ROUNDS):
+        start = time.perf_counter()
+        conn.execute(query, {"tag_id": i * 37 % TAG_COUNT + 1}).all()
+        timings.append(time.perf_counter() - start)
+    return sorted(timings)[len(timings) // 2]
+
+
+def main(rows: int):
+    engine = create_engine(settings.sqlalchemy_database_url)
+    with engine.connect() as conn:
+        try:
+            print(f"generating {rows} photo_tag rows...")
+            for statement in SETUP:
+                conn.execute(text(statement), {"photos": rows // TAGS_PER_PHOTO, "rows": rows})
+            conn.commit()
+
+            print(f"{'EXISTS, no photo_tag indexes':<40} {measure(conn, EXISTS_QUERY) * 1e3:10.2f} ms per query")
+            for statement in INDEXES:
+                conn.execute(text(statement))
+            conn.commit()
+            print(f"{'EXISTS, with photo_tag indexes':<40} {measure(conn, EXISTS_QUERY) * 1e3:10.2f} ms per query")
+            print(f"{'JOIN, with photo_tag indexes':<40} {measure(conn, JOIN_QUERY) * 1e3:10.2f} ms per query")
+        finally:
+            conn.rollback()
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+            conn.commit()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000)
@@ -5,8 +5,12 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from fastapi_limiter import FastAPILimiter
 
-from fastapi_app.src.routes import auth, users, comments, search_filter, photos
+from fastapi_app.src.routes import auth, users, comments, search_filter, photos, monitoring, tags, opinions, storage
 from fastapi_app.src.conf.config import settings
+from fastapi_app.src.services.auth import auth_service
+from fastapi_app.src.services.vote_buffer import vote_buffer
+from fastapi_app.src.services.derivatives import derivative_pipeline
+from fastapi_app.src.services.storage_backends import storage_backend
 
 app = FastAPI()
 
@@ -24,13 +28,18 @@ app.include_router(auth.router, prefix="/api")
 app.include_router(users.router, prefix="/api")
 app.include_router(photos.router, prefix="/api")
 app.include_router(comments.router, prefix="/api")
+app.include_router(opinions.router, prefix="/api")
 app.include_router(search_filter.router, prefix="/api")
+app.include_router(tags.router, prefix="/api")
+app.include_router(monitoring.router, prefix="/api")
+app.include_router(storage.router, prefix="/api")
 
 
 @app.on_event("startup")
 async def startup():
     """
-    The function creates a connection to the Redis server and initializes the FastAPI query limiter.
+    The function creates a connection to the Redis server, initializes the FastAPI query limiter,
+    starts listening for user cache invalidations and starts writing buffered votes.
     """
     r = await redis.Redis(
         host=settings.redis_host,
@@ -41,6 +50,21 @@ async def startup():
         decode_responses=True,
     )
     await FastAPILimiter.init(r)
+    auth_service.user_cache.start_listener()
+    vote_buffer.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    The function writes the buffered votes and stops the user cache listener, the threads used for password hashing,
+    the processes creating photo copies and the connections of the storage.
+    """
+    await vote_buffer.stop()
+    await auth_service.user_cache.stop_listener()
+    auth_service.hashing_pool.shutdown()
+    derivative_pipeline.shutdown()
+    await storage_backend.close()
 
 
 @app.get("/")
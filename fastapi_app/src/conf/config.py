@@ -10,8 +10,17 @@ class Settings(BaseSettings):
 
     Attributes:
         sqlalchemy_database_url (str): The database connection URL.
+        db_pool_size (int): The number of connections kept open in the pool of each worker. Defaults to 5.
+        db_max_overflow (int): The number of connections allowed above db_pool_size under load. Defaults to 10.
+        db_pool_timeout (float): Seconds a request waits for a free connection before failing. Defaults to 30.
+        db_pool_recycle (int): Seconds after which a pooled connection is replaced, -1 disables recycling. Defaults to 1800.
+        db_pool_pre_ping (bool): Whether to test a connection for liveness before handing it out. Defaults to True.
         secret_key (str): The secret key for JWT token generation.
         algorithm (str): The algorithm used for JWT token encoding. Defaults to "HS256".
+        token_cache_size (int): The maximum number of verified JWT tokens cached by each worker. Defaults to 10000.
+        bcrypt_rounds (int): The bcrypt cost factor, stored hashes with another cost are rehashed on login. Defaults to 12.
+        password_hash_workers (int): The number of threads computing password hashes. Defaults to 4.
+        password_hash_queue_size (int): The number of hashing calls allowed to wait for a thread before 503 is returned. Defaults to 64.
         mail_username (str): The username for the mail server.
         mail_password (str): The password for the mail server.
         mail_from (str): The email address to use for sending emails.
@@ -20,17 +29,50 @@ class Settings(BaseSettings):
         redis_host (str): The host address for the Redis server.
         redis_port (str): The port for the Redis server.
         redis_password (str, optional): The password for the Redis server, if any.
-        cloudinary_name (str): The Cloudinary cloud name.
-        cloudinary_api_key (str): The Cloudinary API key.
-        cloudinary_api_secret (str): The Cloudinary API secret.
+        user_cache_ttl (int): Number of seconds an authenticated user is cached in Redis. Defaults to 900.
+        user_cache_invalidation_ttl (int): Number of seconds a changed user can not be cached again in Redis, so requests which read the user before the change can not cache the old version. Defaults to 30.
+        user_cache_local_size (int): The maximum number of users cached in the memory of each worker. Defaults to 10000.
+        user_cache_local_ttl (float): Number of seconds a user is cached in the memory of a worker. Defaults to 5.
+        tag_cache_ttl (float): Number of seconds after which each worker reloads its dictionary of tags. Defaults to 300.
+        vote_buffer_backend (str): Where votes wait to be written to the database: "redis" (shared by workers) or "memory". Defaults to "redis".
+        vote_flush_interval (float): Number of seconds between writes of buffered votes to the database. Defaults to 1.
+        vote_flush_batch_size (int): The maximum number of votes written in one transaction. Defaults to 1000.
+        user_export_batch_size (int): The number of users read from the database at a time by the user export. Defaults to 1000.
+        photo_variant_widths (dict[str, int]): The maximum width of each smaller WebP copy of uploaded photos, by name. Defaults to {"thumb": 320, "medium": 1280}.
+        photo_variant_quality (int): The WebP quality of the copies, from 1 to 100. Defaults to 80.
+        photo_variant_workers (int): The number of processes creating the copies. Defaults to 2.
+        photo_max_upload_size (int): The maximum size of an uploaded photo in bytes. Defaults to 20 MiB.
+        photo_cache_max_age (int): Number of seconds browsers and CDNs may reuse a downloaded photo without revalidating it. Defaults to 86400.
+        comment_moderation_chunk_size (int): The maximum number of comments deleted in one transaction by bulk moderation. Defaults to 1000.
+        avatar_size (int): The width and height of avatars in pixels. Defaults to 250.
+        storage_backend (str): Where photos and avatars are stored: "local" (a directory), "s3" (an S3-compatible bucket) or "memory". Defaults to "local".
+        storage_local_root (str): The directory of the local storage. Defaults to the working directory.
+        storage_url (str): The URL of the storage routes, which serve files of the local storage. Defaults to "/api/storage".
+        storage_url_expiry (int): Number of seconds presigned URLs are valid. Defaults to 3600.
+        storage_part_size (int): The size of the parts of multipart uploads to S3 in bytes, at least 5 MiB. Defaults to 8 MiB.
+        storage_s3_endpoint_url (str, optional): The URL of the S3-compatible server, e.g. http://localhost:9000 for MinIO; unset for Amazon S3.
+        storage_s3_bucket (str): The name of the bucket. Defaults to "photos".
+        storage_s3_access_key (str): The S3 access key.
+        storage_s3_secret_key (str): The S3 secret key.
+        storage_s3_region (str): The region of the bucket. Defaults to "us-east-1".
+        storage_s3_public_url (str, optional): The URL the bucket is publicly readable at, defaults to the endpoint URL and the bucket.
 
     Config:
         env_file (str): The name of the file to load environment variables from.
         env_file_encoding (str): The encoding of the environment file.
     """
     sqlalchemy_database_url: str = os.getenv('DATABASE_URL')
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
     secret_key: str = os.getenv('SECRET_KEY')
     algorithm: str = "HS256"
+    token_cache_size: int = 10000
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 4
+    password_hash_queue_size: int = 64
     mail_username: str = os.getenv('MAIL_USERNAME')
     mail_password: str = os.getenv('MAIL_PASSWORD')
     mail_from: str = os.getenv('MAIL_FROM')
@@ -39,9 +81,33 @@ class Settings(BaseSettings):
     redis_host: str = os.getenv('REDIS_HOST')
     redis_port: str = os.getenv('REDIS_PORT')
     redis_password: str = os.getenv('REDIS_PASSWORD', None)
-    cloudinary_name: str = os.getenv('CLOUDINARY_CLOUD_NAME')
-    cloudinary_api_key: str = os.getenv('CLOUDINARY_API_KEY')
-    cloudinary_api_secret: str = os.getenv('CLOUDINARY_API_SECRET')
+    user_cache_ttl: int = 900
+    user_cache_invalidation_ttl: int = 30
+    user_cache_local_size: int = 10000
+    user_cache_local_ttl: float = 5
+    tag_cache_ttl: float = 300
+    vote_buffer_backend: str = "redis"
+    vote_flush_interval: float = 1
+    vote_flush_batch_size: int = 1000
+    user_export_batch_size: int = 1000
+    photo_variant_widths: dict[str, int] = {"thumb": 320, "medium": 1280}
+    photo_variant_quality: int = 80
+    photo_variant_workers: int = 2
+    photo_max_upload_size: int = 20 * 1024 * 1024
+    photo_cache_max_age: int = 86400
+    comment_moderation_chunk_size: int = 1000
+    avatar_size: int = 250
+    storage_backend: str = "local"
+    storage_local_root: str = "."
+    storage_url: str = "/api/storage"
+    storage_url_expiry: int = 3600
+    storage_part_size: int = 8 * 1024 * 1024
+    storage_s3_endpoint_url: str = os.getenv('STORAGE_S3_ENDPOINT_URL', None)
+    storage_s3_bucket: str = "photos"
+    storage_s3_access_key: str = os.getenv('STORAGE_S3_ACCESS_KEY')
+    storage_s3_secret_key: str = os.getenv('STORAGE_S3_SECRET_KEY')
+    storage_s3_region: str = "us-east-1"
+    storage_s3_public_url: str = os.getenv('STORAGE_S3_PUBLIC_URL', None)
 
     class Config:
         env_file = ".env"
@@ -1,13 +1,29 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
 
 from fastapi_app.src.conf.config import settings
+from fastapi_app.src.database.pool_metrics import InstrumentedAsyncQueuePool
 
 SQLALCHEMY_DATABASE_URL = settings.sqlalchemy_database_url
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+POOL_OPTIONS = {
+    "pool_size": settings.db_pool_size,
+    "max_overflow": settings.db_max_overflow,
+    "pool_timeout": settings.db_pool_timeout,
+    "pool_recycle": settings.db_pool_recycle,
+    "pool_pre_ping": settings.db_pool_pre_ping,
+}
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **POOL_OPTIONS)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+SQLALCHEMY_ASYNC_DATABASE_URL = make_url(SQLALCHEMY_DATABASE_URL).set(drivername="postgresql+asyncpg")
+async_engine = create_async_engine(SQLALCHEMY_ASYNC_DATABASE_URL, poolclass=InstrumentedAsyncQueuePool, **POOL_OPTIONS)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 
 # Dependency
 def get_db():
@@ -25,3 +41,17 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """
+    Provides an asynchronous database session to be used in a dependency injection context.
+
+    The session runs its queries through the asyncpg driver, so awaiting a query releases
+    the event loop to other requests instead of blocking the worker.
+
+    :yield: A SQLAlchemy asynchronous database session.
+    :rtype: sqlalchemy.ext.asyncio.AsyncSession
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
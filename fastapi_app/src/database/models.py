@@ -1,14 +1,20 @@
-from sqlalchemy import Column, Integer, String, Boolean, func, Table, UniqueConstraint, Float
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy import Column, Integer, String, Boolean, func, Table, UniqueConstraint, Float, Computed, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR, JSONB
+from sqlalchemy.orm import relationship, declarative_base, deferred
 from sqlalchemy.sql.schema import ForeignKey
 from sqlalchemy.sql.sqltypes import DateTime
 
 Base = declarative_base()
 
+# Text search configuration of photo descriptions, 'simple' does not depend on the language of the text.
+DESCRIPTION_SEARCH_CONFIG = 'simple'
+
+# The primary key serves lookups of the tags of a photo, the reverse index the photos of a tag.
 photo_tag_table = Table(
     'photo_tag', Base.metadata,
-    Column('photo_id', Integer, ForeignKey('photos.id')),
-    Column('tag_id', Integer, ForeignKey('tags.id'))
+    Column('photo_id', Integer, ForeignKey('photos.id'), primary_key=True),
+    Column('tag_id', Integer, ForeignKey('tags.id'), primary_key=True),
+    Index('ix_photo_tag_tag_id_photo_id', 'tag_id', 'photo_id'),
 )
 
 class User(Base):
@@ -26,12 +32,14 @@ class User(Base):
     :type role: str:
     :param created_at: the date of user creation
     :type created_at: datetime:
-    :param avatar: link to the image of avatar in Cloudinary
+    :param avatar: link to the image of avatar in the storage
     :type avatar: str:
     :param refresh_token: refresh_token of the user
     :type refresh_token: str: 
     :param confirmed: information if the user is confirmed by mail
     :type confirmed: boolean:
+    :param photo_count: number of photos of the user, kept up to date with the photos
+    :type photo_count: int
     """
     __tablename__ = "users"
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -43,6 +51,7 @@ class User(Base):
     avatar = Column(String(255), nullable=True)
     refresh_token = Column(String(255), nullable=True)
     confirmed = Column(Boolean, default=False)
+    photo_count = Column(Integer, default=0, server_default='0', nullable=False)
     comments = relationship("Comment", back_populates="user")
     photos = relationship("Photo", back_populates="user")
 
@@ -63,10 +72,31 @@ class Photo(Base):
     :type created_at: datetime
     :param updated_at: the date and time of the photo updating - format: YYYY-MM-DD HH:MM:SS where Y-means year, M - means month, D- means day H - means hour, M - means minutes and S - means seconds
     :type updated_at: datetime
-    :param rating: rating
+    :param rating: rating - the average vote, kept equal to rating_sum / rating_count
     :type rating: float
+    :param rating_sum: sum of the votes of all opinions about the photo
+    :type rating_sum: int
+    :param rating_count: number of opinions about the photo
+    :type rating_count: int
+    :param variants: the smaller copies of the photo and the original - name, url, width, height and format of each
+    :type variants: list
+    :param comment_count: number of comments about the photo, kept up to date with the comments
+    :type comment_count: int
+    :param content_hash: SHA-256 of the photo file, photos with the same content share one stored file
+    :type content_hash: str
+    :param content_type: media type of the photo file, detected from its content when it was uploaded
+    :type content_type: str
+    :param description_tsv: full text search vector of the description, generated by the database
+    :type description_tsv: tsvector
     """
     __tablename__ = "photos"
+    __table_args__ = (
+        Index('ix_photos_description_tsv', 'description_tsv', postgresql_using='gin'),
+        Index('ix_photos_created_at_id', 'created_at', 'id'),
+        Index('ix_photos_rating_id', 'rating', 'id'),
+        Index('ix_photos_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+        Index('ix_photos_content_hash', 'content_hash'),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id'))
     url = Column(String)
@@ -74,7 +104,14 @@ class Photo(Base):
     tags = relationship("Tag", secondary=photo_tag_table)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, default=None, onupdate=func.now())
-    rating = Column(Float, default=0.0)
+    rating = Column(Float, default=0.0, server_default='0', nullable=False)
+    rating_sum = Column(Integer, default=0, server_default='0', nullable=False)
+    rating_count = Column(Integer, default=0, server_default='0', nullable=False)
+    variants = Column(JSONB, default=list, server_default='[]', nullable=False)
+    comment_count = Column(Integer, default=0, server_default='0', nullable=False)
+    content_hash = Column(String(64))
+    content_type = Column(String(100))
+    description_tsv = deferred(Column(TSVECTOR, Computed(f"to_tsvector('{DESCRIPTION_SEARCH_CONFIG}', coalesce(description, ''))", persisted=True)))
     user = relationship("User", back_populates="photos")
     comments = relationship("Comment", back_populates="photo", cascade="all, delete")
 
@@ -94,6 +131,8 @@ class Tag(Base):
     name = Column(String, unique=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
 
+Index('ix_tags_name_lower', func.lower(Tag.name))
+
 class Comment(Base):
     """Class which describes table in database of the Comment
 
@@ -111,6 +150,9 @@ class Comment(Base):
     :type updated_at: datetime
     """
     __tablename__ = 'comments'
+    __table_args__ = (
+        Index('ix_comments_photo_id_created_at_id', 'photo_id', 'created_at', 'id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     photo_id = Column(Integer, ForeignKey('photos.id'))
@@ -124,7 +166,7 @@ class Comment(Base):
 
 class Opinion(Base):
     """
-    Class which archives all opinion about photos
+    Class which archives all opinion about photos, a user has at most one opinion about a photo
     
     :param id: opinion's unique id in DB
     :type id: int
@@ -136,6 +178,9 @@ class Opinion(Base):
     :type photo_id: int
     """
     __tablename__ = "opinions"
+    __table_args__ = (
+        UniqueConstraint('user_id', 'photo_id', name='uq_opinions_user_id_photo_id'),
+    )
     id = Column(Integer, primary_key=True, index=True)
     vote = Column(Integer, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
@@ -0,0 +1,112 @@
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+class PoolWaitStats:
+    """
+    Collects how long requests wait to get a connection from the pool.
+
+    :param checkouts: number of connections handed out by the pool
+    :type checkouts: int
+    :param timeouts: number of checkouts which failed after db_pool_timeout
+    :type timeouts: int
+    :param total_wait: sum of all wait times in seconds
+    :type total_wait: float
+    :param max_wait: the longest wait time in seconds
+    :type max_wait: float
+    :param last_wait: wait time of the latest checkout in seconds
+    :type last_wait: float
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Clears all collected values.
+        """
+        with self._lock:
+            self.checkouts = 0
+            self.timeouts = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+            self.last_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        """
+        Stores the wait time of a single checkout.
+
+        :param wait: The time in seconds spent waiting for a connection.
+        :type wait: float
+        :param timed_out: True if no connection was available before the pool timeout.
+        :type timed_out: bool
+        """
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += wait
+            self.last_wait = wait
+            if wait > self.max_wait:
+                self.max_wait = wait
+
+    def as_dict(self) -> dict:
+        """
+        Returns the collected values.
+
+        :return: Wait statistics with times in milliseconds.
+        :rtype: dict
+        """
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": (self.total_wait / attempts * 1000) if attempts else 0.0,
+                "max_wait_ms": self.max_wait * 1000,
+                "last_wait_ms": self.last_wait * 1000,
+            }
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """
+    Async queue pool which measures the time spent waiting for a connection.
+
+    The statistics live on the class so they survive the pool being recreated by engine.dispose().
+    """
+    wait_stats = PoolWaitStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.wait_stats.record(time.perf_counter() - start, timed_out=True)
+            raise
+        self.wait_stats.record(time.perf_counter() - start)
+        return connection
+
+
+def get_pool_status(pool: QueuePool) -> dict:
+    """
+    Reports the current state of a connection pool.
+
+    :param pool: The pool of the engine to inspect.
+    :type pool: QueuePool
+    :return: Configured size, checked-out, idle and overflow connection counts plus wait statistics.
+    :rtype: dict
+    """
+    status = {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": pool._max_overflow,
+    }
+    wait_stats = getattr(pool, "wait_stats", None)
+    status.update(wait_stats.as_dict() if wait_stats else PoolWaitStats().as_dict())
+    return status
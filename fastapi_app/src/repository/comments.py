@@ -1,30 +1,79 @@
-from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import select, update, delete, func, Select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, joinedload
 
 from fastapi_app.src.database import models
 from fastapi_app.src import schemas
-
-from datetime import datetime
+from fastapi_app.src.repository.counters import change_comment_count
+from fastapi_app.src.repository.opinions import photo_exists
+from fastapi_app.src.repository.pagination import fetch_page
 
 
-async def get_comment(db: Session, comment_id: int):
+async def get_comment(db: AsyncSession, comment_id: int):
     """
     Retrieve a comment from the database by its ID.
 
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param comment_id: The ID of the comment to retrieve.
     :type comment_id: int
     :return: The comment with the specified ID, or None if not found.
     :rtype: models.Comment
     """
-    return db.query(models.Comment).filter(models.Comment.id == comment_id).first()
+    result = await db.execute(select(models.Comment).filter(models.Comment.id == comment_id))
+    return result.scalars().first()
+
+def build_photo_comments_query(photo_id: int) -> tuple[Select, tuple]:
+    """
+    Builds the query selecting the comments of a photo together with their authors.
+
+    The author of each comment is loaded by a join in the same query, so a page of comments
+    costs one query however many authors it has.
+
+    :param photo_id: The ID of the photo.
+    :type photo_id: int
+    :return: The query selecting the comments and the sort keys to pass to fetch_page.
+    :rtype: tuple[Select, tuple]
+    """
+    query = (
+        select(models.Comment)
+        .options(joinedload(models.Comment.user).load_only(models.User.id, models.User.username, models.User.avatar))
+        .filter(models.Comment.photo_id == photo_id)
+    )
+    return query, (models.Comment.created_at, models.Comment.id)
+
 
-async def create_comment(db: Session, comment: schemas.CommentCreate, user_id: int, photo_id: int):
+async def get_photo_comments(db: AsyncSession, photo_id: int, cursor: str | None, limit: int) -> dict:
     """
-    Create a new comment and add it to the database.
+    Retrieve one page of the comments of a photo, the newest first.
 
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
+    :param photo_id: The ID of the photo.
+    :type photo_id: int
+    :param cursor: The next_cursor of the previous page, or None for the first page.
+    :type cursor: str | None
+    :param limit: The maximum number of comments on the page.
+    :type limit: int
+    :return: The comments of the page as "items" and the cursor of the next page as "next_cursor".
+    :rtype: dict
+    :raises HTTPException: If the photo is not found, raises a 404 error.
+    """
+    query, keys = build_photo_comments_query(photo_id)
+    page = await fetch_page(db, query, keys, cursor, limit)
+    if not page["items"] and cursor is None and not await photo_exists(db, photo_id):
+        raise HTTPException(status_code=404, detail=f"Photo with ID {photo_id} not found")
+    return page
+
+async def create_comment(db: AsyncSession, comment: schemas.CommentCreate, user_id: int, photo_id: int):
+    """
+    Create a new comment and add it to the database, counting it in the comments of the photo.
+
+    :param db: The database session.
+    :type db: AsyncSession
     :param comment: The comment data to create.
     :type comment: schemas.CommentCreate
     :param user_id: The ID of the user creating the comment.
@@ -36,45 +85,139 @@ async def create_comment(db: Session, comment: schemas.CommentCreate, user_id: i
     """
     db_comment = models.Comment(**comment.dict(), user_id=user_id, photo_id=photo_id)
     db.add(db_comment)
-    db.commit()
-    db.refresh(db_comment)
+    await change_comment_count(db, photo_id, 1)
+    await db.commit()
+    await db.refresh(db_comment)
     return db_comment
 
-async def update_comment(db: Session, comment: schemas.CommentUpdate, comment_id: int):
+def build_comment_delete_statement(comment_id: int) -> Select:
     """
-    Update an existing comment in the database.
+    Builds the statement which deletes a comment and counts down the comments of its photo.
+
+    :param comment_id: The ID of the comment.
+    :type comment_id: int
+    :return: The statement returning the deleted comment, no rows if nothing was deleted.
+    :rtype: Select
+    """
+    deleted = delete(models.Comment).where(models.Comment.id == comment_id).returning(*models.Comment.__table__.c).cte("deleted_comment")
+    counted = (
+        update(models.Photo)
+        .where(models.Photo.id == deleted.c.photo_id)
+        .values(comment_count=models.Photo.comment_count - 1, updated_at=models.Photo.updated_at)
+        .returning(models.Photo.id)
+        .cte("counted")
+    )
+    return select(aliased(models.Comment, deleted)).add_cte(counted)
+
+async def update_comment(db: AsyncSession, comment: schemas.CommentUpdate, comment_id: int, user_id: int):
+    """
+    Update an existing comment of a user in the database.
+
+    The comment is changed and returned by one UPDATE ... RETURNING statement, the author is checked in its WHERE clause.
 
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param comment: The updated comment data.
     :type comment: schemas.CommentUpdate
     :param comment_id: The ID of the comment to update.
     :type comment_id: int
-    :return: The updated comment, or None if not found.
+    :param user_id: The ID of the author of the comment.
+    :type user_id: int
+    :return: The updated comment, or None if not found or written by another user.
     :rtype: models.Comment
     """
-    db_comment = await get_comment(db, comment_id)
+    db_comment = (await db.scalars(
+        update(models.Comment)
+        .where(models.Comment.id == comment_id, models.Comment.user_id == user_id)
+        .values(**comment.dict())
+        .returning(models.Comment)
+    )).first()
     if db_comment:
-        for key, value in comment.dict().items():
-            setattr(db_comment, key, value)
-        db_comment.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(db_comment)
+        await db.commit()
     return db_comment
 
-async def delete_comment(db: Session, comment_id: int):
+async def delete_comment(db: AsyncSession, comment_id: int):
     """
-    Delete a comment from the database by its ID.
+    Delete a comment from the database by its ID, counting it down in the comments of the photo.
+
+    The comment is deleted and returned by one statement, see build_comment_delete_statement.
 
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param comment_id: The ID of the comment to delete.
     :type comment_id: int
     :return: The deleted comment, or None if not found.
     :rtype: models.Comment
     """
-    db_comment = await get_comment(db, comment_id)
+    db_comment = (await db.scalars(build_comment_delete_statement(comment_id))).first()
     if db_comment:
-        db.delete(db_comment)
-        db.commit()
+        await db.commit()
     return db_comment
+
+def build_comments_bulk_delete_statement(criteria: schemas.CommentModeration, after_id: int, limit: int, comment_ids: list[int] | None = None) -> Select:
+    """
+    Builds the statement which deletes the next chunk of comments matching the moderation criteria.
+
+    The chunk is the first limit matching comments with IDs greater than after_id, so each chunk
+    seeks through the primary key index. The comment counters of their photos are counted down
+    by the same statement.
+
+    :param criteria: The moderation criteria.
+    :type criteria: schemas.CommentModeration
+    :param after_id: The last ID of the previous chunk, 0 for the first chunk.
+    :type after_id: int
+    :param limit: The maximum number of comments in the chunk.
+    :type limit: int
+    :param comment_ids: The IDs of the comments of the chunk, None to select the comments by the other criteria only.
+    :type comment_ids: list[int] | None
+    :return: The statement returning the number of deleted comments and the last deleted ID.
+    :rtype: Select
+    """
+    conditions = [models.Comment.id > after_id]
+    if comment_ids is not None:
+        conditions.append(models.Comment.id.in_(comment_ids))
+    if criteria.user_id is not None:
+        conditions.append(models.Comment.user_id == criteria.user_id)
+    if criteria.photo_id is not None:
+        conditions.append(models.Comment.photo_id == criteria.photo_id)
+    if criteria.created_from:
+        conditions.append(models.Comment.created_at >= datetime.combine(criteria.created_from, datetime.min.time()))
+    if criteria.created_to:
+        conditions.append(models.Comment.created_at < datetime.combine(criteria.created_to + timedelta(days=1), datetime.min.time()))
+    chunk = select(models.Comment.id).where(*conditions).order_by(models.Comment.id).limit(limit)
+    deleted = (
+        delete(models.Comment)
+        .where(models.Comment.id.in_(chunk))
+        .returning(models.Comment.id, models.Comment.photo_id)
+        .cte("deleted_comments")
+    )
+    per_photo = select(deleted.c.photo_id, func.count().label("deleted")).group_by(deleted.c.photo_id).subquery()
+    counted = (
+        update(models.Photo)
+        .where(models.Photo.id == per_photo.c.photo_id)
+        .values(comment_count=models.Photo.comment_count - per_photo.c.deleted, updated_at=models.Photo.updated_at)
+        .returning(models.Photo.id)
+        .cte("counted")
+    )
+    return select(func.count(), func.max(deleted.c.id)).select_from(deleted).add_cte(counted)
+
+async def delete_comments_chunk(db: AsyncSession, criteria: schemas.CommentModeration, after_id: int, limit: int, comment_ids: list[int] | None = None) -> tuple[int, int | None]:
+    """
+    Delete the next chunk of comments matching the moderation criteria in one transaction.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :param criteria: The moderation criteria.
+    :type criteria: schemas.CommentModeration
+    :param after_id: The last ID of the previous chunk, 0 for the first chunk.
+    :type after_id: int
+    :param limit: The maximum number of comments in the chunk.
+    :type limit: int
+    :param comment_ids: The IDs of the comments of the chunk, None to select the comments by the other criteria only.
+    :type comment_ids: list[int] | None
+    :return: The number of deleted comments and the last deleted ID, None if nothing was deleted.
+    :rtype: tuple[int, int | None]
+    """
+    deleted, last_id = (await db.execute(build_comments_bulk_delete_statement(criteria, after_id, limit, comment_ids))).one()
+    await db.commit()
+    return deleted, last_id
@@ -0,0 +1,87 @@
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fastapi_app.src.database.models import User, Photo, Comment
+
+
+async def change_photo_count(db: AsyncSession, user_id: int, delta: int) -> None:
+    """
+    Adds delta to the number of photos of a user, in the transaction which adds or deletes the photos.
+
+    The counter is changed by the database (photo_count = photo_count + delta), so concurrent
+    changes are not lost.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :param user_id: The ID of the owner of the photos.
+    :type user_id: int
+    :param delta: The number of added photos, negative for deleted ones.
+    :type delta: int
+    """
+    if user_id is not None:
+        await db.execute(update(User).where(User.id == user_id).values(photo_count=User.photo_count + delta))
+
+
+async def change_comment_count(db: AsyncSession, photo_id: int, delta: int) -> None:
+    """
+    Adds delta to the number of comments of a photo, in the transaction which adds or deletes the comments.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :param photo_id: The ID of the photo.
+    :type photo_id: int
+    :param delta: The number of added comments, negative for deleted ones.
+    :type delta: int
+    """
+    if photo_id is not None:
+        await db.execute(
+            update(Photo)
+            .where(Photo.id == photo_id)
+            .values(comment_count=Photo.comment_count + delta, updated_at=Photo.updated_at)
+        )
+
+
+COUNTERS = {
+    "users.photo_count": (User, User.photo_count, Photo.user_id),
+    "photos.comment_count": (Photo, Photo.comment_count, Comment.photo_id),
+}
+
+
+async def reconcile_batch(db: AsyncSession, counter: str, after_id: int, batch_size: int) -> tuple[int | None, int]:
+    """
+    Recounts a counter for the next batch of rows and fixes the rows where it drifted, in one transaction.
+
+    The rows of the batch are locked first, so photos and comments added while the batch is
+    recounted wait for the lock and change the fixed counter afterwards, instead of being lost.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :param counter: The counter, a key of COUNTERS.
+    :type counter: str
+    :param after_id: The last ID of the previous batch, 0 for the first batch.
+    :type after_id: int
+    :param batch_size: The maximum number of rows of the batch.
+    :type batch_size: int
+    :return: The last ID of the batch (None when there are no more rows) and the number of fixed rows.
+    :rtype: tuple[int | None, int]
+    """
+    model, column, foreign_key = COUNTERS[counter]
+    ids = (await db.scalars(
+        select(model.id).filter(model.id > after_id).order_by(model.id).limit(batch_size).with_for_update()
+    )).all()
+    if not ids:
+        await db.commit()
+        return None, 0
+    actual = select(func.count()).where(foreign_key == model.id).scalar_subquery()
+    values = {column.key: actual}
+    if model is Photo:
+        values["updated_at"] = Photo.updated_at
+    result = await db.execute(
+        update(model)
+        .where(model.id > after_id, model.id <= ids[-1], column != actual)
+        .values(**values)
+        .returning(model.id)
+    )
+    fixed = len(result.all())
+    await db.commit()
+    return ids[-1], fixed
@@ -0,0 +1,113 @@
+from sqlalchemy import select, update, case, cast, values, column, tuple_, Float, Integer
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fastapi_app.src.database.models import Opinion, Photo, User
+
+
+def update_rating(photo_id, sum_delta, count_delta):
+    """
+    Builds the statement which adds votes to the rating aggregates of photos.
+
+    The sum, the count and the average are computed by the database from the stored values in one
+    UPDATE, so concurrent votes can not overwrite each other and the rating is never recomputed
+    from the opinions table. The arguments may be columns of a VALUES list to update many photos
+    with one statement.
+
+    :param photo_id: The ID of the photo.
+    :type photo_id: int | ColumnElement
+    :param sum_delta: The change of the sum of votes.
+    :type sum_delta: int | ColumnElement
+    :param count_delta: The change of the number of votes.
+    :type count_delta: int | ColumnElement
+    :return: The UPDATE statement returning the new rating, rating_sum and rating_count of the photos.
+    :rtype: Update
+    """
+    rating_sum = Photo.rating_sum + sum_delta
+    rating_count = Photo.rating_count + count_delta
+    return (
+        update(Photo)
+        .where(Photo.id == photo_id)
+        .values(
+            rating_sum=rating_sum,
+            rating_count=rating_count,
+            rating=case((rating_count > 0, cast(rating_sum, Float) / cast(rating_count, Float)), else_=0.0),
+            # A vote is not an edit of the photo.
+            updated_at=Photo.updated_at,
+        )
+        .returning(Photo.id.label("photo_id"), Photo.rating, Photo.rating_sum, Photo.rating_count)
+    )
+
+
+async def photo_exists(db: AsyncSession, photo_id: int) -> bool:
+    """
+    Checks if the photo exists, reading only the primary key index.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :param photo_id: The ID of the photo.
+    :type photo_id: int
+    :return: True if the photo exists.
+    :rtype: bool
+    """
+    result = await db.execute(select(Photo.id).filter(Photo.id == photo_id))
+    return result.first() is not None
+
+
+async def apply_votes(db: AsyncSession, votes: dict[tuple[int, int], int]) -> int:
+    """
+    Saves a batch of votes and updates the ratings of the voted photos in one transaction.
+
+    Opinions are written with one INSERT ... ON CONFLICT (user_id, photo_id) DO UPDATE, so a user
+    voting again replaces the previous vote. The changes of the votes are summed per photo and all
+    photos are updated with one UPDATE ... FROM (VALUES ...). Applying the same batch twice does
+    not change the ratings, the second time every vote replaces an equal vote. Votes for photos
+    or of users which were deleted are dropped, so they can not fail the batch on a foreign key.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :param votes: The latest vote of each user, keyed by (photo_id, user_id).
+    :type votes: dict[tuple[int, int], int]
+    :return: The number of saved votes.
+    :rtype: int
+    """
+    if not votes:
+        return 0
+
+    photo_ids = sorted({photo_id for photo_id, _ in votes})
+    existing_photos = set((await db.scalars(select(Photo.id).filter(Photo.id.in_(photo_ids)))).all())
+    user_ids = sorted({user_id for _, user_id in votes})
+    existing_users = set((await db.scalars(select(User.id).filter(User.id.in_(user_ids)))).all())
+    votes = {key: vote for key, vote in votes.items() if key[0] in existing_photos and key[1] in existing_users}
+    if not votes:
+        return 0
+
+    result = await db.execute(
+        select(Opinion.photo_id, Opinion.user_id, Opinion.vote)
+        .filter(tuple_(Opinion.photo_id, Opinion.user_id).in_(list(votes)))
+        .with_for_update()
+    )
+    previous = {(photo_id, user_id): vote for photo_id, user_id, vote in result.all()}
+
+    stmt = insert(Opinion).values(
+        [{"photo_id": photo_id, "user_id": user_id, "vote": vote} for (photo_id, user_id), vote in sorted(votes.items())]
+    )
+    await db.execute(
+        stmt.on_conflict_do_update(index_elements=[Opinion.user_id, Opinion.photo_id], set_={"vote": stmt.excluded.vote})
+    )
+
+    deltas = {}
+    for key, vote in votes.items():
+        sum_delta, count_delta = deltas.get(key[0], (0, 0))
+        old_vote = previous.get(key)
+        if old_vote is None:
+            deltas[key[0]] = (sum_delta + vote, count_delta + 1)
+        else:
+            deltas[key[0]] = (sum_delta + vote - old_vote, count_delta)
+    changes = values(
+        column("photo_id", Integer), column("sum_delta", Integer), column("count_delta", Integer), name="deltas"
+    ).data([(photo_id, *delta) for photo_id, delta in sorted(deltas.items())])
+    await db.execute(update_rating(changes.c.photo_id, changes.c.sum_delta, changes.c.count_delta))
+
+    await db.commit()
+    return len(votes)
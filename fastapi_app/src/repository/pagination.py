@@ -0,0 +1,74 @@
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def encode_cursor(values) -> str:
+    """
+    Encodes the sort key values of the last row of a page as an opaque cursor.
+
+    :param values: The values of the sort keys.
+    :type values: Sequence
+    :return: The cursor.
+    :rtype: str
+    """
+    data = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, keys) -> list:
+    """
+    Decodes a cursor created by encode_cursor.
+
+    :param cursor: The cursor sent by the client.
+    :type cursor: str
+    :param keys: The sort key expressions the cursor was created for.
+    :type keys: Sequence[ColumnElement]
+    :return: The values of the sort keys.
+    :rtype: list
+    :raises HTTPException: If the cursor is malformed.
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(data)
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError(cursor)
+        return [
+            datetime.fromisoformat(value) if key.type.python_type is datetime else key.type.python_type(value)
+            for key, value in zip(keys, values)
+        ]
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def fetch_page(db: AsyncSession, query: Select, keys, cursor: str | None, limit: int) -> dict:
+    """
+    Executes the query and returns one page of its rows, ordered by the sort keys descending.
+
+    The page starts right after the row the cursor points to, so the database seeks to it
+    through the index on the sort keys instead of skipping all the rows of previous pages.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :param query: The query selecting a single entity.
+    :type query: Select
+    :param keys: The sort key expressions, the last one has to be unique (e.g. the primary key).
+    :type keys: Sequence[ColumnElement]
+    :param cursor: The next_cursor of the previous page, or None for the first page.
+    :type cursor: str | None
+    :param limit: The maximum number of rows of the page.
+    :type limit: int
+    :return: The rows of the page as "items" and the cursor of the next page as "next_cursor", None on the last page.
+    :rtype: dict
+    """
+    query = query.add_columns(*keys)
+    if cursor is not None:
+        query = query.filter(tuple_(*keys) < tuple_(*decode_cursor(cursor, keys)))
+    query = query.order_by(*(key.desc() for key in keys)).limit(limit + 1)
+    rows = (await db.execute(query)).all()
+    next_cursor = encode_cursor(rows[limit - 1][1:]) if len(rows) > limit else None
+    return {"items": [row[0] for row in rows[:limit]], "next_cursor": next_cursor}
@@ -1,76 +1,239 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import and_, or_, select, func, type_coerce, Float
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from fastapi_app.src.database.models import Photo
 from fastapi_app.src.database import models
+from fastapi_app.src.repository.pagination import fetch_page
+from fastapi_app.src.repository.tags import normalize_tag_names
+from fastapi_app.src.services.tag_cache import tag_cache
 from fastapi_app.src import schemas
-from datetime import datetime
+from datetime import datetime, date, timedelta
 from fastapi import HTTPException
 
+# Sort orders of photo search results, each ends with the primary key to make the order unique.
+SORT_KEYS = {
+    "created_at": (models.Photo.created_at, models.Photo.id),
+    "rating": (models.Photo.rating, models.Photo.id),
+}
 
-async def get_description(db: Session, description: str,rating_filter:int = None, created_at: str = None):
+
+def _parse_date(created_at: str) -> date:
+    try:
+        return date.fromisoformat(created_at)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="created_at has to be a date in format YYYY-MM-DD")
+
+
+def _filter_created_at(query, created_at: str | None, created_from: date | None, created_to: date | None):
+    """
+    Adds a range predicate on Photo.created_at, so the database finds the photos through the
+    (created_at, id) index instead of comparing the date of every row.
+    """
+    if created_at:
+        if created_from or created_to:
+            raise HTTPException(status_code=400, detail="Use created_at or the created_from/created_to range, not both")
+        created_from = created_to = _parse_date(created_at)
+    if created_from and created_to and created_from > created_to:
+        raise HTTPException(status_code=400, detail="created_from has to be before created_to")
+    if created_from:
+        query = query.filter(models.Photo.created_at >= datetime.combine(created_from, datetime.min.time()))
+    if created_to:
+        query = query.filter(models.Photo.created_at < datetime.combine(created_to + timedelta(days=1), datetime.min.time()))
+    return query
+
+
+def _sort_keys(sort_by: str, extra_keys: dict | None = None):
+    keys = {**SORT_KEYS, **(extra_keys or {})}
+    if sort_by not in keys:
+        raise HTTPException(status_code=400, detail=f"sort_by has to be one of: {', '.join(keys)}")
+    return keys[sort_by]
+
+
+def _join_tag_group(query, tag_ids: tuple[int, ...]):
+    """
+    Keeps the photos which have one of the tags, joining photo_tag through its (tag_id, photo_id) index.
+    """
+    if len(tag_ids) == 1:
+        # The primary key (photo_id, tag_id) guarantees at most one row per photo, the join does not duplicate photos.
+        link = models.photo_tag_table.alias()
+        return query.join(link, and_(link.c.photo_id == models.Photo.id, link.c.tag_id == tag_ids[0]))
+    link = (
+        select(models.photo_tag_table.c.photo_id)
+        .filter(models.photo_tag_table.c.tag_id.in_(tag_ids))
+        .distinct()
+        .subquery()
+    )
+    return query.join(link, link.c.photo_id == models.Photo.id)
+
+
+def build_photo_search_query(description: str | None = None, tag_ids: list[tuple[int, ...]] | None = None, match_all_tags: bool = True,
+                             rating_min: float | None = None, rating_max: float | None = None,
+                             created_at: str | None = None, created_from: date | None = None, created_to: date | None = None,
+                             user_id: int | None = None, sort_by: str = "created_at"):
+    """
+    Builds a single SQL statement which applies all the given photo filters at once.
+
+    Every filter is optional and the filters are combined with AND:
+
+    * description uses the full text index of photo descriptions,
+    * tag_ids are joined with the photo_tag table, a photo has to have a tag of every group
+      when match_all_tags is True, or any of the tags otherwise,
+    * rating_min and rating_max are inclusive bounds of the rating,
+    * created_at, created_from and created_to are ranges of creation dates,
+    * user_id selects photos of one owner.
+
+    :param description: The words to search for in photo descriptions.
+    :type description: str | None
+    :param tag_ids: The ids of tags, grouped by tag name (one name may match tags differing in case).
+    :type tag_ids: list[tuple[int, ...]] | None
+    :param match_all_tags: True to require all tag groups, False to require any of the tags.
+    :type match_all_tags: bool
+    :param rating_min: The lowest rating of search photo.
+    :type rating_min: float | None
+    :param rating_max: The highest rating of search photo.
+    :type rating_max: float | None
+    :param created_at: The date of search photo creation in format YYYY-MM-DD.
+    :type created_at: str | None
+    :param created_from: The first day of the range of search photo creation dates.
+    :type created_from: date | None
+    :param created_to: The last day of the range of search photo creation dates.
+    :type created_to: date | None
+    :param user_id: The id of the owner of search photo.
+    :type user_id: int | None
+    :param sort_by: The order of photos: 'created_at', 'rating' or, with description, 'relevance'.
+    :type sort_by: str
+    :return: The query selecting the photos and the sort keys to pass to fetch_page.
+    :rtype: tuple
+    :raises HTTPException: If the filters are contradictory or sort_by is unknown.
+    """
+    query = select(models.Photo).options(selectinload(models.Photo.tags))
+    extra_keys = {}
+
+    if description:
+        search_query = func.websearch_to_tsquery(models.DESCRIPTION_SEARCH_CONFIG, description)
+        query = query.filter(models.Photo.description_tsv.op('@@')(search_query))
+        relevance = type_coerce(func.ts_rank_cd(models.Photo.description_tsv, search_query), Float)
+        extra_keys["relevance"] = (relevance, models.Photo.id)
+
+    if tag_ids:
+        tag_groups = tag_ids if match_all_tags else [tuple(id for group in tag_ids for id in group)]
+        for group in tag_groups:
+            query = _join_tag_group(query, group)
+
+    if rating_min is not None and rating_max is not None and rating_min > rating_max:
+        raise HTTPException(status_code=400, detail="rating_min has to be lower than rating_max")
+    if rating_min is not None:
+        query = query.filter(models.Photo.rating >= rating_min)
+    if rating_max is not None:
+        query = query.filter(models.Photo.rating <= rating_max)
+
+    query = _filter_created_at(query, created_at, created_from, created_to)
+
+    if user_id is not None:
+        query = query.filter(models.Photo.user_id == user_id)
+
+    return query, _sort_keys(sort_by, extra_keys)
+
+
+async def search_photos(db: AsyncSession, cursor: str | None = None, limit: int = 20, tags: list[str] | None = None,
+                        match_all_tags: bool = True, **filters):
+    """
+    Retrieve one page of photos matching all the given filters with a single query.
+
+    Tag names are resolved to ids with the tag dictionary of the worker, so the query does not
+    have to join the tags table.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :param cursor: The next_cursor returned with the previous page, None for the first page.
+    :type cursor: str | None
+    :param limit: The maximum number of photos on the page.
+    :type limit: int
+    :param tags: The names of tags (case-insensitive).
+    :type tags: list[str] | None
+    :param match_all_tags: True to require all tags, False to require any of them.
+    :type match_all_tags: bool
+    :param filters: The other filters accepted by build_photo_search_query.
+    :return: The photos of the page as "items" and the cursor of the next page as "next_cursor".
+    :rtype: dict
     """
-    Retrieve one or more photos from the database based on their descriptions.
+    tag_names = normalize_tag_names(tags or [])
+    tag_ids = None
+    if tag_names:
+        resolved = await tag_cache.resolve(tag_names, db)
+        tag_ids = [resolved[name] for name in tag_names if name in resolved]
+    query, keys = build_photo_search_query(tag_ids=tag_ids, match_all_tags=match_all_tags, **filters)
+    if tag_names and (not tag_ids or match_all_tags and len(tag_ids) < len(tag_names)):
+        # A tag which does not exist can not match any photo.
+        return {"items": [], "next_cursor": None}
+    return await fetch_page(db, query, keys, cursor, limit)
+
+
+async def get_description(db: AsyncSession, description: str,rating_filter:int = None, created_at: str = None,
+                          created_from: date | None = None, created_to: date | None = None,
+                          sort_by: str = "relevance", cursor: str | None = None, limit: int = 20):
+    """
+    Retrieve one page of photos from the database based on their descriptions.
+
+    The description is matched with the full text search index of the photos, words of the
+    description may be combined like in a web search engine ("quoted phrase", or, -excluded).
 
     :param db: The database session.
-    :type db: Session
-    :param description: The description to search for (case-insensitive).
+    :type db: AsyncSession
+    :param description: The words to search for in photo descriptions (case-insensitive).
     :type description: str
     :param rating_filter: The rating of search photo.
     :type: int
-    :param created_at: The date of search photo creation.
+    :param created_at: The date of search photo creation in format YYYY-MM-DD.
     :type created_at: str
-    :return: A list of Photo objects matching the specified description or photo objects with its rating or its creation date. .
-    :rtype: List[models.Photo]
-    :raises HTTPException: If the photo is not found, or the photo with selected rating or creation date is not found, raises a 404 error with the detail message.
+    :param created_from: The first day of the range of search photo creation dates.
+    :type created_from: date | None
+    :param created_to: The last day of the range of search photo creation dates.
+    :type created_to: date | None
+    :param sort_by: The order of photos: 'relevance' (the most relevant first), 'created_at' (the newest first) or 'rating' (the best rated first).
+    :type sort_by: str
+    :param cursor: The next_cursor returned with the previous page, None for the first page.
+    :type cursor: str | None
+    :param limit: The maximum number of photos on the page.
+    :type limit: int
+    :return: The photos of the page as "items" and the cursor of the next page as "next_cursor".
+    :rtype: dict
+    :raises HTTPException: If the filters are contradictory, raises a 400 error with the detail message.
     """
-    if rating_filter and created_at:
-        raise HTTPException(status_code=400, detail="Choose only one filter parameter at once. Rating or created_at")
-    
-    query = db.query(models.Photo).filter(models.Photo.description.ilike(f'%{description}%')).first()
-    print(query)
-    if query:
-        id = query.id
-    if query and rating_filter:
-         query2 = db.query(models.Photo).filter(models.Photo.id==id).filter(models.Photo.rating == rating_filter).all()
-    elif query and created_at:
-        query2 = db.query(models.Photo).filter(models.Photo.id==id).all()
-        query2 = [q for q in query2 if str(q.created_at)[0:10] == created_at]
-    elif query:
-        query2 = db.query(models.Photo).filter(models.Photo.description.ilike(f'%{description}%')).all()              
-    else:
-        raise HTTPException(status_code=400, detail="description does not exist")
-    return query2
-
-async def get_tag(db: Session, tagname: str, rating_filter:int = None, created_at: str = None):
+    return await search_photos(
+        db, cursor=cursor, limit=limit, description=description, rating_min=rating_filter, rating_max=rating_filter,
+        created_at=created_at, created_from=created_from, created_to=created_to, sort_by=sort_by,
+    )
+
+async def get_tag(db: AsyncSession, tagname: str, rating_filter:int = None, created_at: str = None,
+                  created_from: date | None = None, created_to: date | None = None,
+                  sort_by: str = "created_at", cursor: str | None = None, limit: int = 20):
     """
-    Retrieve one or more photos from the database based on their tag.
+    Retrieve one page of photos from the database based on their tag.
 
     :param db: The database session.
-    :type db: Session
-    :param tagname: The tag to search for.
+    :type db: AsyncSession
+    :param tagname: The tag to search for (case-insensitive).
     :type tagname: str
     :param rating_filter: The rating of search photo.
     :type: int
-    :param created_at: The date of search photo creation.
+    :param created_at: The date of search photo creation in format YYYY-MM-DD.
     :type created_at: str
-    :return: A list of Photo objects matching the specified tagname.
-    :rtype: List[models.Photo]
-    :raises HTTPException: If the photo is not found, or the photo with selected rating or creation date is not found, raises a 404 error with the detail message.
+    :param created_from: The first day of the range of search photo creation dates.
+    :type created_from: date | None
+    :param created_to: The last day of the range of search photo creation dates.
+    :type created_to: date | None
+    :param sort_by: The order of photos: 'created_at' (the newest first) or 'rating' (the best rated first).
+    :type sort_by: str
+    :param cursor: The next_cursor returned with the previous page, None for the first page.
+    :type cursor: str | None
+    :param limit: The maximum number of photos on the page.
+    :type limit: int
+    :return: The photos of the page as "items" and the cursor of the next page as "next_cursor".
+    :rtype: dict
+    :raises HTTPException: If the filters are contradictory, raises a 400 error with the detail message.
     """
-    if rating_filter and created_at:
-        raise HTTPException(status_code=400, detail="Choose only one filter parameter at once. Rating or created_at")
-    
-    query = db.query(models.Tag).filter(models.Tag.name.ilike(tagname)).first()
-    if query:
-        id = query.id
-    if query and rating_filter:
-        query2 = db.query(models.Photo).filter(models.Photo.tags.any(id=id)).filter(models.Photo.rating == rating_filter).all()
-    elif query and created_at:
-        query2 = db.query(models.Photo).filter(models.Photo.tags.any(id=id)).all()
-        query2 = [q for q in query2 if str(q.created_at)[0:10] == created_at]
-    elif query:
-        query2 = db.query(models.Photo).filter(models.Photo.tags.any(id=id)).all()                  
-    else:
-        raise HTTPException(status_code=400, detail="Tag does not exist")
-    return query2
-
+    return await search_photos(
+        db, cursor=cursor, limit=limit, tags=[tagname], rating_min=rating_filter, rating_max=rating_filter,
+        created_at=created_at, created_from=created_from, created_to=created_to, sort_by=sort_by,
+    )
@@ -1,32 +1,77 @@
-from sqlalchemy.orm import Session
+from sqlalchemy import select, any_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 from typing import List
 
 from fastapi_app.src.database.models import Tag
-from fastapi_app.src.database.db import get_db
+from fastapi_app.src.services.tag_cache import tag_cache
 
-async def create_tags(names: list[str], db: Session):
+
+def normalize_tag_names(names: list[str]) -> list[str]:
     """
-    Retrieves a tags by name.
+    Normalizes tag names: strips white space, lowercases them and removes empty names and duplicates.
+
+    :param names: The names of tags.
+    :type names: list[str]
+    :return: The normalized names in the order of their first occurrence.
+    :rtype: list[str]
+    """
+    normalized = (name.strip().lower() for name in names)
+    return list(dict.fromkeys(name for name in normalized if name))
+
+
+async def create_tags(names: list[str], db: AsyncSession):
+    """
+    Retrieves a tags by name, creating the tags which do not exist yet.
+
+    Tags found in the tag dictionary of the worker are attached to the session without a query.
+    The other tags are inserted with a single INSERT ... ON CONFLICT (name) DO NOTHING RETURNING and
+    the tags which already existed are loaded with one SELECT, so the number of round-trips does not
+    depend on the number of tags. Tags created at the same time by another request are picked up
+    by the SELECT instead of failing on the unique constraint. Nothing is committed, the tags are
+    saved together with the rest of the caller's transaction, which should add the tags to the
+    tag dictionary once it is committed.
 
     :param names: The names of tags.
     :type names: list[str]
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: List of tags (both existing and newly added) if found, otherwise None.
-    :rtype: Tag
+    :rtype: List[Tag]
     """
     if names == None:
         return None
 
-    final = []
+    names = normalize_tag_names(names)
+    if not names:
+        return []
+
+    tags = {}
+    missing_names = []
     for name in names:
-        existing = db.query(Tag).filter(Tag.name == name).first()
-        if existing:
-            final.append(existing)
-        else:
-            new_tag = Tag(name=name)
-            db.add(new_tag)
-            db.commit()
-            final.append(new_tag)
-
-    return final
\ No newline at end of file
+        id = tag_cache.get_id(name)
+        if id is None:
+            missing_names.append(name)
+            continue
+        tag = Tag(id=id, name=name)
+        make_transient_to_detached(tag)
+        tags[name] = await db.merge(tag, load=False)
+
+    if missing_names:
+        # Sorted rows make concurrent inserts lock the names in the same order and avoid deadlocks.
+        stmt = (
+            insert(Tag)
+            .values([{"name": name} for name in sorted(missing_names)])
+            .on_conflict_do_nothing(index_elements=[Tag.name])
+            .returning(Tag)
+        )
+        tags.update((tag.name, tag) for tag in (await db.scalars(stmt)).all())
+
+    existing_names = [name for name in missing_names if name not in tags]
+    if existing_names:
+        result = (await db.scalars(select(Tag).filter(Tag.name == any_(existing_names)))).all()
+        tag_cache.add(result)
+        tags.update((tag.name, tag) for tag in result)
+
+    return [tags[name] for name in names]
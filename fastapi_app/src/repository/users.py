@@ -1,45 +1,53 @@
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator
+
+from fastapi import HTTPException
 from libgravatar import Gravatar
-from sqlalchemy.orm import Session
+from sqlalchemy import select, func, Row, Select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from fastapi_app.src.database.models import User, Photo
+from fastapi_app.src.database.models import User
+from fastapi_app.src.repository.pagination import fetch_page
 from fastapi_app.src.schemas import UserModel, ProfileStatusUpdate
 from fastapi_app.src.services.auth import auth_service
 
 
-async def get_user_by_email(email: str, db: Session) -> User:
+async def get_user_by_email(email: str, db: AsyncSession) -> User:
     """
     Retrieves a user by their email.
 
     :param email: The email address of the user.
     :type email: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The user object if found, otherwise None.
     :rtype: User
     """
-    return db.query(User).filter(User.email == email).first()
+    result = await db.execute(select(User).filter(User.email == email))
+    return result.scalars().first()
 
-async def get_user_by_username(username: str, db: Session) -> User:
+async def get_user_by_username(username: str, db: AsyncSession) -> User:
     """
     Retrieves a user by their username.
 
     :param username: The username of the user.
     :type username: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The user object if found, otherwise None.
     :rtype: User
     """
-    return db.query(User).filter(User.username == username).first()
+    result = await db.execute(select(User).filter(User.username == username))
+    return result.scalars().first()
 
-async def create_user(body: UserModel, db: Session) -> User:
+async def create_user(body: UserModel, db: AsyncSession) -> User:
     """
     Creates a new user.
 
     :param body: The user registration details.
     :type body: UserModel
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The newly created user object.
     :rtype: User
     :raises Exception: If an error occurs while fetching the Gravatar image.
@@ -51,19 +59,19 @@ async def create_user(body: UserModel, db: Session) -> User:
     except Exception as e:
         print(e)
         
-    if db.query(User).count() == 0:
+    if await db.scalar(select(func.count()).select_from(User)) == 0:
         role = "admin"
     else:
         role = "user"
         
     new_user = User(**body.dict(), avatar = avatar, role = role)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
-async def update_token(user: User, token: str | None, db: Session) -> None:
+async def update_token(user: User, token: str | None, db: AsyncSession) -> None:
     """
     Updates the refresh token for a user.
 
@@ -72,27 +80,42 @@ async def update_token(user: User, token: str | None, db: Session) -> None:
     :param token: The new refresh token, or None to clear it.
     :type token: str | None
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     """
     user.refresh_token = token
-    db.commit()
+    await db.commit()
 
 
-async def confirmed_email(email: str, db: Session) -> None:
+async def update_password(user: User, password_hash: str, db: AsyncSession) -> None:
+    """
+    Replaces the stored password hash of a user.
+
+    :param user: The user object.
+    :type user: User
+    :param password_hash: The new password hash.
+    :type password_hash: str
+    :param db: The database session.
+    :type db: AsyncSession
+    """
+    user.password = password_hash
+    await db.commit()
+
+
+async def confirmed_email(email: str, db: AsyncSession) -> None:
     """
     Confirms a user's email address.
 
     :param email: The email address to be confirmed.
     :type email: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     """
     user = await get_user_by_email(email, db)
     user.confirmed = True
-    db.commit()
+    await db.commit()
 
 
-async def update_avatar(email, url: str, db: Session) -> User:
+async def update_avatar(email, url: str, db: AsyncSession) -> User:
     """
     Updates the avatar URL for a user.
 
@@ -101,30 +124,31 @@ async def update_avatar(email, url: str, db: Session) -> User:
     :param url: The new avatar URL.
     :type url: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The updated user object.
     :rtype: User
     """
     user = await get_user_by_email(email, db)
     user.avatar = url
-    db.commit()
+    await db.commit()
+    await auth_service.user_cache.invalidate(email)
     return user
 
-async def get_profile(username: str, db: Session):
+async def get_profile(username: str, db: AsyncSession):
     """
     Retrieve the profile information for a given username.
 
     :param username: The username of the user whose profile is to be retrieved.
     :type username: str
     :param db: The database session used to query the user information.
-    :type db: Session
+    :type db: AsyncSession
     :return: A dictionary containing the user's profile information or None if the user does not exist.
     :rtype: dict or None
     """
-    user_information = db.query(User).filter(User.username==username).first()
+    user_information = await get_user_by_username(username, db)
     if not user_information:
         return None
-    amount_of_user_photos = db.query(Photo).filter(Photo.user_id==user_information.id).count()
+    amount_of_user_photos = user_information.photo_count
     profile_information = {
                             'username':     user_information.username,
                             'avatar':       user_information.avatar,
@@ -135,7 +159,7 @@ async def get_profile(username: str, db: Session):
     }
     return profile_information
 
-async def ban_user(username: str, current_user: User, db: Session):
+async def ban_user(username: str, current_user: User, db: AsyncSession):
     """
     Ban a user from the system.
 
@@ -147,18 +171,19 @@ async def ban_user(username: str, current_user: User, db: Session):
     :param current_user: The user performing the ban action.
     :type current_user: User
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The banned user object if the operation was successful, otherwise None.
     :rtype: User or None
     """
     if current_user.role!="admin":
         return None
-    user = db.query(User).filter(User.username==username).first()
-    db.delete(user)
-    db.commit()
+    user = await get_user_by_username(username, db)
+    await db.delete(user)
+    await db.commit()
+    await auth_service.user_cache.invalidate(user.email)
     return user
 
-async def update_user_profile(username: str,body: ProfileStatusUpdate, current_user: User, db: Session):
+async def update_user_profile(username: str,body: ProfileStatusUpdate, current_user: User, db: AsyncSession):
     """
     Update a user's profile.
 
@@ -171,34 +196,36 @@ async def update_user_profile(username: str,body: ProfileStatusUpdate, current_u
     :param current_user: The current authenticated user.
     :type current_user: User
     :param db: The database session dependency.
-    :type db: Session
+    :type db: AsyncSession
     :return: The updated user profile or None if the username does not match the current user.
     :rtype: User or None
     """
     if current_user.username!=username:
         return None
-    user = db.query(User).filter(User.username==username).first()
+    user = await get_user_by_username(username, db)
     if user:
         if body.username: user.username=body.username
-        if body.password: user.password=auth_service.get_password_hash(body.password)
-        db.commit()
+        if body.password: user.password=await auth_service.get_password_hash(body.password)
+        await db.commit()
+        await auth_service.user_cache.invalidate(user.email)
     return user
 
-async def get_current_user_profile(user: User, db: Session):
+async def get_current_user_profile(user: User, db: AsyncSession):
     """
     Retrieve the current user's profile information.
 
     This function fetches the profile information of the current authenticated user,
-    including the number of photos they have uploaded.
+    including the number of photos they have uploaded, read from the counter of the user
+    because the cached user may hold an old value.
 
     :param user: The current authenticated user.
     :type user: User
     :param db: The database session dependency.
-    :type db: Session
+    :type db: AsyncSession
     :return: A dictionary containing the user's profile information.
     :rtype: dict
     """
-    amount_of_user_photos = db.query(Photo).filter(Photo.user_id==user.id).count()
+    amount_of_user_photos = await db.scalar(select(User.photo_count).filter(User.id==user.id))
     profile_information = {
                             'username':     user.username,
                             'avatar':       user.avatar,
@@ -207,4 +234,74 @@ async def get_current_user_profile(user: User, db: Session):
                             'role':         user.role,
                             'photo_amount': amount_of_user_photos
     }
-    return profile_information
\ No newline at end of file
+    return profile_information
+
+
+def build_users_query(*columns, role: str | None = None, confirmed: bool | None = None,
+                      created_from: date | None = None, created_to: date | None = None) -> Select:
+    """
+    Builds the query selecting the users matching all the given filters.
+
+    :param columns: The selected columns, the User entity by default.
+    :param role: The role of the users.
+    :type role: str | None
+    :param confirmed: True for the users who confirmed their email, False for the others.
+    :type confirmed: bool | None
+    :param created_from: The first day of the range of creation dates.
+    :type created_from: date | None
+    :param created_to: The last day of the range of creation dates.
+    :type created_to: date | None
+    :return: The query.
+    :rtype: Select
+    :raises HTTPException: If created_from is after created_to, raises a 400 error.
+    """
+    query = select(*(columns or (User,)))
+    if role is not None:
+        query = query.filter(User.role == role)
+    if confirmed is not None:
+        query = query.filter(User.confirmed.is_(confirmed))
+    if created_from and created_to and created_from > created_to:
+        raise HTTPException(status_code=400, detail="created_from has to be before created_to")
+    if created_from:
+        query = query.filter(User.created_at >= datetime.combine(created_from, datetime.min.time()))
+    if created_to:
+        query = query.filter(User.created_at < datetime.combine(created_to + timedelta(days=1), datetime.min.time()))
+    return query
+
+async def get_users_page(db: AsyncSession, cursor: str | None, limit: int, **filters) -> dict:
+    """
+    Retrieve one page of users matching the filters, the newest first.
+
+    :param db: The database session.
+    :type db: AsyncSession
+    :param cursor: The next_cursor returned with the previous page, None for the first page.
+    :type cursor: str | None
+    :param limit: The maximum number of users on the page.
+    :type limit: int
+    :param filters: The filters accepted by build_users_query.
+    :return: The users of the page as "items" and the cursor of the next page as "next_cursor".
+    :rtype: dict
+    :raises HTTPException: If the filters are contradictory or the cursor is malformed, raises a 400 error.
+    """
+    return await fetch_page(db, build_users_query(**filters), (User.id,), cursor, limit)
+
+async def stream_users(db: AsyncSession, query: Select, batch_size: int) -> AsyncIterator[list[Row]]:
+    """
+    Reads the rows of a users query in ID order through a server-side cursor.
+
+    Only batch_size rows are fetched from the database at a time, so reading the whole table
+    takes as much memory as one batch. Select columns rather than the User entity, rows of
+    columns are not kept by the session.
+
+    :param db: The database session, its transaction stays open until the last batch is read.
+    :type db: AsyncSession
+    :param query: The query built by build_users_query.
+    :type query: Select
+    :param batch_size: The number of rows fetched at a time.
+    :type batch_size: int
+    :return: The rows in batches of at most batch_size.
+    :rtype: AsyncIterator[list[Row]]
+    """
+    result = await db.stream(query.order_by(User.id).execution_options(yield_per=batch_size))
+    async for batch in result.partitions():
+        yield batch
@@ -1,8 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends, status, Security, BackgroundTasks, Request
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from fastapi_app.src.database.db import get_db
+from fastapi_app.src.database.db import get_async_db
 from fastapi_app.src.schemas import UserModel, UserResponse, TokenModel, RequestEmail
 from fastapi_app.src.repository import users as repository_users
 from fastapi_app.src.services.auth import auth_service
@@ -19,7 +19,7 @@ async def signup(
     body: UserModel,
     background_tasks: BackgroundTasks,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Registers a new user.
@@ -31,7 +31,7 @@ async def signup(
     :param request: The request object.
     :type request: Request
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The newly created user and a confirmation message.
     :rtype: UserResponse
     :raises HTTPException: If the user already exists.
@@ -41,7 +41,7 @@ async def signup(
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT, detail="Account already exists"
         )
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash(body.password)
     new_user = await repository_users.create_user(body, db)
     background_tasks.add_task(
         send_email, new_user.email, new_user.username, request.base_url
@@ -54,7 +54,7 @@ async def signup(
 
 @router.post("/login", response_model=TokenModel)
 async def login(
-    body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+    body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)
 ):
     """
     Authenticates a user and returns JWT tokens.
@@ -62,7 +62,7 @@ async def login(
     :param body: The login details.
     :type body: OAuth2PasswordRequestForm
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The access and refresh tokens.
     :rtype: TokenModel
     :raises HTTPException: If the user is not found, email is not confirmed, or password is invalid.
@@ -76,10 +76,13 @@ async def login(
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed"
         )
-    if not auth_service.verify_password(body.password, user.password):
+    password_valid, new_password_hash = await auth_service.verify_and_update_password(body.password, user.password)
+    if not password_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password"
         )
+    if new_password_hash:
+        await repository_users.update_password(user, new_password_hash, db)
     # Generate JWT
     access_token = await auth_service.create_access_token(data={"sub": user.email})
     refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
@@ -94,7 +97,7 @@ async def login(
 @router.get("/refresh_token", response_model=TokenModel)
 async def refresh_token(
     credentials: HTTPAuthorizationCredentials = Security(security),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Refreshes the JWT tokens.
@@ -102,7 +105,7 @@ async def refresh_token(
     :param credentials: The HTTP authorization credentials.
     :type credentials: HTTPAuthorizationCredentials
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The new access and refresh tokens.
     :rtype: TokenModel
     :raises HTTPException: If the refresh token is invalid.
@@ -127,14 +130,14 @@ async def refresh_token(
 
 
 @router.get("/confirmed_email/{token}")
-async def confirmed_email(token: str, db: Session = Depends(get_db)):
+async def confirmed_email(token: str, db: AsyncSession = Depends(get_async_db)):
     """
     Confirms a user's email address.
 
     :param token: The confirmation token.
     :type token: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: A confirmation message.
     :rtype: dict
     :raises HTTPException: If the verification fails or user is not found.
@@ -156,7 +159,7 @@ async def request_email(
     body: RequestEmail,
     background_tasks: BackgroundTasks,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Requests email confirmation for a user.
@@ -168,7 +171,7 @@ async def request_email(
     :param request: The request object.
     :type request: Request
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: A message indicating the result of the request.
     :rtype: dict
     """
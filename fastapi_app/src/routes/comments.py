@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from fastapi_app.src.database import models
 from fastapi_app.src import schemas
 from fastapi_app.src.repository import comments as crud
-from fastapi_app.src.database.db import get_db
+from fastapi_app.src.database.db import get_async_db
 from fastapi_app.src.services.auth import auth_service
+from fastapi_app.src.services.comment_moderation import check_criteria, delete_comments, ndjson
 
 router = APIRouter(prefix="/comments", tags=["comments"])
 # router = APIRouter()
@@ -15,7 +17,7 @@ router = APIRouter(prefix="/comments", tags=["comments"])
 async def create_comment_for_photo(
     photo_id: int,
     comment: schemas.CommentCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(auth_service.get_current_user)
 ):
     """
@@ -26,7 +28,7 @@ async def create_comment_for_photo(
     :param comment: The comment data to create.
     :type comment: schemas.CommentCreate
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The current authenticated user.
     :type current_user: models.User
     :return: The created comment.
@@ -34,15 +36,39 @@ async def create_comment_for_photo(
     """
     return await crud.create_comment(db=db, comment=comment, user_id=current_user.id, photo_id=photo_id)
 
+@router.get("/photos/{photo_id}/comments/", response_model=schemas.CommentPage)
+async def read_photo_comments(
+    photo_id: int,
+    cursor: str | None = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Retrieve the comments of a photo with their authors, the newest first, in pages.
+
+    :param photo_id: The ID of the photo.
+    :type photo_id: int
+    :param cursor: The next_cursor returned with the previous page, omit it to get the first page.
+    :type cursor: str | None
+    :param limit: The maximum number of comments on the page.
+    :type limit: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The page of comments and the cursor of the next page.
+    :rtype: schemas.CommentPage
+    :raises HTTPException: If the photo is not found or the cursor is invalid.
+    """
+    return await crud.get_photo_comments(db, photo_id=photo_id, cursor=cursor, limit=limit)
+
 @router.get("/comments/{comment_id}", response_model=schemas.Comment)
-async def read_comment(comment_id: int, db: Session = Depends(get_db)):
+async def read_comment(comment_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Retrieve a specific comment by its ID.
 
     :param comment_id: The ID of the comment to retrieve.
     :type comment_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The retrieved comment.
     :rtype: schemas.Comment
     :raises HTTPException: If the comment is not found.
@@ -56,7 +82,7 @@ async def read_comment(comment_id: int, db: Session = Depends(get_db)):
 async def update_comment(
     comment_id: int,
     comment: schemas.CommentUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(auth_service.get_current_user)
 ):
     """
@@ -67,22 +93,22 @@ async def update_comment(
     :param comment: The updated comment data.
     :type comment: schemas.CommentUpdate
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The current authenticated user.
     :type current_user: models.User
     :return: The updated comment.
     :rtype: schemas.Comment
     :raises HTTPException: If the comment is not found or the user is not authorized to update it.
     """
-    db_comment = await crud.get_comment(db, comment_id=comment_id)
-    if db_comment is None or db_comment.user_id != current_user.id:
+    db_comment = await crud.update_comment(db=db, comment=comment, comment_id=comment_id, user_id=current_user.id)
+    if db_comment is None:
         raise HTTPException(status_code=404, detail="Comment not found or not authorized to update")
-    return await crud.update_comment(db=db, comment=comment, comment_id=comment_id)
+    return db_comment
 
 @router.delete("/comments/{comment_id}", response_model=schemas.Comment)
 async def delete_comment(
     comment_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(auth_service.get_current_user)
 ):
     """
@@ -91,14 +117,39 @@ async def delete_comment(
     :param comment_id: The ID of the comment to delete.
     :type comment_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The current authenticated user.
     :type current_user: models.User
     :return: The deleted comment.
     :rtype: schemas.Comment
     :raises HTTPException: If the comment is not found or the user is not authorized to delete it.
     """
-    db_comment = await crud.get_comment(db, comment_id=comment_id)
-    if db_comment is None or current_user.role not in ["admin", "moderator"]:
+    if current_user.role not in ["admin", "moderator"]:
         raise HTTPException(status_code=404, detail="Comment not found or not authorized to delete")
-    return await crud.delete_comment(db=db, comment_id=comment_id)
\ No newline at end of file
+    db_comment = await crud.delete_comment(db=db, comment_id=comment_id)
+    if db_comment is None:
+        raise HTTPException(status_code=404, detail="Comment not found or not authorized to delete")
+    return db_comment
+
+@router.post("/moderation/delete")
+async def delete_comments_in_bulk(
+    criteria: schemas.CommentModeration,
+    current_user: models.User = Depends(auth_service.get_current_user)
+):
+    """
+    Delete many comments at once, by their IDs or by author, photo and creation date (moderator access required).
+
+    The comments are deleted in chunks, each chunk in its own transaction. The progress is streamed
+    as newline-delimited JSON, one line after each chunk, the last line has "done": true.
+
+    :param criteria: The comments to delete, a comment is deleted if it matches all the given criteria.
+    :type criteria: schemas.CommentModeration
+    :param current_user: The current authenticated user.
+    :type current_user: models.User
+    :return: The stream of progress lines with the number of deleted comments.
+    :rtype: StreamingResponse
+    :raises HTTPException: If the user is not a moderator or admin, raises a 403 error, if no criterion is given, raises a 400 error.
+    """
+    await auth_service.check_role(current_user, "moderator")
+    check_criteria(criteria)
+    return StreamingResponse(ndjson(delete_comments(criteria)), media_type="application/x-ndjson")
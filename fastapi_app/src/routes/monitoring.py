@@ -0,0 +1,55 @@
+from fastapi import APIRouter, Depends
+
+from fastapi_app.src.database.db import async_engine
+from fastapi_app.src.database.models import User
+from fastapi_app.src.database.pool_metrics import get_pool_status
+from fastapi_app.src.schemas import PoolStatus, UserCacheStats, TagCacheStats
+from fastapi_app.src.services.auth import auth_service
+from fastapi_app.src.services.tag_cache import tag_cache
+
+router = APIRouter(prefix="/monitoring", tags=["monitoring"])
+
+
+@router.get("/db_pool", response_model=PoolStatus)
+async def read_db_pool_status(current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Reports the database connection pool usage of the worker which handles the request (admin access required).
+
+    :param current_user: The current user object.
+    :type current_user: User
+    :return: Checked-out, idle and overflow connection counts and the time spent waiting for a connection.
+    :rtype: PoolStatus
+    :raises HTTPException: If the current user does not have admin privileges.
+    """
+    await auth_service.check_role(current_user, "admin")
+    return get_pool_status(async_engine.pool)
+
+
+@router.get("/user_cache", response_model=UserCacheStats)
+async def read_user_cache_stats(current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Reports the hit and miss counters of the authenticated user cache of the worker which handles the request (admin access required).
+
+    :param current_user: The current user object.
+    :type current_user: User
+    :return: Counters of the local and the Redis cache level.
+    :rtype: UserCacheStats
+    :raises HTTPException: If the current user does not have admin privileges.
+    """
+    await auth_service.check_role(current_user, "admin")
+    return auth_service.user_cache.stats()
+
+
+@router.get("/tag_cache", response_model=TagCacheStats)
+async def read_tag_cache_stats(current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Reports the hit and miss counters of the tag dictionary of the worker which handles the request (admin access required).
+
+    :param current_user: The current user object.
+    :type current_user: User
+    :return: Hit, miss and reload counters and the number of tags.
+    :rtype: TagCacheStats
+    :raises HTTPException: If the current user does not have admin privileges.
+    """
+    await auth_service.check_role(current_user, "admin")
+    return tag_cache.stats()
@@ -0,0 +1,67 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fastapi_app.src.database import models
+from fastapi_app.src import schemas
+from fastapi_app.src.repository import opinions as crud
+from fastapi_app.src.database.db import get_async_db
+from fastapi_app.src.services.auth import auth_service
+from fastapi_app.src.services.vote_buffer import vote_buffer
+
+router = APIRouter(prefix="/opinions", tags=["opinions"])
+
+
+@router.post("/photos/{photo_id}/votes", response_model=schemas.VoteAccepted, status_code=status.HTTP_202_ACCEPTED)
+async def vote_for_photo(
+    photo_id: int,
+    body: schemas.VoteCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(auth_service.get_current_user)
+):
+    """
+    Rate a photo with 1 to 5 stars, voting again replaces the previous vote of the user.
+
+    The vote is buffered and written to the database with other votes within a few seconds,
+    the rating of the photo changes after that.
+
+    :param photo_id: The ID of the photo to rate.
+    :type photo_id: int
+    :param body: The vote.
+    :type body: schemas.VoteCreate
+    :param db: The database session.
+    :type db: AsyncSession
+    :param current_user: The current authenticated user.
+    :type current_user: models.User
+    :return: The accepted vote.
+    :rtype: schemas.VoteAccepted
+    :raises HTTPException: If the photo is not found.
+    """
+    if not await crud.photo_exists(db, photo_id):
+        raise HTTPException(status_code=404, detail="Photo not found")
+    await vote_buffer.add(photo_id, current_user.id, body.vote, db)
+    return {"photo_id": photo_id, "vote": body.vote}
+
+
+@router.get("/photos/{photo_id}/rating", response_model=schemas.PhotoRating)
+async def read_photo_rating(photo_id: int, db: AsyncSession = Depends(get_async_db)):
+    """
+    Retrieve the rating of a photo.
+
+    :param photo_id: The ID of the photo.
+    :type photo_id: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The average vote and the number of votes.
+    :rtype: schemas.PhotoRating
+    :raises HTTPException: If the photo is not found.
+    """
+    result = await db.execute(
+        select(models.Photo.id.label("photo_id"), models.Photo.rating, models.Photo.rating_sum, models.Photo.rating_count)
+        .filter(models.Photo.id == photo_id)
+    )
+    rating = result.first()
+    if rating is None:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    return rating._asdict()
@@ -1,46 +1,33 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Depends
-from uuid import uuid4
+from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, BackgroundTasks, Query, Request, status
+from fastapi.responses import RedirectResponse
 from fastapi_app.src.database.models import Photo, User
 from fastapi_app.src.services.photo_service import PhotoService
+from fastapi_app.src.services.storage import save_upload, stage_content, store_content, discard_upload
+from fastapi_app.src.services.storage_backends import storage_backend
 from fastapi_app.src.services.auth import auth_service
-from fastapi_app.src.database.db import get_db
+from fastapi_app.src.database.db import get_async_db
 from fastapi_app.src.repository.tags import create_tags
-import aiofiles
-import os
-from sqlalchemy.orm import Session
+from fastapi_app.src.services.tag_cache import tag_cache
+from fastapi_app.src.services.derivatives import derivative_pipeline, choose_variant
+from fastapi_app.src.services.file_serving import file_response
+from fastapi_app.src.conf.config import settings
+import mimetypes
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
 router = APIRouter(prefix="/photos", tags=["photos"])
 
 
-UPLOAD_DIR = "uploads/"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-async def save_photo(file: UploadFile) -> str:
-    """
-    Save an uploaded photo to the file system.
-
-    :param file: The photo file to upload.
-    :type file: UploadFile
-    :return: The file path where the photo is saved.
-    :rtype: str
-    :raises IOError: If there is an error saving the file.
-    """
-    file_extension = os.path.splitext(file.filename)[1]
-    file_name = f"{uuid4()}{file_extension}"
-    file_path = os.path.join(UPLOAD_DIR, file_name)
-
-    async with aiofiles.open(file_path, 'wb') as out_file:
-        while content := await file.read(1024):
-            await out_file.write(content)
-    
-    return file_path
-
 @router.post("/photos/")
-async def create_photo(description: str, tags: Optional[str] = None, file: UploadFile = File(...), current_user: User = Depends(auth_service.get_current_user), db: Session = Depends(get_db)):
+async def create_photo(background_tasks: BackgroundTasks, description: str, tags: Optional[str] = None, file: UploadFile = File(...), current_user: User = Depends(auth_service.get_current_user), db: AsyncSession = Depends(get_async_db)):
     """
-    Create a new photo.
+    Create a new photo. Smaller copies of the photo are created in the background after the response is sent.
+
+    A file which is already stored for another photo is not stored again and its smaller copies are reused.
 
+    :param background_tasks: The tasks run after the response is sent.
+    :type background_tasks: BackgroundTasks
     :param description: Description of the photo.
     :type description: str
     :param tags: Space-separated tags for the photo.
@@ -50,73 +37,138 @@ async def create_photo(description: str, tags: Optional[str] = None, file: Uploa
     :param current_user: The current authenticated user.
     :type current_user: User
     :param db: Database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The saved photo object.
     :rtype: Photo
-    :raises HTTPException: If there is an error saving the photo, raises an appropriate HTTP error.
+    :raises HTTPException: If there is an error saving the photo, raises an appropriate HTTP error, 413 if the file is too large.
     """
-    file_path = await save_photo(file)
-    tag_list = [tag for tag in tags.split(' ')]
-    tags = await create_tags(tag_list, db)
-    photo = Photo(description=description, url=file_path, tags=tags, user_id=current_user.id)
-    saved_photo = PhotoService.save(db, photo)
+    upload = await save_upload(file)
+    staging_key = None
+    try:
+        # The bytes go to a remote storage before the transaction starts, so a slow upload holds
+        # no connection or lock. When the user was not cached, the authentication read it with
+        # this session, the rollback returns that connection to the pool for the upload.
+        await db.rollback()
+        staging_key = await stage_content(upload)
+        tags = await create_tags(tags.split(' ') if tags else [], db)
+        await PhotoService.lock_content(db, upload.sha256)
+        file_path = await store_content(upload, staging_key=staging_key)
+        staging_key = None
+        variants = await PhotoService.get_content_variants(db, upload.sha256)
+        photo = Photo(description=description, url=file_path, content_hash=upload.sha256, content_type=upload.content_type, variants=variants, tags=tags, user_id=current_user.id)
+        saved_photo = await PhotoService.save(db, photo)
+    finally:
+        # store_content moves the uploaded file to the storage, it is left only when a step failed.
+        await discard_upload(upload, staging_key)
+    tag_cache.add(tags)
+    if not variants:
+        background_tasks.add_task(derivative_pipeline.generate, saved_photo.id, file_path)
     return saved_photo
 
 @router.put("/photos/{photo_id}")
-async def update_photo(photo_id: int, description: str, db: Session = Depends(get_db)):
+async def update_photo(photo_id: int, description: str, current_user: User = Depends(auth_service.get_current_user), db: AsyncSession = Depends(get_async_db)):
     """
-    Update the description of a photo by its ID.
+    Update the description of a photo by its ID. Only the owner of the photo or an admin can update it.
 
     :param photo_id: The ID of the photo to update.
     :type photo_id: int
     :param description: The new description for the photo.
     :type description: str
+    :param current_user: The current authenticated user.
+    :type current_user: User
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The updated photo data.
     :rtype: dict
-    :raises HTTPException: If the photo is not found, raises a 404 error with the detail message.
+    :raises HTTPException: If the photo is not found or belongs to another user, raises a 404 error with the detail message.
     """
     try:
-        updated_photo = PhotoService.update(db, photo_id, description)
+        owner_id = None if current_user.role == "admin" else current_user.id
+        updated_photo = await PhotoService.update(db, photo_id, description, owner_id)
         return updated_photo
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 @router.delete("/photos/{photo_id}")
-async def delete_photo(photo_id: int, db: Session = Depends(get_db)):
+async def delete_photo(photo_id: int, current_user: User = Depends(auth_service.get_current_user), db: AsyncSession = Depends(get_async_db)):
     """
-    Delete a photo by its ID.
+    Delete a photo by its ID. Only the owner of the photo or an admin can delete it.
 
     :param photo_id: The ID of the photo to delete.
     :type photo_id: int
+    :param current_user: The current authenticated user.
+    :type current_user: User
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: A confirmation message indicating the photo was deleted.
     :rtype: dict
-    :raises HTTPException: If the photo is not found, raises a 404 error with the detail message.
+    :raises HTTPException: If the photo is not found or belongs to another user, raises a 404 error with the detail message.
     """
     try:
-        PhotoService.delete(db,photo_id)
+        owner_id = None if current_user.role == "admin" else current_user.id
+        await PhotoService.delete(db, photo_id, owner_id)
         return {"detail": "Photo deleted"}
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 @router.get("/photos/{photo_id}")
-async def read_photo(photo_id: int, db: Session = Depends(get_db)):
+async def read_photo(photo_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Retrieve a photo by its ID.
 
     :param photo_id: The ID of the photo to retrieve.
     :type photo_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The photo data.
     :rtype: dict
     :raises HTTPException: If the photo is not found, raises a 404 error with the detail message.
     """
     try:
-        photo = PhotoService.get(db, photo_id)
+        photo = await PhotoService.get(db, photo_id)
         return photo
     except FileNotFoundError as e:
-        raise HTTPException(status_code=404, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.get("/photos/{photo_id}/image")
+async def read_photo_image(request: Request, photo_id: int, width: Optional[int] = Query(default=None, ge=1), db: AsyncSession = Depends(get_async_db)):
+    """
+    Send the image of a photo, in the smallest stored size which is at least as wide as requested.
+
+    The response can be cached and revalidated (ETag, Last-Modified) and downloaded in parts (Range).
+    If the photos are not stored on the local disk, the client is redirected to a presigned URL of the storage.
+
+    :param request: The request.
+    :type request: Request
+    :param photo_id: The ID of the photo.
+    :type photo_id: int
+    :param width: The width the client displays the photo in, omit it to get the original.
+    :type width: Optional[int]
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The image, a part of it, 304 if the client has the current version, or a redirect to the storage.
+    :rtype: Response
+    :raises HTTPException: If the photo or its file is not found, raises a 404 error with the detail message.
+    """
+    result = await db.execute(select(Photo.url, Photo.variants, Photo.content_hash, Photo.content_type).filter(Photo.id == photo_id))
+    row = result.first()
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Photo with ID {photo_id} not found")
+    variant = choose_variant(row.variants, width)
+    key = variant["url"] if variant else row.url
+    if not key:
+        raise HTTPException(status_code=404, detail="Photo file not found")
+    path = storage_backend.local_path(key)
+    if path is None:
+        url = await storage_backend.presigned_url(key, settings.storage_url_expiry)
+        return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+    # Stored originals are named by their SHA-256 and have no extension, their media type is recorded on the photo.
+    media_type = row.content_type if key == row.url else None
+    media_type = media_type or mimetypes.guess_type(path)[0]
+    if media_type is None and variant and variant["format"]:
+        media_type = f"image/{variant['format']}"
+    etag = row.content_hash if key == row.url else None
+    try:
+        return await file_response(request, path, media_type or "application/octet-stream", settings.photo_cache_max_age, etag)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Photo file not found")
@@ -1,56 +1,132 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from fastapi_app.src.database import models as models
 from fastapi_app.src import schemas
-from fastapi_app.src.database.db import get_db
+from fastapi_app.src.database.db import get_async_db
 from fastapi_app.src.services.auth import auth_service
 from fastapi_app.src.repository import search_filter as crud
-from datetime import datetime
+from datetime import datetime, date
 
 router = APIRouter(prefix="/search_filter", tags=["search_filter"])
 
-@router.get("/photos/search/{description}", response_model=List[schemas.DescriptionSearch])
+@router.get("/photos/search", response_model=schemas.PhotoSearchPage)
+async def search_photos(
+    description: str | None = None,
+    tags: List[str] | None = Query(default=None),
+    tag_mode: str = Query(default="all", regex="^(all|any)$"),
+    rating_min: float | None = None,
+    rating_max: float | None = None,
+    created_from: date | None = None,
+    created_to: date | None = None,
+    user_id: int | None = None,
+    sort_by: str = "created_at",
+    cursor: str | None = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
+    ):
+    """
+    Retrieve photos matching any combination of filters with a single database query, returned in pages.
+
+    :param description: The words of the description of search photo.
+    :type description: str | None
+    :param tags: The tags of search photo, repeat the parameter to pass more tags.
+    :type tags: List[str] | None
+    :param tag_mode: 'all' if the photo has to have all the tags, 'any' if one of them is enough.
+    :type tag_mode: str
+    :param rating_min: The lowest rating of search photo.
+    :type rating_min: float | None
+    :param rating_max: The highest rating of search photo.
+    :type rating_max: float | None
+    :param created_from: The first day of the range of creation dates of search photo.
+    :type created_from: date | None
+    :param created_to: The last day of the range of creation dates of search photo.
+    :type created_to: date | None
+    :param user_id: The id of the owner of search photo.
+    :type user_id: int | None
+    :param sort_by: The order of photos: 'created_at', 'rating' or, with description, 'relevance'.
+    :type sort_by: str
+    :param cursor: The next_cursor returned with the previous page, omit it to get the first page.
+    :type cursor: str | None
+    :param limit: The maximum number of photos on the page.
+    :type limit: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The page of photos and the cursor of the next page.
+    :rtype: dict
+    :raises HTTPException: If the filters are contradictory, raises a 400 error with the detail message.
+    """
+    return await crud.search_photos(
+        db, cursor=cursor, limit=limit, description=description, tags=tags, match_all_tags=tag_mode == "all",
+        rating_min=rating_min, rating_max=rating_max, created_from=created_from, created_to=created_to,
+        user_id=user_id, sort_by=sort_by,
+    )
+
+
+@router.get("/photos/search/{description}", response_model=schemas.DescriptionSearchPage)
 async def get_photo_by_description(
     description: str,
     rating_filter: int | None = None,
     created_at: str | None = None,
-    db: Session = Depends(get_db)
+    created_from: date | None = None,
+    created_to: date | None = None,
+    sort_by: str = "relevance",
+    cursor: str | None = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
     ):
     """
-    Retrieve a photo by its description or description with rating or date of creation.
+    Retrieve photos by words of their description or description with rating or date of creation.
+    The photos are found with the full text search index and returned in pages.
 
-    :param description: The description of search photo.
+    :param description: The words of the description of search photo.
     :type description: str
     :param rating_filter: The rating of search photo.
     :type rating_filter: int
     :param created_at: The creation date of search photo.
     :type created_at: str
+    :param created_from: The first day of the range of creation dates of search photo.
+    :type created_from: date | None
+    :param created_to: The last day of the range of creation dates of search photo.
+    :type created_to: date | None
+    :param sort_by: The order of photos: 'relevance', 'created_at' or 'rating'.
+    :type sort_by: str
+    :param cursor: The next_cursor returned with the previous page, omit it to get the first page.
+    :type cursor: str | None
+    :param limit: The maximum number of photos on the page.
+    :type limit: int
     :param db: The database session.
-    :type db: Session
-    :return: The photo.
+    :type db: AsyncSession
+    :return: The page of photos and the cursor of the next page.
     :rtype: dict
-    :raises HTTPException: If the photo is not found, or the photo with selected rating or creation date is not found, raises a 404 error with the detail message.
+    :raises HTTPException: If no photo matches on the first page or the filters are contradictory, raises a 400 error with the detail message.
     """
 
-    query = await crud.get_description(db, description=description, rating_filter = rating_filter, created_at = created_at)
+    page = await crud.get_description(db, description=description, rating_filter = rating_filter, created_at = created_at,
+                                      created_from=created_from, created_to=created_to,
+                                      sort_by=sort_by, cursor=cursor, limit=limit)
     
-    if not query:
+    if not page["items"] and cursor is None:
          raise HTTPException(status_code=400, detail="Description does not exist")
-    return query
+    return page
 
 
-@router.get("/photos/search/tag/{tagname}", response_model=List[schemas.TagSearch])
+@router.get("/photos/search/tag/{tagname}", response_model=schemas.TagSearchPage)
 async def get_photo_by_tag(
     tagname: str,
     rating_filter: int | None = None,
     created_at: str | None = None,
-    db: Session = Depends(get_db)
+    created_from: date | None = None,
+    created_to: date | None = None,
+    sort_by: str = "created_at",
+    cursor: str | None = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db)
     ):
     """
-    Retrieve a photo by its tag or tag with rating or date of creation.
+    Retrieve photos by its tag or tag with rating or date of creation, returned in pages.
 
     :param tagname: The tagname of search photo.
     :type tagname: str
@@ -58,14 +134,26 @@ async def get_photo_by_tag(
     :type rating_filter: int
     :param created_at: The creation date of search photo.
     :type created_at: str
+    :param created_from: The first day of the range of creation dates of search photo.
+    :type created_from: date | None
+    :param created_to: The last day of the range of creation dates of search photo.
+    :type created_to: date | None
+    :param sort_by: The order of photos: 'created_at' or 'rating'.
+    :type sort_by: str
+    :param cursor: The next_cursor returned with the previous page, omit it to get the first page.
+    :type cursor: str | None
+    :param limit: The maximum number of photos on the page.
+    :type limit: int
     :param db: The database session.
-    :type db: Session
-    :return: The photo.
+    :type db: AsyncSession
+    :return: The page of photos and the cursor of the next page.
     :rtype: dict
-    :raises HTTPException: If the photo is not found, or the photo with selected rating or creation date is not found, raises a 404 error with the detail message.
+    :raises HTTPException: If no photo matches on the first page or the filters are contradictory, raises a 400 error with the detail message.
     """
-    query = await crud.get_tag(db, tagname=tagname, rating_filter = rating_filter, created_at = created_at)
+    page = await crud.get_tag(db, tagname=tagname, rating_filter = rating_filter, created_at = created_at,
+                              created_from=created_from, created_to=created_to,
+                              sort_by=sort_by, cursor=cursor, limit=limit)
     
-    if not query:
+    if not page["items"] and cursor is None:
          raise HTTPException(status_code=400, detail="Tag does not exist")
-    return query
+    return page
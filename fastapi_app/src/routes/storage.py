@@ -0,0 +1,82 @@
+import mimetypes
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+
+from fastapi_app.src.conf.config import settings
+from fastapi_app.src.services.file_serving import file_response
+from fastapi_app.src.services.storage_backends import PUBLIC_PREFIXES, storage_backend, validate_key, verify_signed_url
+
+router = APIRouter(prefix="/storage", tags=["storage"])
+
+
+def check_access(method: str, key: str, expires: Optional[int], signature: Optional[str]) -> None:
+    """
+    Checks the URL of a storage request: public objects can be read without a signature, other requests need a valid presigned URL.
+
+    :raises HTTPException: If the key is not valid, raises a 404 error, if the signature is missing, wrong or expired, raises a 403 error.
+    """
+    try:
+        validate_key(key)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    if method == "GET" and key.startswith(PUBLIC_PREFIXES) and signature is None:
+        return
+    if storage_backend.secret is None or expires is None or signature is None or not verify_signed_url(storage_backend.secret, method, key, expires, signature):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or expired signature")
+
+
+@router.get("/{key:path}")
+async def download_file(request: Request, key: str, expires: Optional[int] = Query(default=None), signature: Optional[str] = Query(default=None)):
+    """
+    Send a file of the local or in-memory storage, the target of presigned download URLs and public avatar URLs.
+
+    :param request: The request.
+    :type request: Request
+    :param key: The key of the file.
+    :type key: str
+    :param expires: The expiry time of the presigned URL.
+    :type expires: Optional[int]
+    :param signature: The signature of the presigned URL.
+    :type signature: Optional[str]
+    :return: The file.
+    :rtype: Response
+    :raises HTTPException: If the URL is not valid, raises a 403 error, if the file is not found, raises a 404 error.
+    """
+    check_access("GET", key, expires, signature)
+    media_type = mimetypes.guess_type(key)[0] or "application/octet-stream"
+    path = storage_backend.local_path(key)
+    if path is not None:
+        try:
+            return await file_response(request, path, media_type, settings.photo_cache_max_age)
+        except FileNotFoundError:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    info = await storage_backend.stat(key)
+    if info is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    return StreamingResponse(storage_backend.get(key), media_type=media_type, headers={"content-length": str(info.size), "etag": f'"{info.etag}"'})
+
+
+@router.put("/{key:path}", status_code=status.HTTP_201_CREATED)
+async def upload_file(request: Request, key: str, expires: int = Query(), signature: str = Query()):
+    """
+    Save the body of the request as a file of the local or in-memory storage, the target of presigned upload URLs.
+
+    The body is streamed to the storage, it is never held in memory as a whole.
+
+    :param request: The request.
+    :type request: Request
+    :param key: The key of the file.
+    :type key: str
+    :param expires: The expiry time of the presigned URL.
+    :type expires: int
+    :param signature: The signature of the presigned URL.
+    :type signature: str
+    :return: The key and the size of the saved file.
+    :rtype: dict
+    :raises HTTPException: If the URL is not valid, raises a 403 error.
+    """
+    check_access("PUT", key, expires, signature)
+    size = await storage_backend.put(key, request.stream(), request.headers.get("content-type"))
+    return {"key": key, "size": size}
@@ -0,0 +1,34 @@
+from typing import List
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fastapi_app.src.database.db import get_async_db
+from fastapi_app.src.services.tag_cache import tag_cache
+
+router = APIRouter(prefix="/tags", tags=["tags"])
+
+
+@router.get("/autocomplete", response_model=List[str])
+async def autocomplete_tags(
+    prefix: str = Query(default="", max_length=100),
+    limit: int = Query(default=10, ge=1, le=50),
+    db: AsyncSession = Depends(get_async_db)
+    ):
+    """
+    Suggest the names of tags starting with the prefix, in alphabetical order.
+
+    The names are found in the tag dictionary of the worker, the database is used only when the
+    dictionary has to be loaded.
+
+    :param prefix: The beginning of the tag name (case-insensitive).
+    :type prefix: str
+    :param limit: The maximum number of names.
+    :type limit: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The names of tags.
+    :rtype: List[str]
+    """
+    await tag_cache.ensure_loaded(db)
+    return tag_cache.autocomplete(prefix, limit)
@@ -1,21 +1,23 @@
-from fastapi import APIRouter, Depends, status, UploadFile, File, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-import cloudinary
-import cloudinary.uploader
+from datetime import date
 
-from fastapi_app.src.database.db import get_db
+from fastapi import APIRouter, Depends, status, UploadFile, File, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fastapi_app.src.database.db import get_async_db
 from fastapi_app.src.database.models import User
 from fastapi_app.src.repository import users as repository_users
 from fastapi_app.src.services.auth import auth_service
-from fastapi_app.src.conf.config import settings
-from fastapi_app.src.schemas import UserDb, ProfileStatusUpdate, ProfileResponse
+from fastapi_app.src.services.storage import save_avatar
+from fastapi_app.src.services.user_export import export_users, EXPORT_MEDIA_TYPES
+from fastapi_app.src.schemas import UserDb, UserPage, ProfileStatusUpdate, ProfileResponse
 
 router = APIRouter(prefix="/users", tags=["users"])
 
 
 @router.get("/me/", response_model=UserDb)
-async def read_users_me(current_user: User = Depends(auth_service.get_current_user), db: Session = Depends(get_db)):
+async def read_users_me(current_user: User = Depends(auth_service.get_current_user), db: AsyncSession = Depends(get_async_db)):
     """
     Retrieves the current authenticated user's information.
 
@@ -32,64 +34,113 @@ async def read_users_me(current_user: User = Depends(auth_service.get_current_us
 async def update_avatar_user(
     file: UploadFile = File(),
     current_user: User = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Updates the avatar of the current authenticated user.
 
+    The image is cropped to a square in a worker process and saved to the storage.
+
     :param file: The uploaded file containing the new avatar.
     :type file: UploadFile
     :param current_user: The current user object.
     :type current_user: User
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The updated user object.
     :rtype: UserDb
-    :raises HTTPException: If an error occurs while updating the avatar.
+    :raises HTTPException: If an error occurs while updating the avatar, 400 if the file is not an image, 413 if it is too large.
     """
-    cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True,
-    )
-
-    cloudinary.uploader.upload(
-        file.file, public_id=f"NotesApp/{current_user.username}", overwrite=True
-    )
-    src_url = cloudinary.CloudinaryImage(f"NotesApp/{current_user.username}").build_url(
-        width=250, height=250, crop="fill"
-    )
+    src_url = await save_avatar(file, current_user.id)
     user = await repository_users.update_avatar(current_user.email, src_url, db)
     return user
 
 # New routes for admins and moderators
-@router.get("/all", response_model=List[UserDb])
+@router.get("/all", response_model=UserPage)
 async def read_all_users(
+    role: str | None = None,
+    confirmed: bool | None = None,
+    created_from: date | None = None,
+    created_to: date | None = None,
+    cursor: str | None = None,
+    limit: int = Query(default=50, ge=1, le=500),
     current_user: User = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Retrieves all users' information (admin access required).
+    Retrieves the users matching the filters in pages, the newest first (admin access required).
 
+    :param role: The role of the users.
+    :type role: str | None
+    :param confirmed: True for the users who confirmed their email, False for the others.
+    :type confirmed: bool | None
+    :param created_from: The first day of the range of creation dates.
+    :type created_from: date | None
+    :param created_to: The last day of the range of creation dates.
+    :type created_to: date | None
+    :param cursor: The next_cursor returned with the previous page, omit it to get the first page.
+    :type cursor: str | None
+    :param limit: The maximum number of users on the page.
+    :type limit: int
     :param current_user: The current user object.
     :type current_user: User
     :param db: The database session.
-    :type db: Session
-    :return: A list of all users.
-    :rtype: List[UserDb]
-    :raises HTTPException: If the current user does not have admin privileges.
+    :type db: AsyncSession
+    :return: The page of users and the cursor of the next page.
+    :rtype: UserPage
+    :raises HTTPException: If the current user does not have admin privileges or the filters are contradictory.
     """
     await auth_service.check_role(current_user, "admin")
-    users = db.query(User).all()
-    return users
+    return await repository_users.get_users_page(
+        db, cursor, limit, role=role, confirmed=confirmed, created_from=created_from, created_to=created_to,
+    )
+
+
+@router.get("/all/export")
+async def export_all_users(
+    export_format: str = Query(default="ndjson", alias="format", regex="^(ndjson|csv)$"),
+    role: str | None = None,
+    confirmed: bool | None = None,
+    created_from: date | None = None,
+    created_to: date | None = None,
+    current_user: User = Depends(auth_service.get_current_user),
+):
+    """
+    Streams all users matching the filters as newline-delimited JSON or CSV (admin access required).
+
+    The users are read from the database in batches while the response is sent, so any number
+    of users can be exported.
+
+    :param export_format: "ndjson" or "csv".
+    :type export_format: str
+    :param role: The role of the users.
+    :type role: str | None
+    :param confirmed: True for the users who confirmed their email, False for the others.
+    :type confirmed: bool | None
+    :param created_from: The first day of the range of creation dates.
+    :type created_from: date | None
+    :param created_to: The last day of the range of creation dates.
+    :type created_to: date | None
+    :param current_user: The current user object.
+    :type current_user: User
+    :return: The stream of users, in ID order.
+    :rtype: StreamingResponse
+    :raises HTTPException: If the current user does not have admin privileges or the filters are contradictory.
+    """
+    await auth_service.check_role(current_user, "admin")
+    users = export_users(export_format, role=role, confirmed=confirmed, created_from=created_from, created_to=created_to)
+    return StreamingResponse(
+        users,
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"content-disposition": f'attachment; filename="users.{export_format}"'},
+    )
 
 
 @router.delete("/{user_id}", response_model=dict)
 async def delete_user(
     user_id: int,
     current_user: User = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Deletes a user by their ID (admin access required).
@@ -99,17 +150,19 @@ async def delete_user(
     :param current_user: The current user object.
     :type current_user: User
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: A message indicating the result of the deletion.
     :rtype: dict
     :raises HTTPException: If the user is not found or if the current user does not have admin privileges.
     """
     await auth_service.check_role(current_user, "admin")
-    user = db.query(User).filter(User.id == user_id).first()
+    result = await db.execute(select(User).filter(User.id == user_id))
+    user = result.scalars().first()
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
-    db.delete(user)
-    db.commit()
+    await db.delete(user)
+    await db.commit()
+    await auth_service.user_cache.invalidate(user.email)
     return {"detail": "User deleted"}
 
 
@@ -119,7 +172,7 @@ async def update_user_role(
     user_id: int,
     role: str,
     current_user: User = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Updates the role of a user (admin access required).
@@ -131,24 +184,26 @@ async def update_user_role(
     :param current_user: The current user object.
     :type current_user: User
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The updated user object.
     :rtype: UserDb
     :raises HTTPException: If the user is not found or if the current user does not have admin privileges.
     """
     await auth_service.check_role(current_user, "admin")
-    user = db.query(User).filter(User.id == user_id).first()
+    result = await db.execute(select(User).filter(User.id == user_id))
+    user = result.scalars().first()
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     if role not in ["user", "moderator"]:
         raise HTTPException(status_code=400, detail="Invalid role")
     user.role = role
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    await auth_service.user_cache.invalidate(user.email)
     return user
 
 @router.get("/{username}", response_model=ProfileResponse)
-async def read_user(username: str,db: Session = Depends(get_db)):
+async def read_user(username: str,db: AsyncSession = Depends(get_async_db)):
     """
     Retrieves the current authenticated user's information.
 
@@ -163,7 +218,7 @@ async def read_user(username: str,db: Session = Depends(get_db)):
     return profile
 
 @router.patch("/{username}", response_model=UserDb)
-async def update_user_profile(body: ProfileStatusUpdate, username: str, db: Session = Depends(get_db),
+async def update_user_profile(body: ProfileStatusUpdate, username: str, db: AsyncSession = Depends(get_async_db),
                              current_user: User = Depends(auth_service.get_current_user)):
     """
     Update a user's profile.
@@ -175,7 +230,7 @@ async def update_user_profile(body: ProfileStatusUpdate, username: str, db: Sess
     :param username: The username of the user whose profile is being updated.
     :type username: str
     :param db: The database session dependency.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The current authenticated user.
     :type current_user: User
     :return: The updated user profile.
@@ -188,7 +243,7 @@ async def update_user_profile(body: ProfileStatusUpdate, username: str, db: Sess
     return user
 
 @router.delete("/{username}/ban", response_model=UserDb)
-async def ban_user(username: str, db: Session = Depends(get_db),
+async def ban_user(username: str, db: AsyncSession = Depends(get_async_db),
                              current_user: User = Depends(auth_service.get_current_user)):
     """
     Ban a user.
@@ -198,7 +253,7 @@ async def ban_user(username: str, db: Session = Depends(get_db),
     :param username: The username of the user to be banned.
     :type username: str
     :param db: The database session dependency.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The current authenticated user.
     :type current_user: User
     :return: The banned user profile.
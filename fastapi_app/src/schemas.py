@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import List, Optional
 from pydantic import BaseModel, Field, EmailStr
 
@@ -47,6 +47,19 @@ class UserDb(BaseModel):
         orm_mode = True
 
 
+class UserPage(BaseModel):
+    """
+    UserPage Model
+
+    :param items: users of the page, the newest first
+    :type items: List[UserDb]
+    :param next_cursor: cursor to pass to get the next page, None on the last page
+    :type next_cursor: str, optional
+    """
+    items: List[UserDb]
+    next_cursor: Optional[str] = None
+
+
 class UserResponse(BaseModel):
     """
     User Response Model
@@ -134,6 +147,70 @@ class Comment(CommentBase):
         orm_mode = True
 
 
+class CommentAuthor(BaseModel):
+    """
+    CommentAuthor Model
+
+    :param id: user id
+    :type id: int
+    :param username: username
+    :type username: str
+    :param avatar: link to user avatar
+    :type avatar: str, optional
+    """
+    id: int
+    username: Optional[str] = None
+    avatar: Optional[str] = None
+
+    class Config:
+        orm_mode = True
+
+
+class CommentWithAuthor(Comment):
+    """
+    CommentWithAuthor Model
+
+    :param user: the author of the comment
+    :type user: CommentAuthor, optional
+    """
+    user: Optional[CommentAuthor] = None
+
+
+class CommentPage(BaseModel):
+    """
+    CommentPage Model
+
+    :param items: comments of the page, the newest first
+    :type items: List[CommentWithAuthor]
+    :param next_cursor: cursor to pass to get the next page, None on the last page
+    :type next_cursor: str, optional
+    """
+    items: List[CommentWithAuthor]
+    next_cursor: Optional[str] = None
+
+
+class CommentModeration(BaseModel):
+    """
+    CommentModeration Model - the comments to delete, a comment is deleted if it matches all the given criteria
+
+    :param comment_ids: ids of the comments
+    :type comment_ids: List[int], optional
+    :param user_id: id of the author of the comments
+    :type user_id: int, optional
+    :param photo_id: id of the photo of the comments
+    :type photo_id: int, optional
+    :param created_from: the first day of the range of creation dates
+    :type created_from: date, optional
+    :param created_to: the last day of the range of creation dates
+    :type created_to: date, optional
+    """
+    comment_ids: Optional[List[int]] = Field(default=None, max_items=100000)
+    user_id: Optional[int] = None
+    photo_id: Optional[int] = None
+    created_from: Optional[date] = None
+    created_to: Optional[date] = None
+
+
 class PhotoBase(BaseModel):
     """
     Photo Base Model
@@ -295,3 +372,171 @@ class ProfileStatusUpdate(BaseModel):
     password: str
     avatar: str
 
+
+
+class VoteCreate(BaseModel):
+    """
+    Vote Create Model
+
+    :param vote: number of stars given to the photo, from 1 to 5
+    :type vote: int
+    """
+    vote: int = Field(ge=1, le=5)
+
+
+class VoteAccepted(BaseModel):
+    """
+    Vote Accepted Model
+
+    :param photo_id: photo's id number
+    :type photo_id: int
+    :param vote: number of stars given to the photo
+    :type vote: int
+    """
+    photo_id: int
+    vote: int
+
+
+class PhotoRating(BaseModel):
+    """
+    Photo Rating Model
+
+    :param photo_id: photo's id number
+    :type photo_id: int
+    :param rating: the average vote
+    :type rating: float
+    :param rating_sum: sum of all votes
+    :type rating_sum: int
+    :param rating_count: number of votes
+    :type rating_count: int
+    """
+    photo_id: int
+    rating: float
+    rating_sum: int
+    rating_count: int
+
+
+class PoolStatus(BaseModel):
+    """
+    Pool Status Model
+
+    :param pool_size: number of connections kept open in the pool
+    :type pool_size: int
+    :param checked_out: number of connections currently used by requests
+    :type checked_out: int
+    :param idle: number of open connections waiting in the pool
+    :type idle: int
+    :param overflow: number of connections opened above pool_size
+    :type overflow: int
+    :param max_overflow: the limit of overflow connections
+    :type max_overflow: int
+    :param checkouts: number of connections handed out since the worker started
+    :type checkouts: int
+    :param timeouts: number of requests which did not get a connection in time
+    :type timeouts: int
+    :param avg_wait_ms: average time of waiting for a connection in milliseconds
+    :type avg_wait_ms: float
+    :param max_wait_ms: the longest time of waiting for a connection in milliseconds
+    :type max_wait_ms: float
+    :param last_wait_ms: waiting time of the latest checkout in milliseconds
+    :type last_wait_ms: float
+    """
+    pool_size: int
+    checked_out: int
+    idle: int
+    overflow: int
+    max_overflow: int
+    checkouts: int
+    timeouts: int
+    avg_wait_ms: float
+    max_wait_ms: float
+    last_wait_ms: float
+
+
+class UserCacheStats(BaseModel):
+    """
+    User Cache Stats Model
+
+    :param local_hits: number of users found in the cache of the worker
+    :type local_hits: int
+    :param local_misses: number of users not found in the cache of the worker
+    :type local_misses: int
+    :param local_evictions: number of users removed from the full cache of the worker
+    :type local_evictions: int
+    :param local_size: number of users in the cache of the worker
+    :type local_size: int
+    :param local_max_size: the limit of users in the cache of the worker
+    :type local_max_size: int
+    :param remote_hits: number of users found in Redis
+    :type remote_hits: int
+    :param remote_misses: number of users loaded from the database
+    :type remote_misses: int
+    :param invalidations_received: number of invalidation messages received from Redis
+    :type invalidations_received: int
+    """
+    local_hits: int
+    local_misses: int
+    local_evictions: int
+    local_size: int
+    local_max_size: int
+    remote_hits: int
+    remote_misses: int
+    invalidations_received: int
+
+
+class TagCacheStats(BaseModel):
+    """
+    Tag Cache Stats Model
+
+    :param hits: number of tag names found in the tag dictionary of the worker
+    :type hits: int
+    :param misses: number of tag names looked up in the database
+    :type misses: int
+    :param reloads: number of times the dictionary was loaded from the database
+    :type reloads: int
+    :param size: number of tags in the dictionary
+    :type size: int
+    """
+    hits: int
+    misses: int
+    reloads: int
+    size: int
+
+
+class DescriptionSearchPage(BaseModel):
+    """
+    DescriptionSearchPage Model
+
+    :param items: photos of the page
+    :type items: List[DescriptionSearch]
+    :param next_cursor: cursor to pass to get the next page, None on the last page
+    :type next_cursor: str, optional
+    """
+    items: List[DescriptionSearch]
+    next_cursor: Optional[str] = None
+
+
+class TagSearchPage(BaseModel):
+    """
+    TagSearchPage Model
+
+    :param items: photos of the page
+    :type items: List[TagSearch]
+    :param next_cursor: cursor to pass to get the next page, None on the last page
+    :type next_cursor: str, optional
+    """
+    items: List[TagSearch]
+    next_cursor: Optional[str] = None
+
+
+class PhotoSearchPage(BaseModel):
+    """
+    PhotoSearchPage Model
+
+    :param items: photos of the page
+    :type items: List[TagSearch]
+    :param next_cursor: cursor to pass to get the next page, None on the last page
+    :type next_cursor: str, optional
+    """
+    items: List[TagSearch]
+    next_cursor: Optional[str] = None
@@ -1,21 +1,31 @@
-import pickle
 from typing import Optional
 from datetime import datetime, timedelta
 
-from redis import Redis
+from redis.asyncio import Redis
 from jose import JWTError, jwt
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from fastapi_app.src.database.db import get_db
+from fastapi_app.src.database.db import get_async_db
 from fastapi_app.src.repository import users as repository_users
 from fastapi_app.src.conf.config import settings
 from fastapi_app.src.database.models import User
+from fastapi_app.src.services.hashing_pool import HashingPool
+from fastapi_app.src.services.token_cache import TokenCache
+from fastapi_app.src.services.user_cache import LocalUserCache, RedisUserCache, TieredUserCache, UserPrincipal
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    pwd_context = CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=settings.bcrypt_rounds,
+        bcrypt__min_rounds=settings.bcrypt_rounds,
+        bcrypt__max_rounds=settings.bcrypt_rounds,
+    )
+    hashing_pool = HashingPool(settings.password_hash_workers, settings.password_hash_queue_size)
+    token_cache = TokenCache(settings.token_cache_size)
     SECRET_KEY = settings.secret_key
     ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
@@ -25,7 +35,12 @@ class Auth:
         password=settings.redis_password,
         db=0,
     )
-    
+    user_cache = TieredUserCache(
+        LocalUserCache(settings.user_cache_local_size, settings.user_cache_local_ttl),
+        RedisUserCache(r, ttl=settings.user_cache_ttl, invalidation_ttl=settings.user_cache_invalidation_ttl),
+        r,
+    )
+
     def __init__(self):
         self.role_hierarchy = {
             "user": 1,
@@ -34,29 +49,50 @@ class Auth:
         }
         
         
-    def verify_password(self, plain_password, hashed_password) -> bool:
+    async def verify_password(self, plain_password, hashed_password) -> bool:
         """
         Compares a plain password with a hashed password to check if they match.
 
+        The comparison runs in the hashing pool, so it does not block the event loop.
+
         :param plain_password: The plain text password.
         :type plain_password: str
         :param hashed_password: The hashed password.
         :type hashed_password: str
         :return: True if the passwords match, False otherwise.
         :rtype: bool
+        :raises HTTPException: If the hashing pool is saturated.
         """
-        return self.pwd_context.verify(plain_password, hashed_password)
+        return await self.hashing_pool.run(self.pwd_context.verify, plain_password, hashed_password)
 
-    def get_password_hash(self, password: str) -> str:
+    async def verify_and_update_password(self, plain_password, hashed_password) -> tuple[bool, Optional[str]]:
+        """
+        Compares a plain password with a hashed password and rehashes it if the stored hash
+        was created with a bcrypt cost other than the configured one.
+
+        :param plain_password: The plain text password.
+        :type plain_password: str
+        :param hashed_password: The hashed password.
+        :type hashed_password: str
+        :return: True if the passwords match and the new hash which should replace the stored one, or None if it is up to date.
+        :rtype: tuple[bool, Optional[str]]
+        :raises HTTPException: If the hashing pool is saturated.
+        """
+        return await self.hashing_pool.run(self.pwd_context.verify_and_update, plain_password, hashed_password)
+
+    async def get_password_hash(self, password: str) -> str:
         """
         Generates a hash for a plain password using the bcrypt algorithm.
 
+        The hash is computed in the hashing pool, so it does not block the event loop.
+
         :param password: The plain text password.
         :type password: str
         :return: The hashed password.
         :rtype: str
+        :raises HTTPException: If the hashing pool is saturated.
         """
-        return self.pwd_context.hash(password)
+        return await self.hashing_pool.run(self.pwd_context.hash, password)
 
     async def create_access_token(
         self, data: dict, expires_delta: Optional[float] = None
@@ -110,6 +146,25 @@ class Auth:
         )
         return encoded_refresh_token
 
+    def decode_token(self, token: str) -> dict:
+        """
+        Verifies the signature and expiration of a JWT token and returns its claims.
+
+        Tokens which were already verified are served from the token cache until they expire,
+        so a client sending the same token on every request pays for the signature check once.
+
+        :param token: The token to decode.
+        :type token: str
+        :return: The claims of the token.
+        :rtype: dict
+        :raises JWTError: If the token is invalid or expired.
+        """
+        payload = self.token_cache.get(token)
+        if payload is None:
+            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            self.token_cache.set(token, payload)
+        return payload
+
     async def decode_refresh_token(self, refresh_token: str) -> str:
         """
         Decodes the provided JWT refresh token.
@@ -121,9 +176,7 @@ class Auth:
         :raises HTTPException: If the token is invalid or the scope is incorrect.
         """
         try:
-            payload = jwt.decode(
-                refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM]
-            )
+            payload = self.decode_token(refresh_token)
             if payload["scope"] == "refresh_token":
                 email = payload["sub"]
                 return email
@@ -138,7 +191,7 @@ class Auth:
             )
 
     async def get_current_user(
-        self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+        self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)
     ):
         """
         Returns the current user associated with the provided JWT token.
@@ -146,9 +199,9 @@ class Auth:
         :param token: The JWT token for which to retrieve the user.
         :type token: str
         :param db: The database session to use.
-        :type db: sqlalchemy.orm.Session
-        :return: The user associated with the provided token.
-        :rtype: dict
+        :type db: sqlalchemy.ext.asyncio.AsyncSession
+        :return: The principal of the user associated with the provided token.
+        :rtype: UserPrincipal
         :raises HTTPException: If the token is invalid, the scope is incorrect, or the user cannot be found.
         """
         credentials_exception = HTTPException(
@@ -159,7 +212,7 @@ class Auth:
 
         try:
             # Decode JWT
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.decode_token(token)
             if payload["scope"] == "access_token":
                 email = payload["sub"]
                 if email is None:
@@ -169,15 +222,13 @@ class Auth:
         except JWTError as e:
             raise credentials_exception
 
-        user = self.r.get(f"user:{email}")
+        user = await self.user_cache.get(email)
         if user is None:
-            user = await repository_users.get_user_by_email(email, db)
-            if user is None:
+            db_user = await repository_users.get_user_by_email(email, db)
+            if db_user is None:
                 raise credentials_exception
-            self.r.set(f"user:{email}", pickle.dumps(user))
-            self.r.expire(f"user:{email}", 900)
-        else:
-            user = pickle.loads(user)
+            user = UserPrincipal.from_user(db_user)
+            await self.user_cache.set(user)
         return user
 
     def create_email_token(self, data: dict) -> str:
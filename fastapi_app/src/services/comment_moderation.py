@@ -0,0 +1,70 @@
+import json
+from typing import AsyncIterator
+
+from fastapi import HTTPException
+
+from fastapi_app.src.conf.config import settings
+from fastapi_app.src.database.db import AsyncSessionLocal
+from fastapi_app.src.repository.comments import delete_comments_chunk
+from fastapi_app.src.schemas import CommentModeration
+
+
+def check_criteria(criteria: CommentModeration) -> None:
+    """
+    Checks that the moderation criteria select some comments and not all of them.
+
+    :param criteria: The moderation criteria.
+    :type criteria: CommentModeration
+    :raises HTTPException: If no criterion is given or the date range is reversed, raises a 400 error.
+    """
+    if criteria.comment_ids is None and all(value is None for value in (criteria.user_id, criteria.photo_id, criteria.created_from, criteria.created_to)):
+        raise HTTPException(status_code=400, detail="Give comment_ids or at least one of user_id, photo_id, created_from, created_to")
+    if criteria.created_from and criteria.created_to and criteria.created_from > criteria.created_to:
+        raise HTTPException(status_code=400, detail="created_from has to be before created_to")
+
+
+async def delete_comments(criteria: CommentModeration, session_factory=AsyncSessionLocal, chunk_size: int = None) -> AsyncIterator[dict]:
+    """
+    Deletes the comments matching the criteria in chunks, each chunk in its own short transaction.
+
+    Locks are held only for one chunk, so writers of other comments wait at most for one chunk
+    and the comments deleted before an error stay deleted.
+
+    :param criteria: The moderation criteria, checked by check_criteria.
+    :type criteria: CommentModeration
+    :param session_factory: Creates database sessions.
+    :type session_factory: async_sessionmaker
+    :param chunk_size: The maximum number of comments deleted in one transaction, settings.comment_moderation_chunk_size by default.
+    :type chunk_size: int
+    :return: The progress after each chunk: the number of deleted comments so far and, for a list of IDs, the number of checked IDs. The last item has "done": True.
+    :rtype: AsyncIterator[dict]
+    """
+    chunk_size = chunk_size or settings.comment_moderation_chunk_size
+    deleted = 0
+    if criteria.comment_ids is not None:
+        comment_ids = sorted(set(criteria.comment_ids))
+        for start in range(0, len(comment_ids), chunk_size):
+            chunk = comment_ids[start:start + chunk_size]
+            async with session_factory() as db:
+                count, _ = await delete_comments_chunk(db, criteria, 0, len(chunk), chunk)
+            deleted += count
+            yield {"deleted": deleted, "checked": start + len(chunk), "requested": len(comment_ids)}
+    else:
+        after_id = 0
+        while True:
+            async with session_factory() as db:
+                count, last_id = await delete_comments_chunk(db, criteria, after_id, chunk_size)
+            if not count:
+                break
+            deleted += count
+            after_id = last_id
+            yield {"deleted": deleted}
+    yield {"deleted": deleted, "done": True}
+
+
+async def ndjson(items: AsyncIterator[dict]) -> AsyncIterator[str]:
+    """
+    Encodes the items as newline-delimited JSON, one line per item.
+    """
+    async for item in items:
+        yield json.dumps(item) + "\n"
@@ -0,0 +1,90 @@
+"""
+Removes stored photo files which no photo uses any more, e.g. when the storage could not be reached
+while the last photo of a file was deleted, and staged uploads left by failed requests.
+
+Run from the project root: python -m fastapi_app.src.services.content_sweep [batch size]
+"""
+import asyncio
+import sys
+import time
+
+from sqlalchemy import select
+
+from fastapi_app.src.database.db import AsyncSessionLocal
+from fastapi_app.src.database.models import Photo
+from fastapi_app.src.services.photo_service import PhotoService
+from fastapi_app.src.services.storage import STAGING_DIR, UPLOAD_DIR, content_hash_of
+from fastapi_app.src.services.storage_backends import StorageBackend, storage_backend
+
+
+async def sweep_orphaned_content(session_factory=AsyncSessionLocal, backend: StorageBackend = storage_backend,
+                                 directory: str = UPLOAD_DIR, batch_size: int = 1000) -> int:
+    """
+    Removes the stored files (and their smaller copies) whose content hash is not used by any photo.
+
+    The hashes are checked against the photos in batches, the files of each unused hash are
+    removed by PhotoService.collect_content, which checks the hash again under the content lock,
+    so a file uploaded in the meantime is kept.
+
+    :param session_factory: Creates database sessions.
+    :type session_factory: async_sessionmaker
+    :param backend: The storage.
+    :type backend: StorageBackend
+    :param directory: The directory of the files in the storage.
+    :type directory: str
+    :param batch_size: The number of hashes checked in one query.
+    :type batch_size: int
+    :return: The number of removed files.
+    :rtype: int
+    """
+    hashes = sorted({content_hash for key in await backend.list_keys(directory) if (content_hash := content_hash_of(key, directory))})
+    removed = 0
+    for start in range(0, len(hashes), batch_size):
+        batch = hashes[start:start + batch_size]
+        async with session_factory() as db:
+            used = set((await db.scalars(select(Photo.content_hash).filter(Photo.content_hash.in_(batch)).distinct())).all())
+        for content_hash in batch:
+            if content_hash in used:
+                continue
+            async with session_factory() as db:
+                removed += await PhotoService.collect_content(db, content_hash, backend)
+    return removed
+
+
+async def sweep_staged_uploads(backend: StorageBackend = storage_backend, max_age: int = 86400) -> int:
+    """
+    Removes the uploads staged by stage_content which were not moved to their content key.
+
+    Uploads of requests still in progress are younger than max_age, so they are kept.
+
+    :param backend: The storage.
+    :type backend: StorageBackend
+    :param max_age: The age in seconds after which a staged upload is removed.
+    :type max_age: int
+    :return: The number of removed uploads.
+    :rtype: int
+    """
+    stale = []
+    for key in await backend.list_keys(STAGING_DIR):
+        info = await backend.stat(key)
+        if info is not None and info.last_modified < time.time() - max_age:
+            stale.append(key)
+    if stale:
+        await backend.delete(stale)
+    return len(stale)
+
+
+async def sweep(batch_size: int = 1000) -> int:
+    """
+    Runs both sweeps.
+
+    :param batch_size: The number of hashes checked in one query.
+    :type batch_size: int
+    :return: The number of removed files and uploads.
+    :rtype: int
+    """
+    return await sweep_orphaned_content(batch_size=batch_size) + await sweep_staged_uploads()
+
+
+if __name__ == "__main__":
+    print(f"{asyncio.run(sweep(int(sys.argv[1]) if len(sys.argv) > 1 else 1000))} files removed")
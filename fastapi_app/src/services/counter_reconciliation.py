@@ -0,0 +1,39 @@
+"""
+Repairs the counters users.photo_count and photos.comment_count if they drifted from the rows they count,
+e.g. after photos or comments were changed directly in the database.
+
+Run from the project root: python -m fastapi_app.src.services.counter_reconciliation [batch size]
+"""
+import asyncio
+import sys
+
+from fastapi_app.src.database.db import AsyncSessionLocal
+from fastapi_app.src.repository.counters import COUNTERS, reconcile_batch
+
+
+async def reconcile_counters(session_factory=AsyncSessionLocal, batch_size: int = 1000, counters=tuple(COUNTERS)) -> dict[str, int]:
+    """
+    Recounts the counters in batches of rows, each batch in its own short transaction.
+
+    :param session_factory: Creates database sessions.
+    :type session_factory: async_sessionmaker
+    :param batch_size: The number of rows recounted in one transaction.
+    :type batch_size: int
+    :param counters: The counters to repair, keys of COUNTERS.
+    :type counters: Iterable[str]
+    :return: The number of fixed rows of each counter.
+    :rtype: dict[str, int]
+    """
+    fixed = {}
+    for counter in counters:
+        after_id, fixed[counter] = 0, 0
+        while after_id is not None:
+            async with session_factory() as db:
+                after_id, count = await reconcile_batch(db, counter, after_id, batch_size)
+            fixed[counter] += count
+    return fixed
+
+
+if __name__ == "__main__":
+    for counter, count in asyncio.run(reconcile_counters(batch_size=int(sys.argv[1]) if len(sys.argv) > 1 else 1000)).items():
+        print(f"{counter}: {count} rows fixed")
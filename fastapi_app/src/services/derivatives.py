@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from PIL import Image, ImageOps
+from sqlalchemy import update
+
+from fastapi_app.src.conf.config import settings
+from fastapi_app.src.database.db import AsyncSessionLocal
+from fastapi_app.src.database.models import Photo
+from fastapi_app.src.services.storage_backends import StorageBackend, storage_backend
+
+VARIANT_FORMAT = "webp"
+
+logger = logging.getLogger(__name__)
+
+
+def render_variants(source_path: str, widths: dict[str, int], quality: int) -> list[dict]:
+    """
+    Creates smaller WebP copies of a photo next to the original file.
+
+    Sizes which are not smaller than the original are skipped. The original is listed as the
+    last variant, so every photo has at least one variant.
+
+    :param source_path: The path of the original photo.
+    :type source_path: str
+    :param widths: The maximum width of each variant, keyed by the name of the variant.
+    :type widths: dict[str, int]
+    :param quality: The WebP quality, from 1 to 100.
+    :type quality: int
+    :return: The name, path, width, height and format of each variant, the smallest first.
+    :rtype: list[dict]
+    """
+    base_path = os.path.splitext(source_path)[0]
+    variants = []
+    with Image.open(source_path) as original:
+        original_format = (original.format or "").lower()
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+        for name, width in sorted(widths.items(), key=lambda item: item[1]):
+            if width >= image.width:
+                continue
+            variant = image.copy()
+            variant.thumbnail((width, image.height), Image.LANCZOS)
+            path = f"{base_path}_{name}.{VARIANT_FORMAT}"
+            variant.save(path, VARIANT_FORMAT, quality=quality, method=4)
+            variants.append({"name": name, "url": path, "width": variant.width, "height": variant.height, "format": VARIANT_FORMAT})
+        variants.append({"name": "original", "url": source_path, "width": image.width, "height": image.height, "format": original_format})
+    return variants
+
+
+def render_avatar(source_path: str, size: int) -> str:
+    """
+    Crops the middle square of an image and scales it to size x size pixels, like a "fill" crop.
+
+    :param source_path: The path of the image.
+    :type source_path: str
+    :param size: The width and height of the avatar.
+    :type size: int
+    :return: The path of the WebP avatar, next to the image.
+    :rtype: str
+    """
+    path = f"{os.path.splitext(source_path)[0]}_avatar.{VARIANT_FORMAT}"
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+        ImageOps.fit(image, (size, size), Image.LANCZOS).save(path, VARIANT_FORMAT, quality=90, method=4)
+    return path
+
+
+def choose_variant(variants: list[dict], width: Optional[int]) -> Optional[dict]:
+    """
+    Picks the smallest variant which is at least as wide as requested, or the largest one.
+
+    :param variants: The variants recorded on the photo.
+    :type variants: list[dict]
+    :param width: The width the client needs, None for the original.
+    :type width: int | None
+    :return: The variant to serve, None if the photo has no variants yet.
+    :rtype: dict | None
+    """
+    if not variants:
+        return None
+    by_width = sorted(variants, key=lambda variant: variant["width"])
+    if width is None:
+        return by_width[-1]
+    return next((variant for variant in by_width if variant["width"] >= width), by_width[-1])
+
+
+class DerivativePipeline:
+    """
+    Creates the variants of uploaded photos in worker processes.
+
+    Decoding and resizing images holds the GIL, so the work is done in a process pool and the
+    event loop only waits for the result. The variants are stored next to the photo in the storage
+    and recorded on the photo when they are ready.
+
+    :param widths: The maximum width of each variant, keyed by the name of the variant.
+    :type widths: dict[str, int]
+    :param quality: The WebP quality, from 1 to 100.
+    :type quality: int
+    :param max_workers: Number of worker processes.
+    :type max_workers: int
+    :param backend: The storage of the photos.
+    :type backend: StorageBackend
+    """
+    def __init__(self, widths: dict[str, int], quality: int, max_workers: int, backend: StorageBackend = storage_backend):
+        self.widths = widths
+        self.quality = quality
+        self.max_workers = max_workers
+        self.backend = backend
+        self._executor = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def render_avatar(self, source_path: str, size: int) -> str:
+        """
+        Creates a square avatar from an image in a worker process.
+
+        :param source_path: The path of the image.
+        :type source_path: str
+        :param size: The width and height of the avatar.
+        :type size: int
+        :return: The path of the avatar.
+        :rtype: str
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, render_avatar, source_path, size)
+
+    async def generate(self, photo_id: int, key: str) -> list[dict]:
+        """
+        Creates the variants of a photo and saves their list in Photo.variants.
+
+        :param photo_id: The ID of the photo.
+        :type photo_id: int
+        :param key: The key of the original photo in the storage.
+        :type key: str
+        :return: The created variants, an empty list if the file is not a supported image.
+        :rtype: list[dict]
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            async with self.backend.open_local(key) as source_path:
+                variants = await loop.run_in_executor(self.executor, render_variants, source_path, self.widths, self.quality)
+                base_path, base_key = os.path.splitext(source_path)[0], posixpath.splitext(key)[0]
+                for variant in variants:
+                    if variant["url"] == source_path:
+                        variant["url"] = key
+                        continue
+                    # The copies are named like the original, so they get the key of the original with the same suffix.
+                    variant_key = base_key + variant["url"][len(base_path):]
+                    if self.backend.local_path(variant_key) != variant["url"]:
+                        await self.backend.put_file(variant_key, variant["url"], f"image/{variant['format']}")
+                    variant["url"] = variant_key
+        except (OSError, ValueError, Image.DecompressionBombError):
+            logger.warning("Could not create the variants of photo %s", photo_id, exc_info=True)
+            return []
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(Photo).where(Photo.id == photo_id).values(variants=variants, updated_at=Photo.updated_at))
+            await db.commit()
+        return variants
+
+    def shutdown(self):
+        """
+        Stops the worker processes.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+derivative_pipeline = DerivativePipeline(settings.photo_variant_widths, settings.photo_variant_quality, settings.photo_variant_workers)
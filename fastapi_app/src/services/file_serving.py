@@ -0,0 +1,212 @@
+import hashlib
+import os
+import stat
+from collections import OrderedDict
+from datetime import timezone
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+
+import anyio
+from fastapi import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+CHUNK_SIZE = 256 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+ZEROCOPY_EXTENSION = "http.response.zerocopysend"
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def sha256_file(path: str) -> str:
+    """
+    Computes the SHA-256 of a file, reading it in large blocks.
+
+    :param path: The path of the file.
+    :type path: str
+    :return: The hexadecimal digest.
+    :rtype: str
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while block := file.read(HASH_CHUNK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FileHashCache:
+    """
+    Remembers the SHA-256 of served files, so a file is hashed once per worker and not on every request.
+
+    A file is hashed again when its size or modification time changes.
+
+    :param max_size: The maximum number of remembered files.
+    :type max_size: int
+    """
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._hashes = OrderedDict()
+
+    async def get(self, path: str, stat_result: os.stat_result) -> str:
+        key = (path, stat_result.st_mtime_ns, stat_result.st_size)
+        digest = self._hashes.get(key)
+        if digest is None:
+            digest = await anyio.to_thread.run_sync(sha256_file, path)
+            self._hashes[key] = digest
+            while len(self._hashes) > self.max_size:
+                self._hashes.popitem(last=False)
+        else:
+            self._hashes.move_to_end(key)
+        return digest
+
+
+file_hash_cache = FileHashCache(10000)
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[tuple[int, int]]:
+    """
+    Parses a Range header with a single byte range.
+
+    :param header: The value of the Range header.
+    :type header: str | None
+    :param size: The size of the file.
+    :type size: int
+    :return: The first and the last byte of the range, None to send the whole file (no header, a malformed header or more ranges).
+    :rtype: tuple[int, int] | None
+    :raises RangeNotSatisfiable: If the range starts after the end of the file.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first == "":
+            length = int(last)
+            if length <= 0 or size == 0:
+                raise RangeNotSatisfiable(header)
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else max(start, size - 1)
+    except ValueError:
+        return None
+    if start < 0 or end < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable(header)
+    return start, min(end, size - 1)
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """
+    Checks an If-None-Match header with the weak comparison, as required for GET requests.
+    """
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def not_modified_since(header: str, last_modified: float) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return int(last_modified) <= since.timestamp()
+
+
+class FileRangeResponse(Response):
+    """
+    Sends a part of a file.
+
+    The file is handed to the server with the zero-copy send extension when the server supports
+    it, so the bytes go from the page cache to the socket without passing through Python.
+    Otherwise the file is streamed in large chunks.
+
+    :param path: The path of the file.
+    :type path: str
+    :param start: The first byte to send.
+    :type start: int
+    :param end: The last byte to send.
+    :type end: int
+    """
+    def __init__(self, path: str, start: int, end: int, status_code: int, headers: dict, media_type: str):
+        self.path = path
+        self.start = start
+        self.length = end - start + 1
+        super().__init__(None, status_code, {**headers, "content-length": str(self.length)}, media_type)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if ZEROCOPY_EXTENSION in scope.get("extensions", {}):
+            with open(self.path, "rb") as file:
+                await send({"type": ZEROCOPY_EXTENSION, "file": file, "offset": self.start, "count": self.length, "more_body": False})
+            return
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            remaining = self.length
+            more_body = True
+            while more_body:
+                chunk = await file.read(min(CHUNK_SIZE, remaining)) if remaining > 0 else b""
+                remaining -= len(chunk)
+                # An empty chunk means the file was truncated while it was sent, end the response anyway.
+                more_body = remaining > 0 and len(chunk) > 0
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+
+async def file_response(request: Request, path: str, media_type: str, max_age: int, etag: Optional[str] = None) -> Response:
+    """
+    Builds the response which sends a stored file with HTTP caching and resuming.
+
+    The file gets a strong ETag made from the SHA-256 of its content and a Last-Modified date.
+    Requests with a matching If-None-Match (or, without it, If-Modified-Since) get 304 without
+    a body. A single byte range from the Range header is sent as 206, unless If-Range names
+    another version of the file.
+
+    :param request: The request.
+    :type request: Request
+    :param path: The path of the file.
+    :type path: str
+    :param media_type: The content type of the file.
+    :type media_type: str
+    :param max_age: Number of seconds browsers and CDNs may use the file without asking again.
+    :type max_age: int
+    :param etag: The SHA-256 of the file if it is already known, it is computed otherwise.
+    :type etag: str | None
+    :return: The response.
+    :rtype: Response
+    :raises FileNotFoundError: If the file does not exist.
+    """
+    stat_result = await anyio.to_thread.run_sync(os.stat, path)
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise FileNotFoundError(path)
+    size = stat_result.st_size
+    etag = f'"{etag or await file_hash_cache.get(path, stat_result)}"'
+    last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+    headers = {
+        "etag": etag,
+        "last-modified": last_modified,
+        "cache-control": f"public, max-age={max_age}",
+        "accept-ranges": "bytes",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if_modified_since = request.headers.get("if-modified-since")
+    if (if_none_match is not None and etag_matches(if_none_match, etag)) or (
+        if_none_match is None and if_modified_since is not None and not_modified_since(if_modified_since, stat_result.st_mtime)
+    ):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range is not None and if_range.strip() not in (etag, last_modified):
+        range_header = None
+    try:
+        byte_range = parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**headers, "content-range": f"bytes */{size}"})
+    if byte_range is None:
+        return FileRangeResponse(path, 0, size - 1, 200, headers, media_type)
+    start, end = byte_range
+    return FileRangeResponse(path, start, end, 206, {**headers, "content-range": f"bytes {start}-{end}/{size}"}, media_type)
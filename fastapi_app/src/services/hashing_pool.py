@@ -0,0 +1,62 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from fastapi import HTTPException, status
+
+
+class HashingPool:
+    """
+    Runs CPU heavy password hashing outside of the event loop.
+
+    bcrypt releases the GIL while it works, so a small thread pool gives real parallelism
+    without the cost of sending passwords to other processes. The number of calls waiting
+    for a worker is limited and new calls are rejected with 503 once the limit is reached,
+    so a burst of logins can not queue up without end and slow down every other request.
+
+    :param max_workers: number of threads which compute hashes
+    :type max_workers: int
+    :param max_queue: number of calls allowed to wait for a free thread
+    :type max_queue: int
+    """
+    def __init__(self, max_workers: int, max_queue: int):
+        self.max_workers = max_workers
+        self.max_pending = max_workers + max_queue
+        self.pending = 0
+        self._executor = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="password-hash")
+        return self._executor
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Calls the function in the worker pool and waits for its result.
+
+        :param func: The function to call.
+        :type func: Callable
+        :return: The value returned by the function.
+        :raises HTTPException: If too many calls are already waiting for the pool.
+        """
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, try again later",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        """
+        Stops the worker threads.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -1,85 +1,233 @@
-from sqlalchemy.orm import Session
+import logging
+
+from sqlalchemy import select, func, update, delete, Select
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
-from fastapi_app.src.database.models import Photo
-from fastapi_app.src.database.db import SessionLocal
+from fastapi_app.src.database.models import Photo, Comment, User, photo_tag_table
+from fastapi_app.src.repository.counters import change_photo_count
+from fastapi_app.src.services.storage import delete_content
+from fastapi_app.src.services.storage_backends import StorageBackend, storage_backend
+
+logger = logging.getLogger(__name__)
+
+
+def build_photo_delete_statement(photo_id: int, user_id: int | None = None) -> Select:
+    """
+    Builds the statement which deletes a photo with the rows depending on it.
+
+    The photo is deleted in a data-modifying WITH query, the other queries of the statement delete
+    its tags and comments and count down the photos of its owner only if the photo was deleted.
+    Opinions are deleted by the database (ON DELETE CASCADE).
+
+    :param photo_id: The ID of the photo.
+    :type photo_id: int
+    :param user_id: The ID of the user who has to own the photo, None for a photo of any user.
+    :type user_id: int | None
+    :return: The statement returning the ID and the content hash of the deleted photo, no rows if nothing was deleted.
+    :rtype: Select
+    """
+    conditions = [Photo.id == photo_id] if user_id is None else [Photo.id == photo_id, Photo.user_id == user_id]
+    deleted = delete(Photo).where(*conditions).returning(Photo.id, Photo.user_id, Photo.content_hash).cte("deleted_photo")
+    deleted_tags = (
+        delete(photo_tag_table)
+        .where(photo_tag_table.c.photo_id.in_(select(deleted.c.id)))
+        .returning(photo_tag_table.c.photo_id)
+        .cte("deleted_tags")
+    )
+    deleted_comments = (
+        delete(Comment)
+        .where(Comment.photo_id.in_(select(deleted.c.id)))
+        .returning(Comment.id)
+        .cte("deleted_comments")
+    )
+    counted = (
+        update(User)
+        .where(User.id == deleted.c.user_id)
+        .values(photo_count=User.photo_count - 1)
+        .returning(User.id)
+        .cte("counted")
+    )
+    return select(deleted.c.id, deleted.c.content_hash).add_cte(deleted_tags, deleted_comments, counted)
+
 
-    
 class PhotoService:
     @staticmethod
-    def save(db: Session, photo: Photo) -> Photo:
+    async def lock_content(db: AsyncSession, content_hash: str) -> None:
+        """
+        Lock the stored file with the given content until the end of the transaction.
+
+        Adding a photo and deleting the last photo of a file take the same lock, so the file
+        can not be removed while a new photo starts to use it.
+
+        :param db: The database session.
+        :type db: AsyncSession
+        :param content_hash: The SHA-256 of the file.
+        :type content_hash: str
+        """
+        await db.execute(select(func.pg_advisory_xact_lock(func.hashtextextended(content_hash, 0))))
+
+    @staticmethod
+    async def count_content_references(db: AsyncSession, content_hash: str) -> int:
+        """
+        Count the photos which use the stored file with the given content.
+
+        :param db: The database session.
+        :type db: AsyncSession
+        :param content_hash: The SHA-256 of the file.
+        :type content_hash: str
+        :return: The number of photos.
+        :rtype: int
+        """
+        return await db.scalar(select(func.count()).select_from(Photo).filter(Photo.content_hash == content_hash))
+
+    @staticmethod
+    async def collect_content(db: AsyncSession, content_hash: str, backend: StorageBackend = storage_backend) -> bool:
+        """
+        Remove the stored file with the given content and its smaller copies if no photo uses them.
+
+        Runs in a transaction of its own, after the photo which used the file is committed. The
+        content lock is held while the file is removed, so an upload of the same file waits and
+        stores the file again instead of recording a photo of a file which is being removed.
+
+        :param db: The database session, its transaction is ended.
+        :type db: AsyncSession
+        :param content_hash: The SHA-256 of the file.
+        :type content_hash: str
+        :param backend: The storage.
+        :type backend: StorageBackend
+        :return: True if the file was removed.
+        :rtype: bool
+        """
+        await PhotoService.lock_content(db, content_hash)
+        try:
+            if await PhotoService.count_content_references(db, content_hash):
+                return False
+            await delete_content(content_hash, backend)
+            return True
+        finally:
+            # Nothing was written, ending the transaction releases the lock.
+            await db.rollback()
+
+    @staticmethod
+    async def get_content_variants(db: AsyncSession, content_hash: str) -> list[dict]:
         """
-        Save a new photo to the database.
+        Return the smaller copies already created for a stored file by another photo.
 
         :param db: The database session.
-        :type db: Session
+        :type db: AsyncSession
+        :param content_hash: The SHA-256 of the file.
+        :type content_hash: str
+        :return: The variants, an empty list if they are not created yet.
+        :rtype: list[dict]
+        """
+        variants = await db.scalar(
+            select(Photo.variants)
+            .filter(Photo.content_hash == content_hash, func.jsonb_array_length(Photo.variants) > 0)
+            .limit(1)
+        )
+        return variants or []
+
+    @staticmethod
+    async def save(db: AsyncSession, photo: Photo) -> Photo:
+        """
+        Save a new photo to the database and count it in the photos of its owner.
+
+        :param db: The database session.
+        :type db: AsyncSession
         :param photo: The photo object to save.
         :type photo: Photo
         :return: The saved photo object.
         :rtype: Photo
         """
         db.add(photo)
-        db.commit()
-        db.refresh(photo)
+        await change_photo_count(db, photo.user_id, 1)
+        await db.commit()
+        await db.refresh(photo)
         return photo
 
     @staticmethod
-    def update(db: Session, photo_id: int, description: str) -> Photo:
+    async def update(db: AsyncSession, photo_id: int, description: str, user_id: int | None = None) -> Photo:
         """
         Update the description of a photo by its ID.
 
+        The photo is changed and returned by one UPDATE ... RETURNING statement, the owner is checked in its WHERE clause.
+
         :param db: The database session.
-        :type db: Session
+        :type db: AsyncSession
         :param photo_id: The ID of the photo to update.
         :type photo_id: int
         :param description: The new description for the photo.
         :type description: str
+        :param user_id: The ID of the user who has to own the photo, None to update a photo of any user.
+        :type user_id: int | None
         :return: The updated photo object.
         :rtype: Photo
-        :raises FileNotFoundError: If the photo is not found.
+        :raises FileNotFoundError: If the photo is not found or it belongs to another user.
         """
-        photo = db.query(Photo).filter(Photo.id == photo_id).first()
-        if photo:
-            photo.description = description
-            db.commit()
-            db.refresh(photo)
-        else:
+        conditions = [Photo.id == photo_id] if user_id is None else [Photo.id == photo_id, Photo.user_id == user_id]
+        photo = (await db.scalars(update(Photo).where(*conditions).values(description=description).returning(Photo))).first()
+        if photo is None:
             raise FileNotFoundError(f"Photo with ID {photo_id} not found")
+        await db.commit()
         return photo
 
     @staticmethod
-    def delete(db: Session, photo_id: int) -> None:
+    async def delete(db: AsyncSession, photo_id: int, user_id: int | None = None) -> None:
         """
         Delete a photo by its ID.
 
+        The photo, its tags and comments are deleted and the photos of its owner are counted down
+        by one statement (see build_photo_delete_statement). The stored file and its smaller copies
+        are removed after the commit when no other photo uses them (see collect_content). If they can
+        not be removed, the photo stays deleted and sweep_orphaned_content removes them later.
+
+        The content lock is taken before the statement locks the row of the owner, in the same
+        order as create_photo takes them, so a delete and an upload of the same file can not deadlock.
+
         :param db: The database session.
-        :type db: Session
+        :type db: AsyncSession
         :param photo_id: The ID of the photo to delete.
         :type photo_id: int
+        :param user_id: The ID of the user who has to own the photo, None to delete a photo of any user.
+        :type user_id: int | None
         :return: None
         :rtype: None
-        :raises FileNotFoundError: If the photo is not found.
+        :raises FileNotFoundError: If the photo is not found or it belongs to another user.
         """
-        photo = db.query(Photo).filter(Photo.id == photo_id).first()
-        if photo:
-            db.delete(photo)
-            db.commit()
-        else:
+        conditions = [Photo.id == photo_id] if user_id is None else [Photo.id == photo_id, Photo.user_id == user_id]
+        photo = (await db.execute(select(Photo.content_hash).filter(*conditions))).first()
+        if photo is None:
+            raise FileNotFoundError(f"Photo with ID {photo_id} not found")
+        content_hash = photo.content_hash
+        if content_hash:
+            await PhotoService.lock_content(db, content_hash)
+        if (await db.execute(build_photo_delete_statement(photo_id, user_id))).first() is None:
+            # Deleted by a concurrent request.
             raise FileNotFoundError(f"Photo with ID {photo_id} not found")
+        # The count sees every photo committed by uploads which held the lock before.
+        unreferenced = bool(content_hash) and await PhotoService.count_content_references(db, content_hash) == 0
+        await db.commit()
+        if unreferenced:
+            try:
+                await PhotoService.collect_content(db, content_hash)
+            except Exception:
+                logger.warning("Could not remove the content %s of deleted photo %s", content_hash, photo_id, exc_info=True)
 
     @staticmethod
-    def get(db: Session, photo_id: int) -> Photo:
+    async def get(db: AsyncSession, photo_id: int) -> Photo:
         """
         Retrieve a photo by its ID.
 
         :param db: The database session.
-        :type db: Session
+        :type db: AsyncSession
         :param photo_id: The ID of the photo to retrieve.
         :type photo_id: int
         :return: The retrieved photo object.
         :rtype: Photo
         :raises FileNotFoundError: If the photo is not found.
         """
-        photo = db.query(Photo).filter(Photo.id == photo_id).first()
+        result = await db.execute(select(Photo).filter(Photo.id == photo_id))
+        photo = result.scalars().first()
         if not photo:
             raise FileNotFoundError(f"Photo with ID {photo_id} not found")
         return photo
\ No newline at end of file
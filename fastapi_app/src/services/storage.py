@@ -1,34 +1,341 @@
-import aiofiles
+import hashlib
+import logging
 import os
-from uuid import uuid4, UUID
-from fastapi import UploadFile
+import posixpath
+import re
+import tempfile
+from dataclasses import dataclass, replace
+from typing import BinaryIO, Optional
+from uuid import UUID, uuid4
 
+import anyio
+from fastapi import HTTPException, UploadFile, status
+from PIL import Image
+
+from fastapi_app.src.conf.config import settings
 from fastapi_app.src.database.models import Photo
+from fastapi_app.src.services.derivatives import VARIANT_FORMAT, derivative_pipeline
+from fastapi_app.src.services.storage_backends import StorageBackend, storage_backend
 
 UPLOAD_DIR = "uploads/"
+STAGING_DIR = "staging/"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-async def save_photo(file: UploadFile) -> str:
+CHUNK_SIZE = 1024 * 1024
+# ab/cd/abcd...<64 hex digits>, optionally with the suffix of a smaller copy (_thumb.webp).
+CONTENT_KEY = re.compile(r"(?P<a>[0-9a-f]{2})/(?P<b>[0-9a-f]{2})/(?P<sha256>(?P=a)(?P=b)[0-9a-f]{60})(?:_[a-z0-9]+\.webp)?")
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class StoredFile:
+    """
+    A file saved in the storage.
+
+    :param path: The path of the temporary file, or the key of the file once it is in the storage.
+    :type path: str
+    :param sha256: The hexadecimal SHA-256 of the content.
+    :type sha256: str
+    :param size: The size of the file in bytes.
+    :type size: int
+    :param content_type: The media type of the image, read from its content, None if it is not a known image.
+    :type content_type: str | None
+    """
+    path: str
+    sha256: str
+    size: int
+    content_type: Optional[str] = None
+
+
+class FileTooLarge(ValueError):
+    pass
+
+
+def content_path(sha256: str, directory: str = UPLOAD_DIR) -> str:
+    """
+    Returns the storage key of the file with the given content.
+
+    Files are named by the SHA-256 of their content and spread over two levels of directories
+    named by the first four hexadecimal digits (ab/cd/abcd...), so no directory holds more than
+    a small part of the files.
+
+    :param sha256: The hexadecimal SHA-256 of the content.
+    :type sha256: str
+    :param directory: The directory of the files in the storage.
+    :type directory: str
+    :return: The key of the file.
+    :rtype: str
+    """
+    return posixpath.join(directory, sha256[:2], sha256[2:4], sha256)
+
+
+def content_hash_of(key: str, directory: str = UPLOAD_DIR) -> Optional[str]:
+    """
+    Returns the SHA-256 of the content stored under a key made by content_path, or by a smaller copy of it.
+
+    :param key: The key in the storage.
+    :type key: str
+    :param directory: The directory of the files in the storage.
+    :type directory: str
+    :return: The hexadecimal SHA-256, None for other keys (temporary files, avatars, files stored before content hashes).
+    :rtype: str | None
     """
-    Save an uploaded photo to the server.
+    prefix = posixpath.join(directory, "")
+    match = CONTENT_KEY.fullmatch(key[len(prefix):]) if key.startswith(prefix) else None
+    return match["sha256"] if match else None
 
-    This function saves an uploaded photo file to a specified directory on the server.
-    The file is saved with a unique name generated using UUID to avoid conflicts.
+
+def detect_content_type(path: str) -> Optional[str]:
+    """
+    Returns the media type of an image file, read from its header.
+
+    Stored photos are named by the hash of their content and have no extension, so the media
+    type is recorded when they are uploaded.
+
+    :param path: The path of the file.
+    :type path: str
+    :return: The media type, None if the file is not an image Pillow can open.
+    :rtype: str | None
+    """
+    try:
+        with Image.open(path) as image:
+            return Image.MIME.get(image.format)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def write_file(source: BinaryIO, directory: str, max_size: int) -> StoredFile:
+    """
+    Copies a file to a temporary file in directory, computing its SHA-256 on the way.
+
+    The content is flushed to disk before the function returns, so the temporary file can be
+    renamed to its final name by store_content without a risk of a partial file under that name.
+
+    :param source: The file to copy, read from its current position.
+    :type source: BinaryIO
+    :param directory: The directory of the temporary file.
+    :type directory: str
+    :param max_size: The maximum number of bytes.
+    :type max_size: int
+    :return: The temporary file.
+    :rtype: StoredFile
+    :raises FileTooLarge: If the file is larger than max_size, nothing is saved then.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(dir=directory, prefix=".upload-", delete=False) as out_file:
+        try:
+            while chunk := source.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise FileTooLarge(f"File is larger than {max_size} bytes")
+                digest.update(chunk)
+                out_file.write(chunk)
+            out_file.flush()
+            os.fsync(out_file.fileno())
+        except BaseException:
+            out_file.close()
+            os.unlink(out_file.name)
+            raise
+    return StoredFile(path=out_file.name, sha256=digest.hexdigest(), size=size)
+
+
+async def save_upload(file: UploadFile, directory: str = UPLOAD_DIR, max_size: int = None) -> StoredFile:
+    """
+    Save an uploaded file to a temporary file of the storage.
+
+    The whole copy runs in one worker thread with 1 MiB buffers, instead of a thread hop
+    for every small chunk, and the SHA-256 of the content is computed while it is copied.
+    The media type is then read from the header of the saved file.
 
     :param file: The uploaded file to be saved.
     :type file: UploadFile
-    :return: The path to the saved file.
+    :param directory: The root directory of the storage.
+    :type directory: str
+    :param max_size: The maximum size of the file in bytes, settings.photo_max_upload_size by default.
+    :type max_size: int
+    :return: The temporary file, to pass to store_content.
+    :rtype: StoredFile
+    :raises HTTPException: If the file is too large, raises a 413 error.
+    """
+    max_size = settings.photo_max_upload_size if max_size is None else max_size
+    if file.size is not None and file.size > max_size:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"File is larger than {max_size} bytes")
+    try:
+        stored = await anyio.to_thread.run_sync(write_file, file.file, directory, max_size)
+    except FileTooLarge as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    return replace(stored, content_type=await anyio.to_thread.run_sync(detect_content_type, stored.path))
+
+
+async def stage_content(stored: StoredFile, backend: StorageBackend = storage_backend, directory: str = UPLOAD_DIR) -> Optional[str]:
+    """
+    Uploads a temporary file saved by save_upload to a staging key of a remote storage.
+
+    Called before the transaction which records the photo, so a slow upload holds no database
+    connection or lock, and store_content only has to move the object inside the storage.
+    Nothing is uploaded when the storage is on the local disk, where store_content renames the
+    temporary file, or when the same content is stored already.
+
+    :param stored: The temporary file.
+    :type stored: StoredFile
+    :param backend: The storage.
+    :type backend: StorageBackend
+    :param directory: The directory of the files in the storage.
+    :type directory: str
+    :return: The staging key, to pass to store_content, None if nothing was uploaded (the temporary file is kept then).
+    :rtype: str | None
+    """
+    key = content_path(stored.sha256, directory)
+    if backend.local_path(key) is not None or await backend.stat(key) is not None:
+        return None
+    staging_key = posixpath.join(STAGING_DIR, uuid4().hex)
+    # The storage keeps the media type when the object is moved.
+    await backend.put_file(staging_key, stored.path, stored.content_type)
+    return staging_key
+
+
+async def store_content(stored: StoredFile, backend: StorageBackend = storage_backend, directory: str = UPLOAD_DIR,
+                        staging_key: Optional[str] = None) -> str:
+    """
+    Moves an uploaded file to the storage, under the key of its content.
+
+    If the same content is already stored, the uploaded copy is removed and the stored file
+    is shared. Callers which record the file in the database should hold the content lock of
+    PhotoService, so the file can not be collected by a concurrent delete in the meantime.
+
+    :param stored: The temporary file saved by save_upload.
+    :type stored: StoredFile
+    :param backend: The storage.
+    :type backend: StorageBackend
+    :param directory: The directory of the files in the storage.
+    :type directory: str
+    :param staging_key: The key returned by stage_content, None to store the temporary file.
+    :type staging_key: str | None
+    :return: The key of the stored content.
     :rtype: str
     """
-    file_extension = os.path.splitext(file.filename)[1]
-    file_name = f"{uuid4()}{file_extension}"
-    file_path = os.path.join(UPLOAD_DIR, file_name)
+    key = content_path(stored.sha256, directory)
+    if await backend.stat(key) is not None:
+        await discard_upload(stored, staging_key, backend)
+    elif staging_key is not None:
+        await backend.move(staging_key, key)
+    else:
+        await backend.put_file(key, stored.path, stored.content_type)
+    return key
+
+
+async def remove_file(path: str) -> None:
+    """
+    Removes a local temporary file, if it is still there.
+
+    :param path: The path of the file.
+    :type path: str
+    """
+    try:
+        await anyio.to_thread.run_sync(os.unlink, path)
+    except FileNotFoundError:
+        pass
+
+
+async def discard_upload(stored: StoredFile, staging_key: Optional[str] = None, backend: StorageBackend = storage_backend) -> None:
+    """
+    Removes the temporary file saved by save_upload and the staged object if they were not moved to the storage.
+
+    :param stored: The temporary file.
+    :type stored: StoredFile
+    :param staging_key: The key returned by stage_content, if any.
+    :type staging_key: str | None
+    :param backend: The storage.
+    :type backend: StorageBackend
+    """
+    await remove_file(stored.path)
+    if staging_key is not None:
+        try:
+            await backend.delete([staging_key])
+        except Exception:
+            # Left for the content sweep, the error of the upload is more useful to the caller.
+            logger.warning("Could not remove the staged upload %s", staging_key, exc_info=True)
+
+
+async def delete_content(sha256: str, backend: StorageBackend = storage_backend, directory: str = UPLOAD_DIR) -> None:
+    """
+    Removes the stored content and its smaller copies (<key>_<variant>.webp), must be called only when no photo uses it.
+
+    :param sha256: The hexadecimal SHA-256 of the content.
+    :type sha256: str
+    :param backend: The storage.
+    :type backend: StorageBackend
+    :param directory: The directory of the files in the storage.
+    :type directory: str
+    """
+    await backend.delete(await backend.list_keys(content_path(sha256, directory)))
+
+
+async def save_photo(file: UploadFile, backend: StorageBackend = storage_backend, directory: str = UPLOAD_DIR, max_size: int = None) -> StoredFile:
+    """
+    Save an uploaded photo to the storage.
+
+    The photo is saved under the SHA-256 of its content (see content_path), so the same photo
+    uploaded many times is stored once.
+
+    :param file: The uploaded file to be saved.
+    :type file: UploadFile
+    :param backend: The storage.
+    :type backend: StorageBackend
+    :param directory: The local directory of the temporary file.
+    :type directory: str
+    :param max_size: The maximum size of the file in bytes, settings.photo_max_upload_size by default.
+    :type max_size: int
+    :return: The saved file, its path is the key in the storage.
+    :rtype: StoredFile
+    :raises HTTPException: If the file is too large, raises a 413 error.
+    """
+    stored = await save_upload(file, directory, max_size)
+    staging_key = await stage_content(stored, backend)
+    key = await store_content(stored, backend, staging_key=staging_key)
+    return replace(stored, path=key)
+
+
+async def save_avatar(file: UploadFile, user_id: int, backend: StorageBackend = storage_backend, directory: str = UPLOAD_DIR) -> str:
+    """
+    Save an uploaded avatar to the storage, cropped to a square of settings.avatar_size pixels.
+
+    The key contains the hash of the content, so a new avatar gets a new URL and browsers do not
+    show the old one from their cache. The previous avatars of the user are removed.
+
+    :param file: The uploaded image.
+    :type file: UploadFile
+    :param user_id: The ID of the user.
+    :type user_id: int
+    :param backend: The storage.
+    :type backend: StorageBackend
+    :param directory: The local directory of the temporary files.
+    :type directory: str
+    :return: The public URL of the avatar.
+    :rtype: str
+    :raises HTTPException: If the file is too large, raises a 413 error, if it is not an image, raises a 400 error.
+    """
+    stored = await save_upload(file, directory)
+    try:
+        avatar_path = await derivative_pipeline.render_avatar(stored.path, settings.avatar_size)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.warning("Could not create the avatar of user %s", user_id, exc_info=True)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The file is not a supported image")
+    finally:
+        await anyio.to_thread.run_sync(os.unlink, stored.path)
+    prefix = f"avatars/{user_id}/"
+    key = f"{prefix}{stored.sha256[:16]}.{VARIANT_FORMAT}"
+    old_keys = [old_key for old_key in await backend.list_keys(prefix) if old_key != key]
+    try:
+        await backend.put_file(key, avatar_path, f"image/{VARIANT_FORMAT}")
+    finally:
+        # put_file moves the file to the storage, it is left only when the upload failed.
+        await remove_file(avatar_path)
+    await backend.delete(old_keys)
+    return backend.public_url(key)
 
-    async with aiofiles.open(file_path, 'wb') as out_file:
-        while content := await file.read(1024):
-            await out_file.write(content)
-    
-    return file_path
 
 async def delete_photo(photo_id: UUID):
     """
@@ -0,0 +1,556 @@
+import asyncio
+import errno
+import hashlib
+import hmac
+import os
+import posixpath
+import shutil
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterable, AsyncIterator, Optional
+from urllib.parse import quote, urlencode
+
+import anyio
+from aiobotocore.config import AioConfig
+from aiobotocore.session import get_session
+from botocore.exceptions import ClientError
+
+from fastapi_app.src.conf.config import settings
+
+CHUNK_SIZE = 1024 * 1024
+MIN_PART_SIZE = 5 * 1024 * 1024
+PUBLIC_PREFIXES = ("avatars/",)
+
+
+@dataclass(frozen=True)
+class ObjectInfo:
+    """
+    Metadata of a stored object.
+
+    :param size: The size of the object in bytes.
+    :type size: int
+    :param etag: The entity tag of the object.
+    :type etag: str
+    :param last_modified: The time of the last change, in seconds since the epoch.
+    :type last_modified: float
+    """
+    size: int
+    etag: str
+    last_modified: float
+
+
+def validate_key(key: str) -> str:
+    """
+    Checks that a key is a relative path without "." and ".." parts, so it can not point outside the storage.
+
+    :param key: The key of an object.
+    :type key: str
+    :return: The key.
+    :rtype: str
+    :raises ValueError: If the key is not valid.
+    """
+    parts = key.split("/")
+    if not key or key.startswith("/") or "\\" in key or any(part in ("", ".", "..") for part in parts):
+        raise ValueError(f"Invalid storage key: {key!r}")
+    return key
+
+
+def sign_url(secret: str, method: str, key: str, expires: int) -> str:
+    message = f"{method.upper()}\n{key}\n{expires}".encode()
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def verify_signed_url(secret: str, method: str, key: str, expires: int, signature: str) -> bool:
+    """
+    Checks the signature of a URL created by a local or in-memory backend.
+
+    :param secret: The secret the URL was signed with.
+    :type secret: str
+    :param method: The HTTP method of the request.
+    :type method: str
+    :param key: The key of the object.
+    :type key: str
+    :param expires: The expiry time from the URL, in seconds since the epoch.
+    :type expires: int
+    :param signature: The signature from the URL.
+    :type signature: str
+    :return: True if the signature is valid and the URL has not expired.
+    :rtype: bool
+    """
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(sign_url(secret, method, key, expires), signature)
+
+
+def signed_url(base_url: str, secret: str, key: str, expires_in: int, method: str = "GET") -> str:
+    """
+    Creates a URL of the storage routes of the application which is valid for expires_in seconds.
+    """
+    expires = int(time.time()) + expires_in
+    query = urlencode({"expires": expires, "signature": sign_url(secret, method, validate_key(key), expires)})
+    return f"{base_url}/{quote(key)}?{query}"
+
+
+async def iterate_file(path: str, start: int = 0, end: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    async with await anyio.open_file(path, mode="rb") as file:
+        await file.seek(start)
+        remaining = None if end is None else end - start + 1
+        while remaining is None or remaining > 0:
+            chunk = await file.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+class StorageBackend(ABC):
+    """
+    Interface of a storage of files (objects) addressed by keys like "uploads/ab/cd/<sha256>".
+
+    Objects are written and read as streams of chunks, so a large file is never held in memory.
+    Backends which do not sign their own URLs sign them with secret for the storage routes.
+    """
+    secret: Optional[str] = None
+
+    @abstractmethod
+    async def put(self, key: str, chunks: AsyncIterable[bytes], content_type: Optional[str] = None) -> int:
+        """
+        Stores an object, replacing the object with the same key.
+
+        :return: The number of stored bytes.
+        """
+
+    async def put_file(self, key: str, path: str, content_type: Optional[str] = None) -> int:
+        """
+        Stores a local file as an object, the local file is removed afterwards.
+
+        :return: The number of stored bytes.
+        """
+        size = await self.put(key, iterate_file(path), content_type)
+        await anyio.to_thread.run_sync(os.unlink, path)
+        return size
+
+    async def move(self, source_key: str, key: str) -> None:
+        """
+        Renames an object, replacing the object with the same key.
+
+        Backends move the object without reading it when they can, this fallback copies it.
+
+        :raises FileNotFoundError: If the source object does not exist.
+        """
+        await self.put(key, self.get(source_key))
+        await self.delete([source_key])
+
+    @abstractmethod
+    def get(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        """
+        Reads an object, or the bytes from start to end (inclusive).
+
+        :raises FileNotFoundError: If the object does not exist.
+        """
+
+    @abstractmethod
+    async def stat(self, key: str) -> Optional[ObjectInfo]:
+        """
+        Returns the metadata of an object, None if it does not exist.
+        """
+
+    @abstractmethod
+    async def list_keys(self, prefix: str) -> list[str]:
+        """
+        Returns the keys of the objects starting with the prefix.
+        """
+
+    @abstractmethod
+    async def delete(self, keys: list[str]) -> None:
+        """
+        Removes objects, keys which do not exist are skipped.
+        """
+
+    @abstractmethod
+    async def presigned_url(self, key: str, expires_in: int, method: str = "GET") -> str:
+        """
+        Returns a URL which lets anybody download (GET) or upload (PUT) the object for expires_in seconds.
+        """
+
+    @abstractmethod
+    def public_url(self, key: str) -> str:
+        """
+        Returns the permanent URL of an object under one of PUBLIC_PREFIXES.
+        """
+
+    def local_path(self, key: str) -> Optional[str]:
+        """
+        Returns the path of the object on the local disk, None if the backend is not local.
+        """
+        return None
+
+    @asynccontextmanager
+    async def open_local(self, key: str) -> AsyncIterator[str]:
+        """
+        Makes the object available as a local file while the context is open.
+
+        The file is in a temporary directory unless the backend is local, files created next to it
+        are removed with the directory.
+        """
+        path = self.local_path(key)
+        if path is not None:
+            yield path
+            return
+        with tempfile.TemporaryDirectory(prefix="storage-") as directory:
+            path = os.path.join(directory, posixpath.basename(key))
+            async with await anyio.open_file(path, mode="wb") as file:
+                async for chunk in self.get(key):
+                    await file.write(chunk)
+            yield path
+
+    async def close(self) -> None:
+        """
+        Closes the connections of the backend.
+        """
+
+
+class LocalStorageBackend(StorageBackend):
+    """
+    Storage in a directory of the local disk, objects are files named by their keys.
+
+    Presigned URLs point to the storage routes of the application and are signed with secret.
+
+    :param root: The directory of the storage.
+    :type root: str
+    :param base_url: The URL of the storage routes.
+    :type base_url: str
+    :param secret: The secret used to sign URLs.
+    :type secret: str
+    """
+    def __init__(self, root: str, base_url: str, secret: str):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+        self.secret = secret
+
+    def local_path(self, key: str) -> str:
+        return os.path.normpath(os.path.join(self.root, validate_key(key)))
+
+    async def put(self, key: str, chunks: AsyncIterable[bytes], content_type: Optional[str] = None) -> int:
+        path = self.local_path(key)
+        await anyio.to_thread.run_sync(lambda: os.makedirs(os.path.dirname(path), exist_ok=True))
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".upload-")
+        os.close(handle)
+        size = 0
+        try:
+            async with await anyio.open_file(temp_path, mode="wb") as file:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    await file.write(chunk)
+                await file.flush()
+                await anyio.to_thread.run_sync(os.fsync, file.wrapped.fileno())
+            await anyio.to_thread.run_sync(os.replace, temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return size
+
+    def _move_file(self, key: str, source: str) -> int:
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = os.path.getsize(source)
+        try:
+            os.replace(source, path)
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            # The file is on another disk, it is copied next to the target and renamed.
+            with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), prefix=".upload-", delete=False) as out_file, open(source, "rb") as in_file:
+                shutil.copyfileobj(in_file, out_file, CHUNK_SIZE)
+                out_file.flush()
+                os.fsync(out_file.fileno())
+            os.replace(out_file.name, path)
+            os.unlink(source)
+        return size
+
+    async def put_file(self, key: str, path: str, content_type: Optional[str] = None) -> int:
+        return await anyio.to_thread.run_sync(self._move_file, key, path)
+
+    async def move(self, source_key: str, key: str) -> None:
+        await self.put_file(key, self.local_path(source_key))
+        await self.delete([source_key])
+
+    def get(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        return iterate_file(self.local_path(key), start, end)
+
+    async def stat(self, key: str) -> Optional[ObjectInfo]:
+        try:
+            stat_result = await anyio.to_thread.run_sync(os.stat, self.local_path(key))
+        except FileNotFoundError:
+            return None
+        return ObjectInfo(stat_result.st_size, f"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}", stat_result.st_mtime)
+
+    def _list_keys(self, prefix: str) -> list[str]:
+        directory, _, name = prefix.rpartition("/")
+        path = self.local_path(directory) if directory else os.path.normpath(self.root)
+        if not os.path.isdir(path):
+            return []
+        keys = []
+        for entry in os.scandir(path):
+            if not entry.name.startswith(name) or entry.name.startswith(".upload-"):
+                continue
+            key = f"{directory}/{entry.name}" if directory else entry.name
+            if entry.is_dir():
+                keys.extend(self._list_keys(f"{key}/"))
+            else:
+                keys.append(key)
+        return sorted(keys)
+
+    async def list_keys(self, prefix: str) -> list[str]:
+        return await anyio.to_thread.run_sync(self._list_keys, prefix)
+
+    def _delete(self, keys: list[str]) -> None:
+        for key in keys:
+            try:
+                os.unlink(self.local_path(key))
+            except FileNotFoundError:
+                pass
+            # Empty directories are removed, except the top-level directory of the key.
+            directory = posixpath.dirname(key)
+            while "/" in directory:
+                try:
+                    os.rmdir(self.local_path(directory))
+                except OSError:
+                    break
+                directory = posixpath.dirname(directory)
+
+    async def delete(self, keys: list[str]) -> None:
+        await anyio.to_thread.run_sync(self._delete, keys)
+
+    async def presigned_url(self, key: str, expires_in: int, method: str = "GET") -> str:
+        return signed_url(self.base_url, self.secret, key, expires_in, method)
+
+    def public_url(self, key: str) -> str:
+        return f"{self.base_url}/{quote(validate_key(key))}"
+
+
+class MemoryStorageBackend(StorageBackend):
+    """
+    Storage in the memory of the worker, for tests and development.
+
+    :param base_url: The URL of the storage routes.
+    :type base_url: str
+    :param secret: The secret used to sign URLs.
+    :type secret: str
+    """
+    def __init__(self, base_url: str = "/api/storage", secret: str = "memory"):
+        self.base_url = base_url.rstrip("/")
+        self.secret = secret
+        self.objects = {}
+
+    async def put(self, key: str, chunks: AsyncIterable[bytes], content_type: Optional[str] = None) -> int:
+        data = b"".join([chunk async for chunk in chunks])
+        self.objects[validate_key(key)] = (data, time.time())
+        return len(data)
+
+    async def get(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        if key not in self.objects:
+            raise FileNotFoundError(key)
+        data = self.objects[key][0]
+        end = len(data) - 1 if end is None else end
+        for offset in range(start, end + 1, CHUNK_SIZE):
+            yield data[offset:min(offset + CHUNK_SIZE, end + 1)]
+
+    async def stat(self, key: str) -> Optional[ObjectInfo]:
+        if key not in self.objects:
+            return None
+        data, modified = self.objects[key]
+        return ObjectInfo(len(data), hashlib.md5(data).hexdigest(), modified)
+
+    async def move(self, source_key: str, key: str) -> None:
+        if source_key not in self.objects:
+            raise FileNotFoundError(source_key)
+        self.objects[validate_key(key)] = self.objects.pop(source_key)
+
+    async def list_keys(self, prefix: str) -> list[str]:
+        return sorted(key for key in self.objects if key.startswith(prefix))
+
+    async def delete(self, keys: list[str]) -> None:
+        for key in keys:
+            self.objects.pop(key, None)
+
+    async def presigned_url(self, key: str, expires_in: int, method: str = "GET") -> str:
+        return signed_url(self.base_url, self.secret, key, expires_in, method)
+
+    def public_url(self, key: str) -> str:
+        return f"{self.base_url}/{quote(validate_key(key))}"
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    Storage in a bucket of Amazon S3 or a compatible server (MinIO in docker-compose).
+
+    Objects larger than part_size are uploaded with a multipart upload, one part at a time,
+    so only one part is held in memory. Presigned URLs let clients download and upload
+    photos directly from the bucket, without passing the bytes through the application.
+
+    :param bucket: The name of the bucket.
+    :type bucket: str
+    :param endpoint_url: The URL of the server, None for Amazon S3.
+    :type endpoint_url: str | None
+    :param access_key: The access key.
+    :type access_key: str
+    :param secret_key: The secret key.
+    :type secret_key: str
+    :param region: The region of the bucket.
+    :type region: str
+    :param public_url: The URL the bucket is publicly readable at, for objects under PUBLIC_PREFIXES.
+    :type public_url: str | None
+    :param part_size: The size of the parts of multipart uploads, at least 5 MiB.
+    :type part_size: int
+    """
+    def __init__(self, bucket: str, endpoint_url: Optional[str], access_key: str, secret_key: str, region: str,
+                 public_url: Optional[str] = None, part_size: int = 8 * 1024 * 1024):
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.public_base_url = (public_url or f"{(endpoint_url or f'https://s3.{region}.amazonaws.com').rstrip('/')}/{bucket}").rstrip("/")
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self._client = None
+        self._exit_stack = None
+        self._lock = asyncio.Lock()
+
+    async def client(self):
+        if self._client is None:
+            async with self._lock:
+                if self._client is None:
+                    exit_stack = AsyncExitStack()
+                    self._client = await exit_stack.enter_async_context(get_session().create_client(
+                        "s3",
+                        endpoint_url=self.endpoint_url,
+                        region_name=self.region,
+                        aws_access_key_id=self.access_key,
+                        aws_secret_access_key=self.secret_key,
+                        config=AioConfig(signature_version="s3v4", s3={"addressing_style": "path"}),
+                    ))
+                    self._exit_stack = exit_stack
+        return self._client
+
+    async def put(self, key: str, chunks: AsyncIterable[bytes], content_type: Optional[str] = None) -> int:
+        client = await self.client()
+        extra = {"ContentType": content_type} if content_type else {}
+        buffer = bytearray()
+        upload_id = None
+        parts = []
+        size = 0
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                buffer += chunk
+                while len(buffer) >= self.part_size:
+                    if upload_id is None:
+                        upload_id = (await client.create_multipart_upload(Bucket=self.bucket, Key=key, **extra))["UploadId"]
+                    part, buffer = bytes(buffer[:self.part_size]), buffer[self.part_size:]
+                    response = await client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=len(parts) + 1, Body=part)
+                    parts.append({"PartNumber": len(parts) + 1, "ETag": response["ETag"]})
+            if upload_id is None:
+                await client.put_object(Bucket=self.bucket, Key=key, Body=bytes(buffer), **extra)
+                return size
+            if buffer:
+                response = await client.upload_part(Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=len(parts) + 1, Body=bytes(buffer))
+                parts.append({"PartNumber": len(parts) + 1, "ETag": response["ETag"]})
+            await client.complete_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts})
+        except BaseException:
+            if upload_id is not None:
+                await client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            raise
+        return size
+
+    async def get(self, key: str, start: int = 0, end: Optional[int] = None) -> AsyncIterator[bytes]:
+        client = await self.client()
+        extra = {"Range": f"bytes={start}-{'' if end is None else end}"} if start or end is not None else {}
+        try:
+            response = await client.get_object(Bucket=self.bucket, Key=key, **extra)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                raise FileNotFoundError(key)
+            raise
+        async with response["Body"] as body:
+            while chunk := await body.read(CHUNK_SIZE):
+                yield chunk
+
+    async def stat(self, key: str) -> Optional[ObjectInfo]:
+        client = await self.client()
+        try:
+            response = await client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                return None
+            raise
+        return ObjectInfo(response["ContentLength"], response["ETag"].strip('"'), response["LastModified"].timestamp())
+
+    async def move(self, source_key: str, key: str) -> None:
+        # The object is copied by the server, its bytes do not pass through the application.
+        client = await self.client()
+        try:
+            await client.copy_object(Bucket=self.bucket, Key=key, CopySource={"Bucket": self.bucket, "Key": source_key})
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                raise FileNotFoundError(source_key)
+            raise
+        await client.delete_object(Bucket=self.bucket, Key=source_key)
+
+    async def list_keys(self, prefix: str) -> list[str]:
+        client = await self.client()
+        keys = []
+        async for page in client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=prefix):
+            keys.extend(item["Key"] for item in page.get("Contents", []))
+        return keys
+
+    async def delete(self, keys: list[str]) -> None:
+        client = await self.client()
+        for start in range(0, len(keys), 1000):
+            objects = [{"Key": key} for key in keys[start:start + 1000]]
+            await client.delete_objects(Bucket=self.bucket, Delete={"Objects": objects, "Quiet": True})
+
+    async def presigned_url(self, key: str, expires_in: int, method: str = "GET") -> str:
+        client = await self.client()
+        operation = {"GET": "get_object", "PUT": "put_object"}[method.upper()]
+        return await client.generate_presigned_url(operation, Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=expires_in)
+
+    def public_url(self, key: str) -> str:
+        return f"{self.public_base_url}/{quote(key)}"
+
+    async def close(self) -> None:
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+            self._client = None
+            self._exit_stack = None
+
+
+def create_storage_backend(backend: str) -> StorageBackend:
+    """
+    Creates the storage backend selected in the settings.
+
+    :param backend: 'local' for a directory of the local disk, 's3' for an S3-compatible bucket, 'memory' for tests.
+    :type backend: str
+    :return: The storage backend.
+    :rtype: StorageBackend
+    """
+    if backend == "memory":
+        return MemoryStorageBackend(settings.storage_url, settings.secret_key or "memory")
+    if backend == "s3":
+        return S3StorageBackend(
+            bucket=settings.storage_s3_bucket,
+            endpoint_url=settings.storage_s3_endpoint_url,
+            access_key=settings.storage_s3_access_key,
+            secret_key=settings.storage_s3_secret_key,
+            region=settings.storage_s3_region,
+            public_url=settings.storage_s3_public_url,
+            part_size=settings.storage_part_size,
+        )
+    return LocalStorageBackend(settings.storage_local_root, settings.storage_url, settings.secret_key)
+
+
+storage_backend = create_storage_backend(settings.storage_backend)
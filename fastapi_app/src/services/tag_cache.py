@@ -0,0 +1,166 @@
+import asyncio
+import time
+from bisect import bisect_left, insort
+from typing import Iterable, Optional
+
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from fastapi_app.src.conf.config import settings
+from fastapi_app.src.database.models import Tag
+
+
+class TagCache:
+    """
+    Dictionary of all tags kept in the memory of a single worker.
+
+    The tag vocabulary is small and tags are never renamed or deleted, so the whole table is
+    loaded once and new tags are added as they are created. Names are also kept in a sorted
+    list of lowercase keys, so tags starting with a prefix are found with a binary search.
+    Tags created by other workers are found in the database on the first miss and the whole
+    dictionary is reloaded after ttl seconds.
+
+    :param ttl: Number of seconds after which the dictionary is reloaded from the database.
+    :type ttl: float
+    """
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._by_name = {}
+        self._by_key = {}
+        self._keys = []
+        self._loaded_at = None
+        self._lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    @staticmethod
+    def key(name: str) -> str:
+        return name.strip().lower()
+
+    def add(self, tags: Iterable[Tag]) -> None:
+        """
+        Adds tags to the dictionary, must be called only after the tags are committed.
+
+        :param tags: The tags.
+        :type tags: Iterable[Tag]
+        """
+        for tag in tags:
+            self._add(tag.id, tag.name)
+
+    def _add(self, id: int, name: str) -> None:
+        self._by_name[name] = id
+        key = self.key(name)
+        ids = self._by_key.get(key)
+        if ids is None:
+            insort(self._keys, key)
+            self._by_key[key] = (id,)
+        elif id not in ids:
+            self._by_key[key] = ids + (id,)
+
+    def clear(self) -> None:
+        """
+        Removes all tags, the dictionary is loaded again on the next use.
+        """
+        self._by_name = {}
+        self._by_key = {}
+        self._keys = []
+        self._loaded_at = None
+
+    async def reload(self, db: AsyncSession) -> None:
+        """
+        Replaces the dictionary with all tags from the database.
+
+        :param db: The database session.
+        :type db: AsyncSession
+        """
+        rows = (await db.execute(select(Tag.id, Tag.name))).all()
+        self.clear()
+        for id, name in rows:
+            self._add(id, name)
+        self._loaded_at = time.monotonic()
+        self.reloads += 1
+
+    async def ensure_loaded(self, db: AsyncSession) -> None:
+        """
+        Loads the dictionary if it was never loaded or it is older than ttl.
+
+        :param db: The database session.
+        :type db: AsyncSession
+        """
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return
+        async with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl:
+                await self.reload(db)
+
+    def get_id(self, name: str) -> Optional[int]:
+        """
+        Returns the id of the tag with exactly this name.
+
+        :param name: The name of the tag.
+        :type name: str
+        :return: The id of the tag or None if it is not cached.
+        :rtype: int | None
+        """
+        id = self._by_name.get(name)
+        if id is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return id
+
+    async def resolve(self, names: list[str], db: AsyncSession) -> dict[str, tuple[int, ...]]:
+        """
+        Finds the ids of tags by name (case-insensitive).
+
+        Only the names which are not cached are looked up in the database.
+
+        :param names: The names of tags.
+        :type names: list[str]
+        :param db: The database session.
+        :type db: AsyncSession
+        :return: The ids of the tags matching each name which exists, a name may match more tags differing in case.
+        :rtype: dict[str, tuple[int, ...]]
+        """
+        await self.ensure_loaded(db)
+        keys = {name: self.key(name) for name in names}
+        missing = [key for key in keys.values() if key not in self._by_key]
+        self.hits += len(keys) - len(missing)
+        if missing:
+            self.misses += len(missing)
+            rows = (await db.execute(select(Tag.id, Tag.name).filter(func.lower(Tag.name).in_(missing)))).all()
+            for id, name in rows:
+                self._add(id, name)
+        return {name: self._by_key[key] for name, key in keys.items() if key in self._by_key}
+
+    def autocomplete(self, prefix: str, limit: int = 10) -> list[str]:
+        """
+        Returns the names of tags starting with the prefix (case-insensitive), in alphabetical order.
+
+        :param prefix: The beginning of the name.
+        :type prefix: str
+        :param limit: The maximum number of names.
+        :type limit: int
+        :return: The lowercase names of tags.
+        :rtype: list[str]
+        """
+        prefix = self.key(prefix)
+        result = []
+        i = bisect_left(self._keys, prefix)
+        while i < len(self._keys) and len(result) < limit and self._keys[i].startswith(prefix):
+            result.append(self._keys[i])
+            i += 1
+        return result
+
+    def stats(self) -> dict:
+        """
+        Returns the counters of the dictionary.
+
+        :return: Hit, miss and reload counters and the number of tags.
+        :rtype: dict
+        """
+        return {"hits": self.hits, "misses": self.misses, "reloads": self.reloads, "size": len(self._by_name)}
+
+
+tag_cache = TagCache(settings.tag_cache_ttl)
@@ -0,0 +1,73 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class TokenCache:
+    """
+    Bounded LRU cache of JWT tokens whose signature was already verified.
+
+    Tokens are stored by their SHA-256 digest, so the cache never keeps the tokens themselves.
+    An entry is used only until the exp claim of its token, so an expired token is always
+    rejected by a fresh jwt.decode call.
+
+    :param max_size: The maximum number of cached tokens.
+    :type max_size: int
+    """
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        """
+        Returns the claims of a verified token.
+
+        :param token: The encoded token.
+        :type token: str
+        :return: The decoded claims, or None if the token is not cached or expired.
+        :rtype: Optional[dict]
+        """
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        payload, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return payload
+
+    def set(self, token: str, payload: dict) -> None:
+        """
+        Stores the claims of a verified token. Tokens without the exp claim are not cached.
+
+        :param token: The encoded token.
+        :type token: str
+        :param payload: The claims returned by jwt.decode.
+        :type payload: dict
+        """
+        expires_at = payload.get("exp")
+        if expires_at is None:
+            return
+        key = self._key(token)
+        self._entries[key] = (payload, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Removes all tokens from the cache.
+        """
+        self._entries.clear()
@@ -0,0 +1,342 @@
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+import msgpack
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from fastapi_app.src.database.models import User
+
+# Bump when the fields of UserPrincipal change, so old records are never decoded.
+SCHEMA_VERSION = 1
+INVALIDATION_CHANNEL = f"user-cache:v{SCHEMA_VERSION}:invalidate"
+# Stored in place of an invalidated user, so the user can not be cached again for a while.
+INVALIDATED = b"-"
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class UserPrincipal:
+    """
+    The part of a user which is needed to authorize requests and to render the current user.
+
+    :param id: User unique id in DB
+    :type id: int
+    :param username: Username
+    :type username: str
+    :param email: mail address of the user
+    :type email: str
+    :param role: user role: admin, moderator or standard user
+    :type role: str
+    :param created_at: the date of user creation
+    :type created_at: datetime
+    :param avatar: link to the image of avatar
+    :type avatar: str
+    """
+    id: int
+    username: str
+    email: str
+    role: str
+    created_at: Optional[datetime]
+    avatar: Optional[str]
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserPrincipal":
+        """
+        Copies the needed fields from a user loaded from the database.
+
+        :param user: The user object.
+        :type user: User
+        :return: The principal of the user.
+        :rtype: UserPrincipal
+        """
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            role=user.role,
+            created_at=user.created_at,
+            avatar=user.avatar,
+        )
+
+    def pack(self) -> bytes:
+        """
+        Encodes the principal as a msgpack array.
+
+        :return: The encoded principal.
+        :rtype: bytes
+        """
+        created_at = self.created_at.isoformat() if self.created_at else None
+        return msgpack.packb([self.id, self.username, self.email, self.role, created_at, self.avatar])
+
+    @classmethod
+    def unpack(cls, data: bytes) -> "UserPrincipal":
+        """
+        Decodes a principal encoded by pack.
+
+        :param data: The encoded principal.
+        :type data: bytes
+        :return: The decoded principal.
+        :rtype: UserPrincipal
+        """
+        id, username, email, role, created_at, avatar = msgpack.unpackb(data)
+        return cls(
+            id=id,
+            username=username,
+            email=email,
+            role=role,
+            created_at=datetime.fromisoformat(created_at) if created_at else None,
+            avatar=avatar,
+        )
+
+
+class UserCache(ABC):
+    """
+    Interface of a cache of authenticated users, keyed by email.
+    """
+    @abstractmethod
+    async def get(self, email: str) -> Optional[UserPrincipal]:
+        """
+        Returns the cached principal or None if the user is not cached.
+        """
+
+    @abstractmethod
+    async def set(self, principal: UserPrincipal) -> bool:
+        """
+        Stores the principal in the cache, unless the user is cached already or was invalidated recently.
+
+        Returns True if the principal was stored.
+        """
+
+    @abstractmethod
+    async def invalidate(self, email: str) -> None:
+        """
+        Removes the user from the cache, must be called whenever the user is changed or deleted.
+        """
+
+
+class RedisUserCache(UserCache):
+    """
+    User cache stored in Redis.
+
+    A Redis failure is treated as a cache miss, so requests fall back to the database.
+
+    An invalidated user is replaced by a marker instead of being removed, and a user is only
+    stored when the key is empty. A request which read the user from the database before the
+    change can not cache the old version over the marker, so it can not live for the whole ttl.
+
+    :param redis: The asynchronous Redis client.
+    :type redis: Redis
+    :param ttl: Number of seconds a user is kept in the cache.
+    :type ttl: int
+    :param invalidation_ttl: Number of seconds an invalidated user can not be cached again.
+    :type invalidation_ttl: int
+    """
+    def __init__(self, redis: Redis, ttl: int, invalidation_ttl: int = 30):
+        self.redis = redis
+        self.ttl = ttl
+        self.invalidation_ttl = invalidation_ttl
+
+    @staticmethod
+    def key(email: str) -> str:
+        return f"user:v{SCHEMA_VERSION}:{email}"
+
+    async def get(self, email: str) -> Optional[UserPrincipal]:
+        try:
+            data = await self.redis.get(self.key(email))
+        except RedisError:
+            logger.warning("Could not read user %s from the Redis cache", email, exc_info=True)
+            return None
+        if data is None or data == INVALIDATED:
+            return None
+        try:
+            return UserPrincipal.unpack(data)
+        except (ValueError, TypeError, msgpack.UnpackException):
+            return None
+
+    async def set(self, principal: UserPrincipal) -> bool:
+        try:
+            return bool(await self.redis.set(self.key(principal.email), principal.pack(), ex=self.ttl, nx=True))
+        except RedisError:
+            logger.warning("Could not store user %s in the Redis cache", principal.email, exc_info=True)
+            # Without Redis there are no invalidation markers, the local cache of the worker is still used.
+            return True
+
+    async def invalidate(self, email: str) -> None:
+        try:
+            await self.redis.set(self.key(email), INVALIDATED, ex=self.invalidation_ttl)
+        except RedisError:
+            logger.warning("Could not remove user %s from the Redis cache", email, exc_info=True)
+
+
+class LocalUserCache(UserCache):
+    """
+    Bounded LRU cache kept in the memory of a single worker.
+
+    Entries expire after a short ttl, so a missed invalidation message can only keep a stale
+    user for a few seconds.
+
+    :param max_size: The maximum number of cached users.
+    :type max_size: int
+    :param ttl: Number of seconds a user is kept in the cache.
+    :type ttl: float
+    """
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get(self, email: str) -> Optional[UserPrincipal]:
+        entry = self._entries.get(email)
+        if entry is None:
+            self.misses += 1
+            return None
+        principal, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[email]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(email)
+        self.hits += 1
+        return principal
+
+    async def set(self, principal: UserPrincipal) -> bool:
+        self._entries[principal.email] = (principal, time.monotonic() + self.ttl)
+        self._entries.move_to_end(principal.email)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return True
+
+    async def invalidate(self, email: str) -> None:
+        self._entries.pop(email, None)
+
+    def clear(self) -> None:
+        """
+        Removes all users from the cache.
+        """
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TieredUserCache(UserCache):
+    """
+    Local cache of the worker in front of a shared cache.
+
+    Invalidations are published on a Redis channel and every worker listening on it drops the
+    user from its local cache, so role changes and bans reach all workers without waiting for
+    the local ttl.
+
+    :param local: The cache of the worker.
+    :type local: LocalUserCache
+    :param remote: The cache shared by all workers.
+    :type remote: UserCache
+    :param redis: The asynchronous Redis client used for invalidation messages.
+    :type redis: Redis
+    """
+    def __init__(self, local: LocalUserCache, remote: UserCache, redis: Redis):
+        self.local = local
+        self.remote = remote
+        self.redis = redis
+        self.remote_hits = 0
+        self.remote_misses = 0
+        self.invalidations_received = 0
+        self._listener = None
+
+    async def get(self, email: str) -> Optional[UserPrincipal]:
+        principal = await self.local.get(email)
+        if principal is not None:
+            return principal
+        principal = await self.remote.get(email)
+        if principal is None:
+            self.remote_misses += 1
+            return None
+        self.remote_hits += 1
+        await self.local.set(principal)
+        return principal
+
+    async def set(self, principal: UserPrincipal) -> bool:
+        # A principal rejected by the shared cache may be older than the cached or invalidated one.
+        if not await self.remote.set(principal):
+            return False
+        return await self.local.set(principal)
+
+    async def invalidate(self, email: str) -> None:
+        await self.local.invalidate(email)
+        await self.remote.invalidate(email)
+        try:
+            await self.redis.publish(INVALIDATION_CHANNEL, email)
+        except RedisError:
+            # The other workers drop the user when their local ttl runs out.
+            logger.warning("Could not publish the invalidation of user %s", email, exc_info=True)
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Messages sent while we were not subscribed are lost, so start from scratch.
+                self.local.clear()
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    email = message["data"]
+                    if isinstance(email, bytes):
+                        email = email.decode()
+                    self.invalidations_received += 1
+                    await self.local.invalidate(email)
+            except RedisError:
+                logger.warning("Lost the subscription to user cache invalidations, retrying", exc_info=True)
+                self.local.clear()
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.close()
+
+    def start_listener(self):
+        """
+        Starts listening for invalidation messages from other workers.
+        """
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop_listener(self):
+        """
+        Stops listening for invalidation messages.
+        """
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    def stats(self) -> dict:
+        """
+        Returns the counters of both cache levels.
+
+        :return: Hit, miss, eviction and invalidation counters and the size of the local cache.
+        :rtype: dict
+        """
+        return {
+            "local_hits": self.local.hits,
+            "local_misses": self.local.misses,
+            "local_evictions": self.local.evictions,
+            "local_size": len(self.local),
+            "local_max_size": self.local.max_size,
+            "remote_hits": self.remote_hits,
+            "remote_misses": self.remote_misses,
+            "invalidations_received": self.invalidations_received,
+        }
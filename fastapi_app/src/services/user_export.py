@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+from datetime import datetime
+from typing import AsyncIterator
+
+from fastapi_app.src.conf.config import settings
+from fastapi_app.src.database.db import AsyncSessionLocal
+from fastapi_app.src.database.models import User
+from fastapi_app.src.repository.users import build_users_query, stream_users
+
+EXPORT_COLUMNS = (User.id, User.username, User.email, User.role, User.created_at, User.avatar, User.confirmed, User.photo_count)
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def encode_batch(rows, fields: list[str], export_format: str) -> str:
+    """
+    Encodes a batch of rows as lines of newline-delimited JSON or CSV.
+
+    :param rows: The rows, with values in the order of fields.
+    :type rows: Sequence[Sequence]
+    :param fields: The names of the values.
+    :type fields: list[str]
+    :param export_format: "ndjson" or "csv".
+    :type export_format: str
+    :return: The lines.
+    :rtype: str
+    """
+    rows = [[value.isoformat() if isinstance(value, datetime) else value for value in row] for row in rows]
+    if export_format == "ndjson":
+        return "".join(json.dumps(dict(zip(fields, row))) + "\n" for row in rows)
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def export_users(export_format: str, session_factory=AsyncSessionLocal, batch_size: int = None, **filters) -> AsyncIterator[str]:
+    """
+    Exports the users matching the filters, in ID order, as newline-delimited JSON or CSV with a header line.
+
+    The filters are checked at once, the users are read while the returned iterator is consumed,
+    batch_size rows at a time, in a session of their own, so the export can be streamed as a response.
+
+    :param export_format: "ndjson" or "csv".
+    :type export_format: str
+    :param session_factory: Creates database sessions.
+    :type session_factory: async_sessionmaker
+    :param batch_size: The number of users read at a time, settings.user_export_batch_size by default.
+    :type batch_size: int
+    :param filters: The filters accepted by build_users_query.
+    :return: The encoded users, one string per batch.
+    :rtype: AsyncIterator[str]
+    :raises HTTPException: If the filters are contradictory, raises a 400 error.
+    """
+    query = build_users_query(*EXPORT_COLUMNS, **filters)
+    return _export(query, export_format, session_factory, batch_size or settings.user_export_batch_size)
+
+
+async def _export(query, export_format: str, session_factory, batch_size: int) -> AsyncIterator[str]:
+    fields = [column.key for column in EXPORT_COLUMNS]
+    if export_format == "csv":
+        yield encode_batch([fields], fields, export_format)
+    async with session_factory() as db:
+        async for batch in stream_users(db, query, batch_size):
+            yield encode_batch(batch, fields, export_format)
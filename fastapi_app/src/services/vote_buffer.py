@@ -0,0 +1,253 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+
+from redis.asyncio import Redis
+from redis.exceptions import LockError, RedisError, ResponseError
+
+from fastapi_app.src.conf.config import settings
+from fastapi_app.src.database.db import AsyncSessionLocal
+from fastapi_app.src.repository.opinions import apply_votes
+
+PENDING_KEY = "votes:v1:pending"
+FLUSHING_KEY = "votes:v1:flushing"
+FLUSH_LOCK_KEY = "votes:v1:flush-lock"
+
+logger = logging.getLogger(__name__)
+
+
+class VoteStore(ABC):
+    """
+    Interface of a storage of votes waiting to be written to the database.
+
+    Only the latest vote of a user for a photo is kept. Votes taken for a flush stay in the store
+    until the flush is acknowledged, so a failed flush is retried with the same votes.
+    """
+    @abstractmethod
+    async def add(self, photo_id: int, user_id: int, vote: int) -> None:
+        """
+        Stores the vote, replacing the previous pending vote of the user for the photo.
+        """
+
+    @abstractmethod
+    async def take(self) -> dict[tuple[int, int], int]:
+        """
+        Returns the votes to flush, keyed by (photo_id, user_id).
+        """
+
+    @abstractmethod
+    async def ack(self) -> None:
+        """
+        Removes the votes returned by take, must be called after they are committed.
+        """
+
+    def lock(self, timeout: float):
+        """
+        Returns the lock which lets only one worker flush the votes at a time, or None if the store is not shared.
+
+        The lock expires after timeout seconds unless it is reacquired, which starts the timeout again.
+        """
+        return None
+
+
+class LocalVoteStore(VoteStore):
+    """
+    Vote store kept in the memory of a single worker, pending votes are lost when the worker stops.
+    """
+    def __init__(self):
+        self._pending = {}
+        self._flushing = {}
+
+    async def add(self, photo_id: int, user_id: int, vote: int) -> None:
+        self._pending[(photo_id, user_id)] = vote
+
+    async def take(self) -> dict[tuple[int, int], int]:
+        if not self._flushing:
+            self._flushing, self._pending = self._pending, {}
+        return dict(self._flushing)
+
+    async def ack(self) -> None:
+        self._flushing = {}
+
+    def __len__(self):
+        return len(self._pending) + len(self._flushing)
+
+
+class RedisVoteStore(VoteStore):
+    """
+    Vote store shared by all workers, pending votes are a Redis hash with a "photo_id:user_id" field per vote.
+
+    A flush renames the hash, so new votes are collected in a new hash while the old one is written
+    to the database.
+
+    :param redis: The asynchronous Redis client.
+    :type redis: Redis
+    """
+    def __init__(self, redis: Redis):
+        self.redis = redis
+
+    async def add(self, photo_id: int, user_id: int, vote: int) -> None:
+        await self.redis.hset(PENDING_KEY, f"{photo_id}:{user_id}", vote)
+
+    async def take(self) -> dict[tuple[int, int], int]:
+        # Votes of a flush which failed are flushed again before the new ones.
+        if not await self.redis.exists(FLUSHING_KEY):
+            try:
+                await self.redis.renamenx(PENDING_KEY, FLUSHING_KEY)
+            except ResponseError:
+                # There are no pending votes.
+                return {}
+        votes = {}
+        for field, vote in (await self.redis.hgetall(FLUSHING_KEY)).items():
+            field = field.decode() if isinstance(field, bytes) else field
+            photo_id, user_id = field.split(":")
+            votes[(int(photo_id), int(user_id))] = int(vote)
+        return votes
+
+    async def ack(self) -> None:
+        await self.redis.delete(FLUSHING_KEY)
+
+    def lock(self, timeout: float):
+        return self.redis.lock(FLUSH_LOCK_KEY, timeout=timeout, blocking=False)
+
+
+class VoteBuffer:
+    """
+    Collects votes and writes them to the database in batches.
+
+    Writing every vote at once makes all voters of a popular photo wait for the lock of its row in
+    the photos table. The buffer keeps the latest vote of each user and a background task writes
+    them every flush_interval seconds, updating the rating of each photo once per batch.
+    If the store is not available, the vote is written to the database at once.
+
+    :param store: The storage of pending votes.
+    :type store: VoteStore
+    :param session_factory: Creates database sessions for the flushes.
+    :type session_factory: async_sessionmaker
+    :param flush_interval: Number of seconds between flushes.
+    :type flush_interval: float
+    :param batch_size: The maximum number of votes written in one transaction.
+    :type batch_size: int
+    """
+    def __init__(self, store: VoteStore, session_factory, flush_interval: float, batch_size: int):
+        self.store = store
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.flushed = 0
+        self._task = None
+
+    async def add(self, photo_id: int, user_id: int, vote: int, db) -> None:
+        """
+        Adds the vote to the buffer.
+
+        :param photo_id: The ID of the photo.
+        :type photo_id: int
+        :param user_id: The ID of the user who votes.
+        :type user_id: int
+        :param vote: The number of stars.
+        :type vote: int
+        :param db: The database session used when the store is not available.
+        :type db: AsyncSession
+        """
+        try:
+            await self.store.add(photo_id, user_id, vote)
+        except RedisError:
+            logger.warning("Could not buffer the vote, writing it to the database", exc_info=True)
+            await apply_votes(db, {(photo_id, user_id): vote})
+
+    async def flush(self) -> int:
+        """
+        Writes all pending votes to the database.
+
+        :return: The number of saved votes.
+        :rtype: int
+        :raises LockError: If the lock expired during the flush, the votes are left to the worker which took it.
+        """
+        lock = self.store.lock(timeout=max(self.flush_interval * 10, 30))
+        if lock is not None and not await lock.acquire():
+            # Another worker is flushing.
+            return 0
+        try:
+            votes = await self.store.take()
+            items = sorted(votes.items())
+            saved = 0
+            for start in range(0, len(items), self.batch_size):
+                # Each batch gets the whole timeout. A worker which lost the lock stops before
+                # writing, so two workers never apply the same votes at the same time.
+                await self._extend(lock)
+                async with self.session_factory() as db:
+                    saved += await apply_votes(db, dict(items[start:start + self.batch_size]))
+            await self._extend(lock)
+            await self.store.ack()
+            self.flushed += saved
+            return saved
+        finally:
+            if lock is not None:
+                try:
+                    await lock.release()
+                except LockError:
+                    logger.warning("The vote flush lock expired before it was released", exc_info=True)
+
+    @staticmethod
+    async def _extend(lock) -> None:
+        if lock is not None:
+            await lock.reacquire()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.warning("Could not flush the votes, retrying at the next interval", exc_info=True)
+
+    def start(self):
+        """
+        Starts flushing the votes in the background.
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        Stops the background flushes and writes the votes which are still pending.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.warning("Could not flush the pending votes on shutdown", exc_info=True)
+
+
+def create_vote_store(backend: str) -> VoteStore:
+    """
+    Creates the vote store selected in the settings.
+
+    :param backend: 'redis' to share pending votes between workers, 'memory' to keep them in the worker.
+    :type backend: str
+    :return: The vote store.
+    :rtype: VoteStore
+    """
+    if backend == "memory":
+        return LocalVoteStore()
+    return RedisVoteStore(Redis(
+        host=settings.redis_host,
+        port=settings.redis_port,
+        password=settings.redis_password,
+        db=0,
+    ))
+
+
+vote_buffer = VoteBuffer(
+    create_vote_store(settings.vote_buffer_backend),
+    AsyncSessionLocal,
+    flush_interval=settings.vote_flush_interval,
+    batch_size=settings.vote_flush_batch_size,
+)
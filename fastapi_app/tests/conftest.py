@@ -1,11 +1,14 @@
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 from fastapi_app.main import app
 from fastapi_app.src.database.models import Base
-from fastapi_app.src.database.db import get_db
+from fastapi_app.src.database.db import get_async_db, SQLALCHEMY_ASYNC_DATABASE_URL
 from fastapi_app.src.conf.config import settings
 from fastapi_app.src.database.models import User
 
@@ -14,6 +17,9 @@ SQLALCHEMY_DATABASE_URL = settings.sqlalchemy_database_url
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(SQLALCHEMY_ASYNC_DATABASE_URL, poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 
 @pytest.fixture(scope="module")
 def session():
@@ -27,13 +33,11 @@ def session():
 
 @pytest.fixture(scope="module")
 def client(session):
-    def override_get_db():
-        try:
-            yield session
-        finally:
-            session.close()
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
 
-    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
 
     yield TestClient(app)
     
@@ -55,3 +59,77 @@ def create_test_user(session, user):
     session.refresh(db_user)
     return db_user
 
+
+class FakeResult:
+    """
+    Result of a FakeSession statement.
+    """
+    def __init__(self, rows, batch_size=None):
+        self.rows = list(rows)
+        self.batch_size = batch_size
+
+    def all(self):
+        return self.rows
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def one(self):
+        return self.rows[0]
+
+    async def partitions(self):
+        for start in range(0, len(self.rows), self.batch_size):
+            yield self.rows[start:start + self.batch_size]
+
+
+class FakeSession:
+    """
+    Database session which records the statements compiled for PostgreSQL and answers each one
+    with the rows returned by answer(stmt, params), or with no rows.
+    """
+    def __init__(self, answer=None):
+        self.answer = answer or (lambda stmt, params: [])
+        self.statements = []
+        self.params = []
+        self.commits = 0
+
+    def run(self, stmt, batch_size=None):
+        compiled = stmt.compile(dialect=postgresql.dialect())
+        self.statements.append(str(compiled))
+        self.params.append(compiled.params)
+        return FakeResult(self.answer(stmt, compiled.params), batch_size)
+
+    async def execute(self, stmt):
+        return self.run(stmt)
+
+    async def scalars(self, stmt):
+        return self.run(stmt)
+
+    async def scalar(self, stmt):
+        return self.run(stmt).first()
+
+    async def stream(self, stmt):
+        return self.run(stmt, stmt.get_execution_options()["yield_per"])
+
+    async def merge(self, instance, load=True):
+        return instance
+
+    async def commit(self):
+        self.commits += 1
+        self.statements.append("COMMIT")
+        self.params.append({})
+
+    async def rollback(self):
+        self.statements.append("ROLLBACK")
+        self.params.append({})
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_session():
+    return FakeSession
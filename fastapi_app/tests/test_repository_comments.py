@@ -0,0 +1,80 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+
+from fastapi_app.src.database.models import Comment
+from fastapi_app.src.repository.comments import build_comment_delete_statement, build_photo_comments_query, get_photo_comments, update_comment
+from fastapi_app.src.repository.pagination import encode_cursor
+from fastapi_app.src.schemas import CommentUpdate
+
+
+def first_query_answer(rows):
+    """
+    Answers the comment query with rows and any other query with nothing.
+    """
+    answers = iter([rows])
+    return lambda stmt, params: next(answers, [])
+
+
+def test_authors_are_joined_in_the_same_query():
+    query, keys = build_photo_comments_query(5)
+    sql = str(query.compile(dialect=postgresql.dialect()))
+
+    assert "LEFT OUTER JOIN users AS users_1 ON users_1.id = comments.user_id" in sql
+    assert "users_1.username" in sql and "users_1.password" not in sql
+    assert "comments.photo_id = %(photo_id_1)s" in sql
+    assert keys == (Comment.created_at, Comment.id)
+
+
+@pytest.mark.asyncio
+async def test_page_of_comments_costs_one_query(fake_session):
+    created_at = datetime(2024, 7, 1, 12)
+    rows = [(Comment(id=id, photo_id=5), created_at, id) for id in (9, 8, 7)]
+    db = fake_session(first_query_answer(rows))
+
+    page = await get_photo_comments(db, photo_id=5, cursor=None, limit=2)
+
+    assert [comment.id for comment in page["items"]] == [9, 8]
+    assert page["next_cursor"] == encode_cursor([created_at, 8])
+    assert len(db.statements) == 1
+    assert "ORDER BY comments.created_at DESC, comments.id DESC" in db.statements[0]
+
+
+@pytest.mark.asyncio
+async def test_missing_photo_is_not_found(fake_session):
+    db = fake_session()
+
+    with pytest.raises(HTTPException) as exc_info:
+        await get_photo_comments(db, photo_id=5, cursor=None, limit=20)
+
+    assert exc_info.value.status_code == 404
+    assert len(db.statements) == 2
+
+
+@pytest.mark.asyncio
+async def test_update_comment_checks_author_in_one_statement(fake_session):
+    db = fake_session(first_query_answer([Comment(id=4, user_id=2, content="new")]))
+
+    comment = await update_comment(db, CommentUpdate(content="new"), comment_id=4, user_id=2)
+
+    assert comment.content == "new"
+    assert len(db.statements) == 2 and db.statements[1] == "COMMIT"
+    assert "WHERE comments.id = %(id_1)s::INTEGER AND comments.user_id = %(user_id_1)s::INTEGER RETURNING" in db.statements[0]
+
+
+@pytest.mark.asyncio
+async def test_update_comment_of_another_user_is_not_committed(fake_session):
+    db = fake_session()
+
+    assert await update_comment(db, CommentUpdate(content="new"), comment_id=4, user_id=3) is None
+    assert "COMMIT" not in db.statements
+
+
+def test_delete_comment_counts_down_photo_comments_in_the_same_statement():
+    sql = str(build_comment_delete_statement(4).compile(dialect=postgresql.dialect()))
+
+    assert sql.startswith("WITH deleted_comment AS \n(DELETE FROM comments WHERE comments.id =")
+    assert "UPDATE photos SET updated_at=photos.updated_at, comment_count=(photos.comment_count -" in sql
+    assert "FROM deleted_comment WHERE photos.id = deleted_comment.photo_id" in sql
@@ -0,0 +1,59 @@
+import pytest
+
+from fastapi_app.src.repository.counters import change_comment_count, change_photo_count, reconcile_batch
+from fastapi_app.src.services.counter_reconciliation import reconcile_counters
+
+
+def table_answer(ids=(), fixed=()):
+    """
+    Answers like a table with rows with the given ids, whose update fixes the ids in fixed.
+    """
+    def answer(stmt, params):
+        if stmt.is_update and stmt._returning:
+            return [(id,) for id in fixed if params["id_1"] < id <= params["id_2"]]
+        if stmt.is_select:
+            after_id = next(value for key, value in params.items() if key.startswith("id_"))
+            limit = next(value for key, value in params.items() if key.startswith("param_"))
+            return [id for id in ids if id > after_id][:limit]
+        return []
+    return answer
+
+
+@pytest.mark.asyncio
+async def test_counters_are_changed_by_the_database(fake_session):
+    db = fake_session()
+
+    await change_photo_count(db, 3, 1)
+    await change_comment_count(db, 5, -1)
+    await change_photo_count(db, None, 1)
+
+    assert len(db.statements) == 2
+    assert "SET photo_count=(users.photo_count + %(photo_count_1)s::INTEGER) WHERE users.id = %(id_1)s" in db.statements[0]
+    assert "updated_at=photos.updated_at, comment_count=(photos.comment_count + %(comment_count_1)s::INTEGER)" in db.statements[1]
+    assert db.commits == 0
+
+
+@pytest.mark.asyncio
+async def test_reconcile_batch_locks_rows_and_fixes_drift(fake_session):
+    db = fake_session(table_answer(ids=[1, 2, 5, 9], fixed=[2]))
+
+    assert await reconcile_batch(db, "users.photo_count", 0, 3) == (5, 1)
+
+    assert "FOR UPDATE" in db.statements[0]
+    assert "users.photo_count != (SELECT count(*) AS count_1 \nFROM photos \nWHERE photos.user_id = users.id)" in db.statements[1]
+    assert db.commits == 1
+
+
+@pytest.mark.asyncio
+async def test_reconcile_counters_walks_all_batches(fake_session):
+    sessions = []
+
+    def session_factory():
+        sessions.append(fake_session(table_answer(ids=[1, 2, 5, 9], fixed=[2, 9])))
+        return sessions[-1]
+
+    fixed = await reconcile_counters(session_factory, batch_size=3, counters=["photos.comment_count"])
+
+    assert fixed == {"photos.comment_count": 2}
+    assert len(sessions) == 3
+    assert "comments.photo_id = photos.id" in sessions[0].statements[1]
@@ -0,0 +1,22 @@
+from sqlalchemy.dialects import postgresql
+
+from fastapi_app.src.repository.opinions import update_rating
+
+
+def test_update_rating_computes_aggregates_in_one_statement():
+    compiled = update_rating(photo_id=7, sum_delta=4, count_delta=1).compile(dialect=postgresql.dialect())
+    sql = str(compiled)
+
+    assert sql.startswith("UPDATE photos SET")
+    assert "rating_sum=(photos.rating_sum +" in sql
+    assert "rating_count=(photos.rating_count +" in sql
+    assert "THEN CAST(photos.rating_sum +" in sql and "AS FLOAT) / CAST(CAST(photos.rating_count +" in sql
+    assert "updated_at=photos.updated_at" in sql
+    assert "RETURNING photos.id AS photo_id, photos.rating, photos.rating_sum, photos.rating_count" in sql
+    assert compiled.params["rating_sum_1"] == 4 and compiled.params["rating_count_1"] == 1 and compiled.params["id_1"] == 7
+
+
+def test_changed_vote_keeps_count():
+    compiled = update_rating(photo_id=7, sum_delta=-2, count_delta=0).compile(dialect=postgresql.dialect())
+
+    assert -2 in compiled.params.values()
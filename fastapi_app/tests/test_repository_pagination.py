@@ -0,0 +1,29 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import Float, type_coerce, literal_column
+
+from fastapi_app.src.database.models import Photo
+from fastapi_app.src.repository.pagination import encode_cursor, decode_cursor
+
+
+def test_cursor_round_trip():
+    keys = (Photo.created_at, Photo.id)
+    values = [datetime(2024, 7, 25, 17, 21, 59, 680060), 42]
+
+    assert decode_cursor(encode_cursor(values), keys) == values
+
+
+def test_cursor_round_trip_float():
+    keys = (type_coerce(literal_column("0.5"), Float), Photo.id)
+    values = [0.0607927106320858, 7]
+
+    assert decode_cursor(encode_cursor(values), keys) == values
+
+
+@pytest.mark.parametrize("cursor", ["not a cursor", encode_cursor([1]), encode_cursor(["x", 1])])
+def test_invalid_cursor(cursor):
+    with pytest.raises(HTTPException) as exc_info:
+        decode_cursor(cursor, (Photo.created_at, Photo.id))
+    assert exc_info.value.status_code == 400
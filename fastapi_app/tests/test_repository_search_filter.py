@@ -0,0 +1,65 @@
+from datetime import date, datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+
+from fastapi_app.src.database.models import Photo
+from fastapi_app.src.repository import search_filter
+from fastapi_app.src.repository.search_filter import build_photo_search_query
+
+
+def compile_query(query):
+    compiled = query.compile(dialect=postgresql.dialect(), compile_kwargs={"render_postcompile": True})
+    return str(compiled), compiled.params
+
+
+def test_all_filters_in_one_query():
+    query, keys = build_photo_search_query(
+        description="sea", tag_ids=[(1,), (2, 7)], rating_min=2, rating_max=5,
+        created_from=date(2024, 1, 1), created_to=date(2024, 1, 31), user_id=3, sort_by="relevance",
+    )
+    sql, params = compile_query(query)
+    values = list(params.values())
+
+    assert "description_tsv @@ websearch_to_tsquery" in sql
+    assert "JOIN photo_tag AS photo_tag_1 ON photo_tag_1.photo_id = photos.id AND photo_tag_1.tag_id =" in sql
+    assert "SELECT DISTINCT photo_tag.photo_id" in sql and "tags" not in sql
+    assert "photos.rating >=" in sql and "photos.rating <=" in sql
+    assert datetime(2024, 1, 1) in values and datetime(2024, 2, 1) in values
+    assert "photos.user_id =" in sql and 3 in values
+    assert keys[-1] is Photo.id
+
+
+def test_any_tag_joins_once():
+    query, keys = build_photo_search_query(tag_ids=[(1,), (2, 7)], match_all_tags=False)
+    sql, params = compile_query(query)
+
+    assert sql.count("JOIN") == 1 and sql.count("photo_tag.tag_id IN") == 1
+    assert sorted(value for value in params.values() if isinstance(value, int)) == [1, 2, 7]
+    assert keys == (Photo.created_at, Photo.id)
+
+
+@pytest.mark.parametrize("filters", [
+    {"rating_min": 5, "rating_max": 1},
+    {"created_from": date(2024, 2, 1), "created_to": date(2024, 1, 1)},
+    {"created_at": "2024-01-01", "created_from": date(2024, 1, 1)},
+    {"created_at": "01.01.2024"},
+    {"sort_by": "relevance"},
+    {"sort_by": "name"},
+])
+def test_invalid_filters(filters):
+    with pytest.raises(HTTPException) as exc_info:
+        build_photo_search_query(**filters)
+    assert exc_info.value.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_description_and_tag_searches_return_empty_pages(monkeypatch):
+    async def no_photos(db, **kwargs):
+        return {"items": [], "next_cursor": None}
+
+    monkeypatch.setattr(search_filter, "search_photos", no_photos)
+
+    assert await search_filter.get_description(None, "sea") == {"items": [], "next_cursor": None}
+    assert await search_filter.get_tag(None, "sea") == {"items": [], "next_cursor": None}
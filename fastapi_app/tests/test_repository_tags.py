@@ -0,0 +1,89 @@
+import pytest
+
+from fastapi_app.src.database.models import Tag
+from fastapi_app.src.repository.tags import create_tags, normalize_tag_names
+from fastapi_app.src.services.tag_cache import tag_cache
+
+
+def tags_answer(existing):
+    """
+    Answers like a database already holding the tags in existing, keyed by name.
+    """
+    def answer(stmt, params):
+        if stmt.is_insert:
+            names = [value for key, value in params.items() if key.startswith("name")]
+            return [Tag(name=name) for name in names if name not in existing]
+        names = next(value for value in params.values() if isinstance(value, list))
+        return [existing[name] for name in names if name in existing]
+    return answer
+
+
+def existing_tags(*names):
+    return {name: Tag(id=i, name=name) for i, name in enumerate(names, start=1)}
+
+
+@pytest.fixture(autouse=True)
+def clear_tag_cache():
+    tag_cache.clear()
+    yield
+    tag_cache.clear()
+
+
+def test_normalize_tag_names():
+    assert normalize_tag_names([" Sea", "sun", "", "SEA", "  ", "beach "]) == ["sea", "sun", "beach"]
+
+
+@pytest.mark.asyncio
+async def test_create_tags_inserts_all_names_at_once(fake_session):
+    db = fake_session(tags_answer(existing_tags()))
+
+    tags = await create_tags(["Sun", "sea", "sun"], db)
+
+    assert [tag.name for tag in tags] == ["sun", "sea"]
+    assert len(db.statements) == 1
+    assert "ON CONFLICT (name) DO NOTHING RETURNING" in db.statements[0]
+    assert db.commits == 0
+
+
+@pytest.mark.asyncio
+async def test_create_tags_loads_existing_names_with_one_select(fake_session):
+    existing = existing_tags("sea", "beach")
+    db = fake_session(tags_answer(existing))
+
+    tags = await create_tags(["beach", "sun", "sea"], db)
+
+    assert [tag.name for tag in tags] == ["beach", "sun", "sea"]
+    assert tags[0] is existing["beach"] and tags[2] is existing["sea"]
+    assert len(db.statements) == 2
+    assert "tags.name = ANY" in db.statements[1]
+    assert db.commits == 0
+
+
+@pytest.mark.asyncio
+async def test_create_tags_without_names_does_not_query(fake_session):
+    db = fake_session()
+
+    assert await create_tags(["", " "], db) == []
+    assert await create_tags(None, db) is None
+    assert db.statements == []
+
+
+@pytest.mark.asyncio
+async def test_create_tags_uses_cached_tags_without_query(fake_session):
+    tag_cache.add([Tag(id=3, name="sea"), Tag(id=4, name="sun")])
+    db = fake_session()
+
+    tags = await create_tags(["SEA", "sun"], db)
+
+    assert [(tag.id, tag.name) for tag in tags] == [(3, "sea"), (4, "sun")]
+    assert db.statements == []
+
+
+@pytest.mark.asyncio
+async def test_create_tags_caches_only_committed_tags(fake_session):
+    db = fake_session(tags_answer(existing_tags("sea")))
+
+    await create_tags(["sea", "sun"], db)
+
+    assert tag_cache.get_id("sea") == 1
+    assert tag_cache.get_id("sun") is None
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from fastapi_app.src.database.db import get_async_db
+from fastapi_app.src.routes import photos
+from fastapi_app.src.services.storage_backends import LocalStorageBackend
+
+KEY = "uploads/ab/cd/" + "abcd" + "0" * 60
+
+
+@pytest.fixture()
+def image_client(tmp_path, monkeypatch, fake_session):
+    """
+    Serves the photo images of a photo whose original is stored under KEY, answering the query with row.
+    """
+    backend = LocalStorageBackend(str(tmp_path), "/api/storage", "secret")
+    (tmp_path / "uploads" / "ab" / "cd").mkdir(parents=True)
+    (tmp_path / KEY).write_bytes(b"\x89PNG\r\n\x1a\n")
+    monkeypatch.setattr(photos, "storage_backend", backend)
+    app = FastAPI()
+    app.include_router(photos.router)
+    row = SimpleNamespace(url=KEY, variants=[], content_hash="abcd" + "0" * 60, content_type="image/png")
+
+    async def override_get_async_db():
+        yield fake_session(lambda stmt, params: [row])
+
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    return TestClient(app), row
+
+
+def test_original_is_served_with_recorded_media_type(image_client):
+    client, row = image_client
+
+    response = client.get("/photos/photos/1/image")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+
+
+def test_original_without_recorded_media_type_is_served_as_bytes(image_client):
+    client, row = image_client
+    row.content_type = None
+
+    response = client.get("/photos/photos/1/image")
+
+    assert response.headers["content-type"] == "application/octet-stream"
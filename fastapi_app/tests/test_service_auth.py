@@ -1,8 +1,12 @@
+import time
+
 import pytest
 from unittest.mock import MagicMock, patch
 from fastapi import HTTPException, status
+from jose import jwt
 
 from fastapi_app.src.services.auth import Auth
+from fastapi_app.src.services.token_cache import TokenCache
 from fastapi_app.src.database.models import User
 
 class User:
@@ -87,6 +91,34 @@ async def test_check_role(mock_auth, mock_db, mock_redis):
     assert exc_info.value.detail == "Operation not permitted"
 
 
+@pytest.mark.asyncio
+async def test_decode_token_uses_cache(mock_auth):
+    mock_auth.token_cache.clear()
+    token = await mock_auth.create_access_token({"sub": "test@example.com"}, 3600)
+
+    with patch("fastapi_app.src.services.auth.jwt.decode", wraps=jwt.decode) as mock_decode:
+        first = mock_auth.decode_token(token)
+        second = mock_auth.decode_token(token)
+
+    assert first == second
+    assert first["sub"] == "test@example.com"
+    mock_decode.assert_called_once()
+
+
+def test_token_cache_respects_exp():
+    cache = TokenCache(max_size=1)
+
+    cache.set("expired", {"sub": "a", "exp": time.time() - 1})
+    cache.set("without_exp", {"sub": "b"})
+    assert cache.get("expired") is None
+    assert cache.get("without_exp") is None
+
+    cache.set("first", {"sub": "c", "exp": time.time() + 60})
+    cache.set("second", {"sub": "d", "exp": time.time() + 60})
+    assert cache.get("first") is None
+    assert cache.get("second")["sub"] == "d"
+
+
 if __name__ == "__main__":
     pytest.main()
 
@@ -0,0 +1,80 @@
+from datetime import date
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+
+from fastapi_app.src.repository.comments import build_comments_bulk_delete_statement
+from fastapi_app.src.schemas import CommentModeration
+from fastapi_app.src.services.comment_moderation import check_criteria, delete_comments
+
+
+class FakeDatabase:
+    """
+    Deletes the comments with the given ids, keeps every chunk and the sessions.
+    """
+    def __init__(self, ids, session_class):
+        self.ids = sorted(ids)
+        self.session_class = session_class
+        self.chunks = []
+        self.sessions = []
+
+    def delete_chunk(self, stmt, params):
+        after_id = params["id_1"]
+        limit = next(value for key, value in params.items() if key.startswith("param_"))
+        requested = params.get("id_2")
+        chunk = [id for id in self.ids if id > after_id and (requested is None or id in requested)][:limit]
+        self.ids = [id for id in self.ids if id not in chunk]
+        self.chunks.append(chunk)
+        return [(len(chunk), chunk[-1] if chunk else None)]
+
+    def session(self):
+        self.sessions.append(self.session_class(self.delete_chunk))
+        return self.sessions[-1]
+
+    @property
+    def commits(self):
+        return sum(session.commits for session in self.sessions)
+
+
+def test_bulk_delete_statement_counts_down_photos():
+    criteria = CommentModeration(user_id=3, created_from=date(2026, 1, 1), created_to=date(2026, 1, 31))
+
+    sql = str(build_comments_bulk_delete_statement(criteria, 10, 500).compile(dialect=postgresql.dialect()))
+
+    assert "DELETE FROM comments WHERE comments.id IN (SELECT comments.id" in sql
+    assert "comments.id > %(id_1)s::INTEGER AND comments.user_id = %(user_id_1)s::INTEGER" in sql
+    assert "comments.created_at < %(created_at_2)s::TIMESTAMP WITHOUT TIME ZONE ORDER BY comments.id" in sql
+    assert "UPDATE photos SET updated_at=photos.updated_at, comment_count=(photos.comment_count - anon_1.deleted)" in sql
+    assert sql.endswith("SELECT count(*) AS count_1, max(deleted_comments.id) AS max_1 \nFROM deleted_comments")
+
+
+def test_check_criteria_rejects_empty_and_reversed_criteria():
+    with pytest.raises(HTTPException) as e:
+        check_criteria(CommentModeration())
+    assert e.value.status_code == 400
+    with pytest.raises(HTTPException):
+        check_criteria(CommentModeration(created_from=date(2026, 2, 1), created_to=date(2026, 1, 1)))
+    check_criteria(CommentModeration(comment_ids=[]))
+
+
+@pytest.mark.asyncio
+async def test_delete_comments_by_criteria_in_chunks(fake_session):
+    database = FakeDatabase(range(1, 8), fake_session)
+
+    progress = [item async for item in delete_comments(CommentModeration(photo_id=1), database.session, chunk_size=3)]
+
+    assert progress == [{"deleted": 3}, {"deleted": 6}, {"deleted": 7}, {"deleted": 7, "done": True}]
+    assert database.chunks == [[1, 2, 3], [4, 5, 6], [7], []]
+    assert database.commits == 4
+
+
+@pytest.mark.asyncio
+async def test_delete_comments_by_ids_in_sorted_chunks(fake_session):
+    database = FakeDatabase([1, 2, 4, 5, 9], fake_session)
+
+    progress = [item async for item in delete_comments(CommentModeration(comment_ids=[9, 5, 3, 1, 5]), database.session, chunk_size=2)]
+
+    assert database.chunks == [[1], [5, 9]]
+    assert progress[-1] == {"deleted": 3, "done": True}
+    assert progress[0] == {"deleted": 1, "checked": 2, "requested": 4}
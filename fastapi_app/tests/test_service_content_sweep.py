@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+from fastapi_app.src.services.content_sweep import sweep_orphaned_content, sweep_staged_uploads
+from fastapi_app.src.services.storage import content_path
+from fastapi_app.src.services.storage_backends import MemoryStorageBackend
+
+USED = "ab" * 32
+ORPHANED = "cd" * 32
+
+
+def used_answer(used):
+    """
+    Answers like a database whose photos use the content hashes in used.
+    """
+    def answer(stmt, params):
+        if "content_hash_1" in params:
+            return [content_hash for content_hash in params["content_hash_1"] if content_hash in used]
+        if stmt.is_select and "count" in str(stmt):
+            return [0]
+        return []
+    return answer
+
+
+async def put(backend, key):
+    async def chunks():
+        yield b"data"
+    await backend.put(key, chunks())
+
+
+@pytest.mark.asyncio
+async def test_sweep_removes_only_unused_content(fake_session):
+    backend = MemoryStorageBackend()
+    keys = [content_path(USED), content_path(ORPHANED), f"{content_path(ORPHANED)}_thumb.webp", "uploads/legacy.jpg"]
+    for key in keys:
+        await put(backend, key)
+    await put(backend, "avatars/1/abc.webp")
+
+    removed = await sweep_orphaned_content(lambda: fake_session(used_answer({USED})), backend, batch_size=1)
+
+    assert removed == 1
+    assert await backend.list_keys("") == sorted(["avatars/1/abc.webp", content_path(USED), "uploads/legacy.jpg"])
+
+
+@pytest.mark.asyncio
+async def test_sweep_removes_only_stale_staged_uploads():
+    backend = MemoryStorageBackend()
+    await put(backend, "staging/old")
+    await put(backend, "staging/new")
+    backend.objects["staging/old"] = (b"data", time.time() - 7200)
+
+    assert await sweep_staged_uploads(backend, max_age=3600) == 1
+    assert await backend.list_keys("staging/") == ["staging/new"]
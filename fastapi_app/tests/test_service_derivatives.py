@@ -0,0 +1,62 @@
+import os
+
+from PIL import Image
+
+from fastapi_app.src.services.derivatives import choose_variant, render_avatar, render_variants
+
+
+def test_render_variants_skips_sizes_larger_than_original(tmp_path):
+    source = tmp_path / "photo.jpg"
+    Image.new("RGB", (800, 400), "red").save(source, "JPEG")
+
+    variants = render_variants(str(source), {"medium": 400, "large": 1000, "thumb": 200}, quality=80)
+
+    assert [(v["name"], v["width"], v["height"], v["format"]) for v in variants] == [
+        ("thumb", 200, 100, "webp"),
+        ("medium", 400, 200, "webp"),
+        ("original", 800, 400, "jpeg"),
+    ]
+    assert variants[0]["url"] == str(tmp_path / "photo_thumb.webp")
+    assert os.path.getsize(variants[0]["url"]) < os.path.getsize(source)
+    with Image.open(variants[1]["url"]) as image:
+        assert image.format == "WEBP" and image.size == (400, 200)
+
+
+def test_render_variants_keeps_transparency(tmp_path):
+    source = tmp_path / "logo.png"
+    Image.new("LA", (600, 600), (0, 0)).save(source, "PNG")
+
+    variants = render_variants(str(source), {"thumb": 100}, quality=80)
+
+    with Image.open(variants[0]["url"]) as image:
+        assert image.mode == "RGBA"
+
+
+def test_render_avatar_crops_middle_square(tmp_path):
+    source = tmp_path / "upload"
+    image = Image.new("RGB", (900, 300), "red")
+    image.paste((0, 0, 255), (300, 0, 600, 300))
+    image.save(source, "PNG")
+
+    path = render_avatar(str(source), 250)
+
+    assert path == str(tmp_path / "upload_avatar.webp")
+    with Image.open(path) as avatar:
+        assert avatar.size == (250, 250)
+        red, green, blue = avatar.convert("RGB").getpixel((5, 125))
+        assert blue > 200 and red < 50
+
+
+def test_choose_variant():
+    variants = [
+        {"name": "thumb", "width": 320},
+        {"name": "original", "width": 3000},
+        {"name": "medium", "width": 1280},
+    ]
+
+    assert choose_variant(variants, 100)["name"] == "thumb"
+    assert choose_variant(variants, 320)["name"] == "thumb"
+    assert choose_variant(variants, 321)["name"] == "medium"
+    assert choose_variant(variants, 5000)["name"] == "original"
+    assert choose_variant(variants, None)["name"] == "original"
+    assert choose_variant([], 100) is None
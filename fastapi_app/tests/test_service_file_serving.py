@@ -0,0 +1,92 @@
+import hashlib
+import os
+from email.utils import formatdate
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from fastapi_app.src.services.file_serving import RangeNotSatisfiable, file_response, parse_range
+
+CONTENT = bytes(range(256)) * 2048
+
+
+@pytest.fixture()
+def photo_client(tmp_path):
+    path = tmp_path / "photo.jpg"
+    path.write_bytes(CONTENT)
+    app = FastAPI()
+
+    @app.get("/photo")
+    async def read_photo(request: Request):
+        return await file_response(request, str(path), "image/jpeg", max_age=3600)
+
+    return TestClient(app), path
+
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=50-500", 100) == (50, 99)
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    assert parse_range("items=0-1", 100) is None
+    assert parse_range("bytes=9-0", 100) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=100-", 100)
+
+
+def test_full_download_has_cache_headers(photo_client):
+    client, path = photo_client
+
+    response = client.get("/photo")
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["etag"] == f'"{hashlib.sha256(CONTENT).hexdigest()}"'
+    assert response.headers["cache-control"] == "public, max-age=3600"
+    assert response.headers["accept-ranges"] == "bytes"
+    assert response.headers["content-length"] == str(len(CONTENT))
+    assert response.headers["content-type"] == "image/jpeg"
+
+
+def test_range_download(photo_client):
+    client, path = photo_client
+
+    response = client.get("/photo", headers={"Range": "bytes=1000-300000"})
+
+    assert response.status_code == 206
+    assert response.content == CONTENT[1000:300001]
+    assert response.headers["content-range"] == f"bytes 1000-300000/{len(CONTENT)}"
+
+
+def test_range_outside_file(photo_client):
+    client, path = photo_client
+
+    response = client.get("/photo", headers={"Range": f"bytes={len(CONTENT)}-"})
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+def test_if_range_with_old_etag_sends_whole_file(photo_client):
+    client, path = photo_client
+
+    response = client.get("/photo", headers={"Range": "bytes=0-9", "If-Range": '"old"'})
+
+    assert response.status_code == 200
+    assert len(response.content) == len(CONTENT)
+
+
+def test_not_modified(photo_client):
+    client, path = photo_client
+    etag = client.get("/photo").headers["etag"]
+
+    by_etag = client.get("/photo", headers={"If-None-Match": f'"other", W/{etag}'})
+    by_date = client.get("/photo", headers={"If-Modified-Since": formatdate(os.stat(path).st_mtime + 10, usegmt=True)})
+    changed = client.get("/photo", headers={"If-None-Match": '"other"'})
+
+    assert by_etag.status_code == 304 and by_etag.content == b"" and by_etag.headers["etag"] == etag
+    assert by_date.status_code == 304
+    assert changed.status_code == 200
@@ -0,0 +1,52 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException, status
+
+from fastapi_app.src.services.auth import Auth
+from fastapi_app.src.services.hashing_pool import HashingPool
+
+
+@pytest.mark.asyncio
+async def test_run_returns_result():
+    pool = HashingPool(max_workers=1, max_queue=0)
+
+    result = await pool.run(sum, [1, 2, 3])
+
+    assert result == 6
+    assert pool.pending == 0
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_run_rejects_when_saturated():
+    pool = HashingPool(max_workers=1, max_queue=0)
+    release = threading.Event()
+    blocked = asyncio.create_task(pool.run(release.wait))
+    await asyncio.sleep(0)
+
+    with pytest.raises(HTTPException) as exc_info:
+        await pool.run(sum, [1])
+    assert exc_info.value.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+    release.set()
+    await blocked
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_password_hash_and_rehash():
+    auth = Auth()
+    hashed = await auth.get_password_hash("secret")
+
+    assert await auth.verify_password("secret", hashed)
+    assert not await auth.verify_password("wrong", hashed)
+
+    valid, new_hash = await auth.verify_and_update_password("secret", hashed)
+    assert valid and new_hash is None
+
+    cheap_hash = Auth.pwd_context.hash("secret", rounds=4)
+    valid, new_hash = await auth.verify_and_update_password("secret", cheap_hash)
+    assert valid
+    assert new_hash is not None and new_hash != cheap_hash
@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from fastapi_app.src.services import photo_service
+from fastapi_app.src.services.photo_service import PhotoService, build_photo_delete_statement
+
+
+def photo_answer(deleted, references=0):
+    """
+    Answers the lookup of the photo and the delete statement with the deleted row and the reference count with references.
+    """
+    def answer(stmt, params):
+        if stmt.is_select and "count" in str(stmt):
+            return [references]
+        if "pg_advisory_xact_lock" in str(stmt) or not deleted:
+            return []
+        return [deleted]
+    return answer
+
+
+def test_delete_statement_checks_owner_and_removes_dependent_rows():
+    sql = str(build_photo_delete_statement(7, user_id=3).compile(dialect=postgresql.dialect()))
+
+    assert "DELETE FROM photos WHERE photos.id = %(id_1)s::INTEGER AND photos.user_id = %(user_id_1)s::INTEGER" in sql
+    assert "DELETE FROM photo_tag WHERE photo_tag.photo_id IN (SELECT deleted_photo.id" in sql
+    assert "DELETE FROM comments WHERE comments.photo_id IN (SELECT deleted_photo.id" in sql
+    assert "UPDATE users SET photo_count=(users.photo_count -" in sql
+    assert "users.id = deleted_photo.user_id" in sql
+
+
+@pytest.mark.asyncio
+async def test_delete_removes_content_of_last_reference(monkeypatch, fake_session):
+    removed = []
+
+    async def delete_content(content_hash, backend=None):
+        removed.append((content_hash, len(db.statements)))
+
+    monkeypatch.setattr(photo_service, "delete_content", delete_content)
+    db = fake_session(photo_answer(SimpleNamespace(id=7, content_hash="ab" * 32)))
+
+    await PhotoService.delete(db, 7, user_id=3)
+
+    assert db.statements[0].startswith("SELECT photos.content_hash")
+    # The content lock comes before the statement which locks the row of the owner.
+    assert "pg_advisory_xact_lock" in db.statements[1]
+    assert db.statements[2].startswith("WITH deleted_photo")
+    # The files are removed after the commit, in a second transaction holding the content lock.
+    assert db.statements[4] == "COMMIT"
+    assert "pg_advisory_xact_lock" in db.statements[5]
+    assert removed == [("ab" * 32, 7)]
+    assert db.statements[-1] == "ROLLBACK"
+
+
+@pytest.mark.asyncio
+async def test_delete_keeps_shared_content(monkeypatch, fake_session):
+    removed = []
+
+    async def delete_content(content_hash, backend=None):
+        removed.append((content_hash, len(db.statements)))
+
+    monkeypatch.setattr(photo_service, "delete_content", delete_content)
+    db = fake_session(photo_answer(SimpleNamespace(id=7, content_hash="ab" * 32), references=1))
+
+    await PhotoService.delete(db, 7)
+
+    assert removed == []
+    assert db.statements[-1] == "COMMIT"
+
+
+@pytest.mark.asyncio
+async def test_delete_keeps_photo_deleted_when_storage_fails(monkeypatch, fake_session):
+    async def delete_content(content_hash, backend=None):
+        raise OSError("storage is down")
+
+    monkeypatch.setattr(photo_service, "delete_content", delete_content)
+    db = fake_session(photo_answer(SimpleNamespace(id=7, content_hash="ab" * 32)))
+
+    await PhotoService.delete(db, 7)
+
+    assert db.statements[4] == "COMMIT"
+    assert db.statements[-1] == "ROLLBACK"
+
+
+@pytest.mark.asyncio
+async def test_delete_of_missing_or_foreign_photo_raises(fake_session):
+    db = fake_session(photo_answer(None))
+
+    with pytest.raises(FileNotFoundError):
+        await PhotoService.delete(db, 7, user_id=3)
+
+    assert "COMMIT" not in db.statements
@@ -0,0 +1,183 @@
+import hashlib
+import io
+import os
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+from fastapi_app.src.services import storage
+from fastapi_app.src.services.derivatives import render_avatar
+from fastapi_app.src.services.storage import (
+    CHUNK_SIZE, content_path, delete_content, discard_upload, save_avatar, save_photo, save_upload, stage_content, store_content,
+)
+from fastapi_app.src.services.storage_backends import LocalStorageBackend, MemoryStorageBackend
+
+CONTENT = os.urandom(CHUNK_SIZE * 2 + 123)
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return LocalStorageBackend(str(tmp_path / "storage"), "/api/storage", "secret")
+
+
+@pytest.mark.asyncio
+async def test_save_photo_hashes_while_writing(tmp_path, backend):
+    upload = UploadFile(io.BytesIO(CONTENT), filename="photo.jpg")
+
+    stored = await save_photo(upload, backend, directory=str(tmp_path), max_size=len(CONTENT))
+
+    assert stored.sha256 == hashlib.sha256(CONTENT).hexdigest()
+    assert stored.size == len(CONTENT)
+    with open(backend.local_path(stored.path), "rb") as file:
+        assert file.read() == CONTENT
+    assert [name for name in os.listdir(tmp_path) if name.startswith(".upload-")] == []
+
+
+@pytest.mark.asyncio
+async def test_save_photo_stores_same_content_once(tmp_path, backend):
+    first = await save_photo(UploadFile(io.BytesIO(CONTENT), filename="a.jpg"), backend, directory=str(tmp_path), max_size=len(CONTENT))
+    second = await save_photo(UploadFile(io.BytesIO(CONTENT), filename="b.jpg"), backend, directory=str(tmp_path), max_size=len(CONTENT))
+
+    sha256 = first.sha256
+    assert first.path == second.path == f"uploads/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+    assert content_path(sha256) == first.path
+    assert await backend.list_keys("uploads/") == [first.path]
+
+
+@pytest.mark.asyncio
+async def test_delete_content_removes_variants_and_empty_directories(tmp_path, backend):
+    stored = await save_photo(UploadFile(io.BytesIO(CONTENT), filename="a.jpg"), backend, directory=str(tmp_path), max_size=len(CONTENT))
+    other = content_path(stored.sha256[:4] + "0" * 60)
+    with open(backend.local_path(f"{stored.path}_thumb.webp"), "wb"), open(backend.local_path(other), "wb"):
+        pass
+
+    await delete_content(stored.sha256, backend)
+
+    assert await backend.list_keys("uploads/") == [other]
+    await backend.delete([other])
+    assert os.listdir(tmp_path / "storage" / "uploads") == []
+
+
+@pytest.mark.asyncio
+async def test_save_photo_rejects_too_large_file(tmp_path, backend):
+    upload = UploadFile(io.BytesIO(CONTENT), filename="photo.jpg")
+
+    with pytest.raises(HTTPException) as exc_info:
+        await save_photo(upload, backend, directory=str(tmp_path), max_size=CHUNK_SIZE)
+
+    assert exc_info.value.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.asyncio
+async def test_save_photo_rejects_known_size_before_reading(tmp_path, backend):
+    source = io.BytesIO(CONTENT)
+    upload = UploadFile(source, filename="photo.jpg", size=len(CONTENT))
+
+    with pytest.raises(HTTPException):
+        await save_photo(upload, backend, directory=str(tmp_path), max_size=10)
+
+    assert source.tell() == 0
+
+
+@pytest.mark.asyncio
+async def test_discard_upload_removes_unstored_temporary_file(tmp_path):
+    stored = await save_upload(UploadFile(io.BytesIO(CONTENT), filename="a.jpg"), directory=str(tmp_path), max_size=len(CONTENT))
+    assert os.path.exists(stored.path)
+
+    await discard_upload(stored)
+    await discard_upload(stored)
+
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.asyncio
+async def test_remote_upload_is_staged_then_moved(tmp_path):
+    backend = MemoryStorageBackend()
+    stored = await save_upload(UploadFile(io.BytesIO(CONTENT), filename="a.jpg"), directory=str(tmp_path), max_size=len(CONTENT))
+
+    staging_key = await stage_content(stored, backend)
+
+    assert staging_key.startswith("staging/")
+    assert os.listdir(tmp_path) == []
+    assert await store_content(stored, backend, staging_key=staging_key) == content_path(stored.sha256)
+    assert await backend.list_keys("") == [content_path(stored.sha256)]
+
+
+@pytest.mark.asyncio
+async def test_staged_upload_is_removed_when_content_is_stored_meanwhile(tmp_path):
+    backend = MemoryStorageBackend()
+    stored = await save_upload(UploadFile(io.BytesIO(CONTENT), filename="a.jpg"), directory=str(tmp_path), max_size=len(CONTENT))
+    staging_key = await stage_content(stored, backend)
+    await backend.put(content_path(stored.sha256), backend.get(staging_key))
+
+    await store_content(stored, backend, staging_key=staging_key)
+
+    assert await backend.list_keys("") == [content_path(stored.sha256)]
+
+
+@pytest.mark.asyncio
+async def test_local_upload_is_not_staged(tmp_path, backend):
+    stored = await save_upload(UploadFile(io.BytesIO(CONTENT), filename="a.jpg"), directory=str(tmp_path), max_size=len(CONTENT))
+
+    assert await stage_content(stored, backend) is None
+    assert os.path.exists(stored.path)
+
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 3)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class TypedMemoryStorageBackend(MemoryStorageBackend):
+    """
+    Memory storage which keeps the media type each object was uploaded with.
+    """
+    def __init__(self):
+        super().__init__()
+        self.content_types = {}
+
+    async def put(self, key, chunks, content_type=None):
+        self.content_types[key] = content_type
+        return await super().put(key, chunks, content_type)
+
+
+@pytest.mark.asyncio
+async def test_upload_media_type_is_read_from_content(tmp_path):
+    image = await save_upload(UploadFile(io.BytesIO(png_bytes()), filename="a.jpg"), directory=str(tmp_path), max_size=len(CONTENT))
+    other = await save_upload(UploadFile(io.BytesIO(CONTENT), filename="b.png"), directory=str(tmp_path), max_size=len(CONTENT))
+
+    assert image.content_type == "image/png"
+    assert other.content_type is None
+
+
+@pytest.mark.asyncio
+async def test_stored_photo_keeps_media_type(tmp_path):
+    backend = TypedMemoryStorageBackend()
+
+    stored = await save_photo(UploadFile(io.BytesIO(png_bytes()), filename="a"), backend, directory=str(tmp_path), max_size=len(CONTENT))
+
+    assert stored.content_type == "image/png"
+    staging_key = next(key for key in backend.content_types if key.startswith("staging/"))
+    assert backend.content_types[staging_key] == "image/png"
+    assert await backend.list_keys("") == [stored.path]
+
+
+@pytest.mark.asyncio
+async def test_failed_avatar_upload_removes_local_files(tmp_path, monkeypatch):
+    class BrokenBackend(MemoryStorageBackend):
+        async def put(self, key, chunks, content_type=None):
+            raise ConnectionError("storage is down")
+
+    async def fake_render_avatar(source_path, size):
+        return render_avatar(source_path, size)
+
+    monkeypatch.setattr(storage.derivative_pipeline, "render_avatar", fake_render_avatar)
+
+    with pytest.raises(ConnectionError):
+        await save_avatar(UploadFile(io.BytesIO(png_bytes()), filename="a.png"), 1, BrokenBackend(), directory=str(tmp_path))
+
+    assert os.listdir(tmp_path) == []
+
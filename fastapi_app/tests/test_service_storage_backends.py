@@ -0,0 +1,180 @@
+import os
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from fastapi_app.src.services.storage_backends import (
+    LocalStorageBackend, MemoryStorageBackend, S3StorageBackend, StorageBackend, validate_key, verify_signed_url,
+)
+
+CONTENT = os.urandom(3 * 1024 * 1024 + 17)
+
+
+async def chunks(data, size=1024 * 1024):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def read(backend, key, start=0, end=None):
+    return b"".join([chunk async for chunk in backend.get(key, start, end)])
+
+
+@pytest.fixture(params=["local", "memory"])
+def backend(request, tmp_path):
+    if request.param == "local":
+        return LocalStorageBackend(str(tmp_path), "/api/storage", "secret")
+    return MemoryStorageBackend("/api/storage", "secret")
+
+
+@pytest.mark.asyncio
+async def test_put_get_stat_list_delete(backend):
+    assert await backend.put("uploads/ab/cd/abcd", chunks(CONTENT)) == len(CONTENT)
+    await backend.put("uploads/ab/cd/abcd_thumb.webp", chunks(b"thumb"))
+    await backend.put("uploads/ab/ef/abef", chunks(b"other"))
+
+    assert await read(backend, "uploads/ab/cd/abcd") == CONTENT
+    assert await read(backend, "uploads/ab/cd/abcd", 10, 20) == CONTENT[10:21]
+    assert (await backend.stat("uploads/ab/cd/abcd")).size == len(CONTENT)
+    assert await backend.stat("uploads/missing") is None
+    assert await backend.list_keys("uploads/ab/cd/abcd") == ["uploads/ab/cd/abcd", "uploads/ab/cd/abcd_thumb.webp"]
+
+    await backend.delete(await backend.list_keys("uploads/ab/cd/abcd"))
+
+    assert await backend.list_keys("uploads/") == ["uploads/ab/ef/abef"]
+
+
+@pytest.mark.asyncio
+async def test_put_file_removes_local_file(backend, tmp_path):
+    source = tmp_path / "source.bin"
+    source.write_bytes(CONTENT)
+
+    await backend.put_file("avatars/1/a.webp", str(source))
+
+    assert not source.exists()
+    async with backend.open_local("avatars/1/a.webp") as path:
+        with open(path, "rb") as file:
+            assert file.read() == CONTENT
+
+
+@pytest.mark.asyncio
+async def test_presigned_url_is_signed_for_method_and_key(backend):
+    url = await backend.presigned_url("uploads/ab/cd/abcd", 60, "PUT")
+
+    parts = urlsplit(url)
+    query = {name: values[0] for name, values in parse_qs(parts.query).items()}
+    assert parts.path == "/api/storage/uploads/ab/cd/abcd"
+    assert verify_signed_url("secret", "PUT", "uploads/ab/cd/abcd", int(query["expires"]), query["signature"])
+    assert not verify_signed_url("secret", "GET", "uploads/ab/cd/abcd", int(query["expires"]), query["signature"])
+    assert not verify_signed_url("secret", "PUT", "uploads/ab/cd/other", int(query["expires"]), query["signature"])
+    assert not verify_signed_url("secret", "PUT", "uploads/ab/cd/abcd", int(time.time()) - 1, query["signature"])
+
+
+@pytest.mark.asyncio
+async def test_move_replaces_target(backend):
+    await backend.put("staging/a", chunks(CONTENT))
+    await backend.put("uploads/ab/cd/abcd", chunks(b"old"))
+
+    await backend.move("staging/a", "uploads/ab/cd/abcd")
+
+    assert await read(backend, "uploads/ab/cd/abcd") == CONTENT
+    assert await backend.list_keys("staging/") == []
+    with pytest.raises(FileNotFoundError):
+        await backend.move("staging/a", "uploads/ab/cd/abcd")
+
+
+def test_incomplete_backend_can_not_be_created():
+    class ReadOnlyBackend(StorageBackend):
+        async def stat(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        ReadOnlyBackend()
+
+
+def test_validate_key_rejects_paths_outside_storage():
+    assert validate_key("uploads/a.jpg") == "uploads/a.jpg"
+    for key in ("", "/etc/passwd", "uploads/../../etc/passwd", "uploads//a", "./a", "a\\b"):
+        with pytest.raises(ValueError):
+            validate_key(key)
+
+
+class FakeS3Client:
+    def __init__(self):
+        self.calls = []
+
+    async def create_multipart_upload(self, **kwargs):
+        self.calls.append(("create", None))
+        return {"UploadId": "upload-1"}
+
+    async def upload_part(self, Body, PartNumber, **kwargs):
+        self.calls.append(("part", len(Body)))
+        return {"ETag": f'"etag-{PartNumber}"'}
+
+    async def complete_multipart_upload(self, MultipartUpload, **kwargs):
+        self.calls.append(("complete", [part["PartNumber"] for part in MultipartUpload["Parts"]]))
+
+    async def put_object(self, Body, **kwargs):
+        self.calls.append(("put", len(Body)))
+
+    async def abort_multipart_upload(self, **kwargs):
+        self.calls.append(("abort", None))
+
+    async def copy_object(self, Key, CopySource, **kwargs):
+        self.calls.append(("copy", (CopySource["Key"], Key)))
+
+    async def delete_object(self, Key, **kwargs):
+        self.calls.append(("delete", Key))
+
+
+def s3_backend(client):
+    backend = S3StorageBackend("photos", "http://localhost:9000", "key", "secret", "us-east-1", part_size=5 * 1024 * 1024)
+    backend._client = client
+    return backend
+
+
+@pytest.mark.asyncio
+async def test_s3_put_uses_multipart_upload_for_large_files():
+    client = FakeS3Client()
+    data = os.urandom(11 * 1024 * 1024)
+
+    assert await s3_backend(client).put("uploads/a", chunks(data)) == len(data)
+
+    part = 5 * 1024 * 1024
+    assert client.calls == [("create", None), ("part", part), ("part", part), ("part", 1024 * 1024), ("complete", [1, 2, 3])]
+
+
+@pytest.mark.asyncio
+async def test_s3_put_sends_small_files_at_once():
+    client = FakeS3Client()
+
+    await s3_backend(client).put("uploads/a", chunks(CONTENT))
+
+    assert client.calls == [("put", len(CONTENT))]
+
+
+@pytest.mark.asyncio
+async def test_s3_put_aborts_failed_multipart_upload():
+    client = FakeS3Client()
+
+    async def failing_chunks():
+        yield os.urandom(6 * 1024 * 1024)
+        raise ConnectionError("client disconnected")
+
+    with pytest.raises(ConnectionError):
+        await s3_backend(client).put("uploads/a", failing_chunks())
+
+    assert client.calls[-1] == ("abort", None)
+
+
+@pytest.mark.asyncio
+async def test_s3_move_copies_on_server():
+    client = FakeS3Client()
+
+    await s3_backend(client).move("staging/a", "uploads/a")
+
+    assert client.calls == [("copy", ("staging/a", "uploads/a")), ("delete", "staging/a")]
+
+
+def test_s3_public_url():
+    assert s3_backend(None).public_url("avatars/1/a.webp") == "http://localhost:9000/photos/avatars/1/a.webp"
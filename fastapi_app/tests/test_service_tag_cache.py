@@ -0,0 +1,69 @@
+import pytest
+
+from fastapi_app.src.database.models import Tag
+from fastapi_app.src.services.tag_cache import TagCache
+
+
+def tags_answer(rows):
+    """
+    Answers every query with the rows of the tags table whose lowercase name is one of the bound lists, or all rows.
+    """
+    def answer(stmt, params):
+        names = [value for value in params.values() if isinstance(value, list)]
+        if names:
+            return [row for row in rows if row[1].lower() in names[0]]
+        return rows
+    return answer
+
+
+@pytest.mark.asyncio
+async def test_autocomplete_uses_loaded_tags(fake_session):
+    cache = TagCache(ttl=60)
+    db = fake_session(tags_answer([(1, "sea"), (2, "Sunset"), (3, "sun"), (4, "beach"), (5, "summer")]))
+
+    await cache.ensure_loaded(db)
+    await cache.ensure_loaded(db)
+
+    assert len(db.statements) == 1
+    assert cache.autocomplete("SU") == ["summer", "sun", "sunset"]
+    assert cache.autocomplete("su", limit=2) == ["summer", "sun"]
+    assert cache.autocomplete("x") == []
+
+
+@pytest.mark.asyncio
+async def test_reload_after_ttl(fake_session):
+    cache = TagCache(ttl=0)
+    rows = [(1, "sea")]
+    db = fake_session(tags_answer(rows))
+
+    await cache.ensure_loaded(db)
+    rows.append((2, "sun"))
+    await cache.ensure_loaded(db)
+
+    assert cache.reloads == 2
+    assert cache.autocomplete("s") == ["sea", "sun"]
+
+
+@pytest.mark.asyncio
+async def test_resolve_queries_only_missing_names(fake_session):
+    cache = TagCache(ttl=60)
+    rows = [(1, "sea"), (2, "Sea")]
+    db = fake_session(tags_answer(rows))
+    await cache.ensure_loaded(db)
+    rows.append((3, "sun"))
+
+    resolved = await cache.resolve(["sea", "sun", "moon"], db)
+
+    assert resolved == {"sea": (1, 2), "sun": (3,)}
+    assert len(db.statements) == 2
+    assert await cache.resolve(["sun"], db) == {"sun": (3,)}
+    assert len(db.statements) == 2
+
+
+def test_add_keeps_keys_sorted():
+    cache = TagCache(ttl=60)
+    cache.add([Tag(id=2, name="sun"), Tag(id=1, name="beach"), Tag(id=1, name="beach")])
+
+    assert cache.autocomplete("") == ["beach", "sun"]
+    assert cache.get_id("sun") == 2
+    assert cache.stats()["size"] == 2
@@ -0,0 +1,148 @@
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from redis.exceptions import RedisError
+
+from fastapi_app.src.services.user_cache import (
+    INVALIDATED,
+    INVALIDATION_CHANNEL,
+    SCHEMA_VERSION,
+    LocalUserCache,
+    RedisUserCache,
+    TieredUserCache,
+    UserCache,
+    UserPrincipal,
+)
+
+
+class User:
+    def __init__(self, id, username, email, role, created_at, avatar, password):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.role = role
+        self.created_at = created_at
+        self.avatar = avatar
+        self.password = password
+
+
+@pytest.fixture
+def principal():
+    user = User(1, "testuser", "test@example.com", "user", datetime(2024, 7, 25, 17, 21), "http://avatar", "hash")
+    return UserPrincipal.from_user(user)
+
+
+@pytest.fixture
+def mock_redis():
+    redis_mock = MagicMock()
+    redis_mock.get = AsyncMock()
+    redis_mock.set = AsyncMock(return_value=True)
+    return redis_mock
+
+
+def test_pack_unpack(principal):
+    data = principal.pack()
+
+    assert UserPrincipal.unpack(data) == principal
+    assert b"hash" not in data
+
+
+def test_incomplete_cache_can_not_be_created():
+    class GetOnlyCache(UserCache):
+        async def get(self, email):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnlyCache()
+
+
+@pytest.mark.asyncio
+async def test_get_hit_and_miss(mock_redis, principal):
+    cache = RedisUserCache(mock_redis, ttl=900)
+
+    mock_redis.get.return_value = principal.pack()
+    assert await cache.get("test@example.com") == principal
+    mock_redis.get.assert_awaited_with(f"user:v{SCHEMA_VERSION}:test@example.com")
+
+    mock_redis.get.return_value = None
+    assert await cache.get("test@example.com") is None
+
+
+@pytest.mark.asyncio
+async def test_set_only_fills_empty_key(mock_redis, principal):
+    cache = RedisUserCache(mock_redis, ttl=900)
+
+    assert await cache.set(principal) is True
+
+    key = f"user:v{SCHEMA_VERSION}:test@example.com"
+    mock_redis.set.assert_awaited_once_with(key, principal.pack(), ex=900, nx=True)
+
+
+@pytest.mark.asyncio
+async def test_invalidate_leaves_marker(mock_redis):
+    cache = RedisUserCache(mock_redis, ttl=900, invalidation_ttl=30)
+
+    await cache.invalidate("test@example.com")
+
+    mock_redis.set.assert_awaited_once_with(f"user:v{SCHEMA_VERSION}:test@example.com", INVALIDATED, ex=30)
+    mock_redis.get.return_value = INVALIDATED
+    assert await cache.get("test@example.com") is None
+
+
+@pytest.mark.asyncio
+async def test_user_read_before_invalidation_is_not_cached(mock_redis, principal):
+    mock_redis.publish = AsyncMock()
+    cache = TieredUserCache(LocalUserCache(max_size=10, ttl=60), RedisUserCache(mock_redis, ttl=900), mock_redis)
+    # The key holds the invalidation marker, SET NX does not replace it.
+    mock_redis.set.return_value = None
+
+    assert await cache.set(principal) is False
+    assert len(cache.local) == 0
+
+
+@pytest.mark.asyncio
+async def test_invalidate_survives_redis_errors(mock_redis, principal):
+    mock_redis.set.side_effect = RedisError("down")
+    mock_redis.publish = AsyncMock(side_effect=RedisError("down"))
+    cache = TieredUserCache(LocalUserCache(max_size=10, ttl=60), RedisUserCache(mock_redis, ttl=900), mock_redis)
+    await cache.local.set(principal)
+
+    await cache.invalidate("test@example.com")
+
+    assert len(cache.local) == 0
+
+
+@pytest.mark.asyncio
+async def test_local_cache_lru_and_ttl(principal):
+    cache = LocalUserCache(max_size=1, ttl=60)
+
+    await cache.set(principal)
+    assert await cache.get("test@example.com") == principal
+
+    other = UserPrincipal(2, "other", "other@example.com", "user", None, None)
+    await cache.set(other)
+    assert await cache.get("test@example.com") is None
+    assert cache.evictions == 1
+
+    cache.ttl = 0
+    await cache.set(principal)
+    assert await cache.get("test@example.com") is None
+    assert cache.hits == 1 and cache.misses == 2
+
+
+@pytest.mark.asyncio
+async def test_tiered_cache(mock_redis, principal):
+    mock_redis.publish = AsyncMock()
+    cache = TieredUserCache(LocalUserCache(max_size=10, ttl=60), RedisUserCache(mock_redis, ttl=900), mock_redis)
+
+    mock_redis.get.return_value = principal.pack()
+    assert await cache.get("test@example.com") == principal
+    assert await cache.get("test@example.com") == principal
+    mock_redis.get.assert_awaited_once()
+    assert cache.stats()["local_hits"] == 1
+    assert cache.stats()["remote_hits"] == 1
+
+    await cache.invalidate("test@example.com")
+    mock_redis.publish.assert_awaited_once_with(INVALIDATION_CHANNEL, "test@example.com")
+    assert len(cache.local) == 0
@@ -0,0 +1,52 @@
+from datetime import date, datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+
+from fastapi_app.src.database.models import User
+from fastapi_app.src.repository.users import build_users_query
+from fastapi_app.src.services.user_export import EXPORT_COLUMNS, encode_batch, export_users
+
+
+def test_users_query_filters():
+    query = build_users_query(role="moderator", confirmed=True, created_from=date(2026, 1, 1), created_to=date(2026, 1, 31))
+    compiled = query.compile(dialect=postgresql.dialect())
+    sql = str(compiled)
+
+    assert "users.role = %(role_1)s::VARCHAR AND users.confirmed IS true" in sql
+    assert "users.crated_at >= %(crated_at_1)s" in sql and "users.crated_at < %(crated_at_2)s" in sql
+    assert datetime(2026, 2, 1) in compiled.params.values()
+
+    with pytest.raises(HTTPException) as e:
+        build_users_query(created_from=date(2026, 2, 1), created_to=date(2026, 1, 1))
+    assert e.value.status_code == 400
+
+
+def test_encode_batch():
+    fields = ["id", "created_at", "confirmed"]
+    rows = [(1, datetime(2026, 1, 2, 3, 4), True), (2, datetime(2026, 1, 3), None)]
+
+    assert encode_batch(rows, fields, "ndjson") == (
+        '{"id": 1, "created_at": "2026-01-02T03:04:00", "confirmed": true}\n'
+        '{"id": 2, "created_at": "2026-01-03T00:00:00", "confirmed": null}\n'
+    )
+    assert encode_batch(rows, fields, "csv") == "1,2026-01-02T03:04:00,True\r\n2,2026-01-03T00:00:00,\r\n"
+
+
+@pytest.mark.asyncio
+async def test_export_users_reads_in_batches_with_server_side_cursor(fake_session):
+    rows = [(id, f"user{id}", f"user{id}@example.com", "user", datetime(2026, 1, 1), None, True, 0) for id in range(1, 6)]
+    session = fake_session(lambda stmt, params: rows)
+
+    chunks = [chunk async for chunk in export_users("csv", lambda: session, batch_size=2, role="user")]
+
+    assert chunks[0] == "id,username,email,role,created_at,avatar,confirmed,photo_count\r\n"
+    assert len(chunks) == 4 and chunks[-1].startswith("5,user5,")
+    assert "ORDER BY users.id" in session.statements[0]
+    assert len(EXPORT_COLUMNS) == 8 and EXPORT_COLUMNS[0] is User.id
+
+
+def test_export_users_checks_filters_before_streaming():
+    with pytest.raises(HTTPException):
+        export_users("ndjson", created_from=date(2026, 2, 1), created_to=date(2026, 1, 1))
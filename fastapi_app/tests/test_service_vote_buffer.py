@@ -0,0 +1,261 @@
+import pytest
+from redis.exceptions import LockNotOwnedError, RedisError, ResponseError
+
+from fastapi_app.src.repository.opinions import apply_votes
+from fastapi_app.src.services import vote_buffer as vote_buffer_module
+from fastapi_app.src.services.vote_buffer import (
+    FLUSHING_KEY, PENDING_KEY, LocalVoteStore, RedisVoteStore, VoteBuffer, VoteStore,
+)
+
+
+def votes_answer(photo_ids, previous, user_ids=None):
+    """
+    Answers like a database with the photos photo_ids, the users user_ids (all voters if None)
+    and the opinions previous, keyed by (photo_id, user_id).
+    """
+    def answer(stmt, params):
+        if not stmt.is_select:
+            return []
+        sql = str(stmt)
+        if "opinions" in sql:
+            return [(photo_id, user_id, vote) for (photo_id, user_id), vote in previous.items()]
+        ids = next(value for value in params.values() if isinstance(value, list))
+        if "users" in sql:
+            return ids if user_ids is None else [id for id in ids if id in user_ids]
+        return [id for id in ids if id in photo_ids]
+    return answer
+
+
+@pytest.mark.asyncio
+async def test_apply_votes_updates_ratings_by_deltas(fake_session):
+    db = fake_session(votes_answer(photo_ids=[1, 2], previous={(1, 10): 5}))
+
+    saved = await apply_votes(db, {(1, 10): 3, (1, 11): 4, (2, 10): 2, (3, 12): 5})
+
+    assert saved == 3 and db.commits == 1
+    assert "ON CONFLICT (user_id, photo_id) DO UPDATE SET vote = excluded.vote" in db.statements[3]
+    assert 12 not in db.params[3].values()
+    assert "FROM (VALUES" in db.statements[4]
+    # photo 1: vote 5 -> 3 and a new vote 4, photo 2: a new vote 2
+    assert list(db.params[4].values())[-6:] == [1, 2, 1, 2, 2, 1]
+
+
+@pytest.mark.asyncio
+async def test_apply_votes_drops_votes_of_deleted_users(fake_session):
+    db = fake_session(votes_answer(photo_ids=[1], previous={}, user_ids=[10]))
+
+    saved = await apply_votes(db, {(1, 10): 3, (1, 11): 4})
+
+    assert saved == 1 and db.commits == 1
+    assert "users.id IN" in db.statements[1]
+    assert 11 not in db.params[3].values()
+
+
+@pytest.mark.asyncio
+async def test_apply_votes_of_only_deleted_users_writes_nothing(fake_session):
+    db = fake_session(votes_answer(photo_ids=[1], previous={}, user_ids=[]))
+
+    assert await apply_votes(db, {(1, 11): 4}) == 0
+    assert len(db.statements) == 2 and db.commits == 0
+
+
+@pytest.mark.asyncio
+async def test_local_store_keeps_latest_vote_until_ack():
+    store = LocalVoteStore()
+    await store.add(1, 10, 2)
+    await store.add(1, 10, 4)
+
+    assert await store.take() == {(1, 10): 4}
+    await store.add(1, 11, 5)
+    # Votes of an unacknowledged flush are taken again.
+    assert await store.take() == {(1, 10): 4}
+    await store.ack()
+    assert await store.take() == {(1, 11): 5}
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_batches(monkeypatch, fake_session):
+    batches = []
+
+    async def fake_apply_votes(db, votes):
+        batches.append(votes)
+        return len(votes)
+
+    monkeypatch.setattr(vote_buffer_module, "apply_votes", fake_apply_votes)
+    store = LocalVoteStore()
+    buffer = VoteBuffer(store, fake_session, flush_interval=1, batch_size=2)
+    for user_id in range(5):
+        await buffer.add(1, user_id, 3, db=None)
+
+    assert await buffer.flush() == 5
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert len(store) == 0 and buffer.flushed == 5
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_votes(monkeypatch, fake_session):
+    async def failing_apply_votes(db, votes):
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(vote_buffer_module, "apply_votes", failing_apply_votes)
+    store = LocalVoteStore()
+    buffer = VoteBuffer(store, fake_session, flush_interval=1, batch_size=10)
+    await buffer.add(1, 10, 3, db=None)
+
+    with pytest.raises(ConnectionError):
+        await buffer.flush()
+    assert await store.take() == {(1, 10): 3}
+
+
+@pytest.mark.asyncio
+async def test_add_writes_directly_when_store_fails(monkeypatch):
+    written = []
+
+    class BrokenStore(LocalVoteStore):
+        async def add(self, photo_id, user_id, vote):
+            raise RedisError("redis is down")
+
+    async def fake_apply_votes(db, votes):
+        written.append((db, votes))
+        return len(votes)
+
+    monkeypatch.setattr(vote_buffer_module, "apply_votes", fake_apply_votes)
+    buffer = VoteBuffer(BrokenStore(), None, flush_interval=1, batch_size=10)
+
+    await buffer.add(1, 10, 3, db="session")
+
+    assert written == [("session", {(1, 10): 3})]
+
+
+def test_incomplete_store_can_not_be_created():
+    class AddOnlyStore(VoteStore):
+        async def add(self, photo_id, user_id, vote):
+            pass
+
+    with pytest.raises(TypeError):
+        AddOnlyStore()
+
+
+class FakeRedis:
+    """
+    Keeps the hashes used by RedisVoteStore in memory.
+    """
+    def __init__(self):
+        self.hashes = {}
+
+    async def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field.encode()] = str(value).encode()
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    async def exists(self, key):
+        return int(key in self.hashes)
+
+    async def renamenx(self, source, key):
+        if source not in self.hashes:
+            raise ResponseError("no such key")
+        if key in self.hashes:
+            return False
+        self.hashes[key] = self.hashes.pop(source)
+        return True
+
+    async def delete(self, key):
+        self.hashes.pop(key, None)
+
+
+class FakeLock:
+    """
+    Flush lock which expires after it was reacquired owned_for times.
+    """
+    def __init__(self, owned_for=None):
+        self.owned_for = owned_for
+        self.reacquired = 0
+
+    async def acquire(self):
+        return True
+
+    async def reacquire(self):
+        if self.owned_for is not None and self.reacquired >= self.owned_for:
+            raise LockNotOwnedError("Cannot reacquire a lock that's no longer owned")
+        self.reacquired += 1
+        return True
+
+    async def release(self):
+        if self.owned_for is not None and self.reacquired >= self.owned_for:
+            raise LockNotOwnedError("Cannot release a lock that's no longer owned")
+
+
+class LockedVoteStore(LocalVoteStore):
+    def __init__(self, lock):
+        super().__init__()
+        self._lock = lock
+
+    def lock(self, timeout):
+        return self._lock
+
+
+@pytest.mark.asyncio
+async def test_redis_store_takes_votes_until_ack():
+    store = RedisVoteStore(FakeRedis())
+    assert await store.take() == {}
+    await store.add(1, 10, 2)
+    await store.add(1, 10, 4)
+    await store.add(2, 11, 5)
+
+    assert await store.take() == {(1, 10): 4, (2, 11): 5}
+    await store.add(3, 12, 1)
+    # Votes of an unacknowledged flush are taken again, new votes wait in the pending hash.
+    assert await store.take() == {(1, 10): 4, (2, 11): 5}
+    await store.ack()
+    assert await store.take() == {(3, 12): 1}
+
+
+@pytest.mark.asyncio
+async def test_redis_store_flushes_leftover_votes_first():
+    redis = FakeRedis()
+    redis.hashes[FLUSHING_KEY] = {b"1:10": b"3"}
+    redis.hashes[PENDING_KEY] = {b"2:11": b"5"}
+    store = RedisVoteStore(redis)
+
+    assert await store.take() == {(1, 10): 3}
+    await store.ack()
+    assert await store.take() == {(2, 11): 5}
+
+
+@pytest.mark.asyncio
+async def test_flush_stops_when_lock_expires(monkeypatch, fake_session):
+    batches = []
+
+    async def fake_apply_votes(db, votes):
+        batches.append(votes)
+        return len(votes)
+
+    monkeypatch.setattr(vote_buffer_module, "apply_votes", fake_apply_votes)
+    store = LockedVoteStore(FakeLock(owned_for=1))
+    buffer = VoteBuffer(store, fake_session, flush_interval=1, batch_size=2)
+    for user_id in range(4):
+        await buffer.add(1, user_id, 3, db=None)
+
+    with pytest.raises(LockNotOwnedError):
+        await buffer.flush()
+
+    assert len(batches) == 1
+    # The worker which takes the lock writes the votes again.
+    assert len(await store.take()) == 4
+
+
+@pytest.mark.asyncio
+async def test_flush_extends_lock_for_each_batch(monkeypatch, fake_session):
+    async def fake_apply_votes(db, votes):
+        return len(votes)
+
+    monkeypatch.setattr(vote_buffer_module, "apply_votes", fake_apply_votes)
+    lock = FakeLock()
+    buffer = VoteBuffer(LockedVoteStore(lock), fake_session, flush_interval=1, batch_size=2)
+    for user_id in range(3):
+        await buffer.add(1, user_id, 3, db=None)
+
+    assert await buffer.flush() == 3
+    assert lock.reacquired == 3
+